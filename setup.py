@@ -19,6 +19,7 @@ if os.getenv('REQ_IGNORE_VERSIONS'):
 
 extras_require = {
     'postgres': 'psycopg2-binary',
+    'numpy': 'numpy',
 }
 
 
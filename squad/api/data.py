@@ -4,22 +4,24 @@ from datetime import datetime
 
 from django.http import HttpResponse
 from django.http import HttpResponseBadRequest
+from django.http import StreamingHttpResponse
 
 
 from squad.core import models
-from squad.core.queries import get_metric_data
+from squad.core.queries import get_metric_data, iter_metric_data
 from squad.core.utils import join_name
 from squad.http import auth
 
 
-def export_csv(results):
-    lines = []
-    for metric, data in results.items():
-        for environment, entries in data.items():
-            for entry in entries:
-                line = [metric, environment] + entry
-                lines.append(",".join(['"' + str(f) + '"' for f in line]))
-    return "\n".join(lines)
+def export_csv(rows):
+    for metric, environment, entry in rows:
+        line = [metric, environment] + entry
+        yield ",".join(['"' + str(f) + '"' for f in line]) + "\n"
+
+
+def export_ndjson(rows):
+    for metric, environment, entry in rows:
+        yield json.dumps([metric, environment] + entry) + "\n"
 
 
 @auth
@@ -51,21 +53,40 @@ def get(request, group_slug, project_slug):
         metrics = [":tests:"]
         metrics += [join_name(m['suite__slug'], m['metadata__name']) for m in metric_set]
 
-    environments = project.environments.filter(slug__in=request.GET.getlist('environment'))
+    max_points = request.GET.get('max_points', None)
+    if max_points:
+        try:
+            max_points = int(max_points)
+        except ValueError:
+            max_points = 0
+        if max_points < 3:
+            return HttpResponseBadRequest("Invalid max_points: %s. It must be a number not less than 3." % request.GET['max_points'])
+    else:
+        max_points = None
 
-    results = get_metric_data(project, metrics, environments,
-                              date_start, date_end)
+    environments = project.environments.filter(slug__in=request.GET.getlist('environment'))
 
     fmt = request.GET.get('format', 'json')
     if fmt == 'json':
+        results = get_metric_data(project, metrics, environments,
+                                  date_start, date_end, max_points)
         return HttpResponse(
             json.dumps(results),
             content_type='application/json; charset=utf-8'
         )
     elif fmt == 'csv':
-        return HttpResponse(
-            export_csv(results),
+        rows = iter_metric_data(project, metrics, environments,
+                                date_start, date_end, max_points)
+        return StreamingHttpResponse(
+            export_csv(rows),
             content_type='test/csv; charset=utf-8'
         )
+    elif fmt == 'ndjson':
+        rows = iter_metric_data(project, metrics, environments,
+                                date_start, date_end, max_points)
+        return StreamingHttpResponse(
+            export_ndjson(rows),
+            content_type='application/x-ndjson; charset=utf-8'
+        )
     else:
         return HttpResponseBadRequest("Invalid format: %s" % fmt)
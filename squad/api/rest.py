@@ -863,7 +863,7 @@ class BuildSerializer(DynamicFieldsModelSerializer, serializers.HyperlinkedModel
 
     class Meta:
         model = Build
-        fields = '__all__'
+        exclude = ('comparison_version',)
 
 
 class BuildViewSet(NestedViewSetMixin, ModelViewSet):
@@ -1489,7 +1489,7 @@ class MetricSerializer(DynamicFieldsModelSerializer, serializers.HyperlinkedMode
 
     class Meta:
         model = Metric
-        exclude = ['measurements']
+        exclude = ['measurements', 'packed_measurements']
 
 
 class MetricViewSet(NestedViewSetMixin, ModelViewSet):
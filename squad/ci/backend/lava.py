@@ -1,19 +1,25 @@
 import asyncio
 import aiohttp
+import io
 import json
 import re
 import requests
 import ssl
 import socket
+import tempfile
 import traceback
 import yaml
 import xmlrpc
 import zmq
 
+from array import array
+from collections import defaultdict
 from asgiref.sync import sync_to_async
+from concurrent.futures import ThreadPoolExecutor
 from dateutil.parser import isoparse
 from contextlib import contextmanager
 from io import BytesIO, TextIOWrapper, StringIO
+from requests.adapters import HTTPAdapter
 from zmq.utils.strtypes import u
 
 from xmlrpc import client as xmlrpclib
@@ -30,6 +36,48 @@ from squad.ci.backend.null import Backend as BaseBackend
 description = "LAVA"
 timeout_variable_name = "TIMEOUT"
 DEFAULT_TIMEOUT = 60
+fetch_workers_variable_name = "CI_LAVA_FETCH_WORKERS"
+DEFAULT_FETCH_WORKERS = 4
+
+# Size of the chunks in which job logs are downloaded
+LOG_CHUNK_SIZE = 1024 * 1024
+
+
+class LogLines(object):
+    """
+    Random access to the lines of a job log, kept in a binary file: the
+    offset of the start of every line is recorded in a single pass over the
+    file, so that any range of lines can then be read by seeking straight to
+    its first line.
+    """
+
+    def __init__(self, log_file):
+        self.file = log_file
+        self.offsets = array('Q')
+        self.file.seek(0)
+        offset = 0
+        for line in self.file:
+            self.offsets.append(offset)
+            offset += len(line)
+        self.file.seek(0)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def read(self, first, last):
+        """
+        Returns the lines from `first` to `last` (counted from 1), both
+        included, as a list of bytes. Ranges starting before the first line
+        start at the first line, and at least one line is returned.
+        """
+        first = max(first, 1)
+        last = max(last, first)
+        if first > len(self.offsets):
+            return []
+        self.file.seek(self.offsets[first - 1])
+        lines = [self.file.readline() for _ in range(first, min(last, len(self.offsets)) + 1)]
+        self.file.seek(0)
+        return lines
 
 
 class RequestsTransport(xmlrpclib.SafeTransport):
@@ -67,14 +115,15 @@ class RequestsTransport(xmlrpclib.SafeTransport):
         except Exception:
             raise  # something went wrong
         else:
-            try:
-                resp.raise_for_status()
-            except requests.RequestException as e:
-                raise xmlrpclib.ProtocolError(url, resp.status_code,
-                                              str(e), resp.headers)
-            else:
-                self.verbose = verbose
-                return self.parse_response(resp.raw)
+            with resp:
+                try:
+                    resp.raise_for_status()
+                except requests.RequestException as e:
+                    raise xmlrpclib.ProtocolError(url, resp.status_code,
+                                                  str(e), resp.headers)
+                else:
+                    self.verbose = verbose
+                    return self.parse_response(resp.raw)
 
     def _build_url(self, host, handler):
         """
@@ -142,12 +191,13 @@ class Backend(BaseBackend):
                 data['results'] = self.__get_testjob_results_yaml__(test_job.job_id)
 
                 # fetch logs
-                raw_logs = BytesIO()
+                log_file = BytesIO()
                 try:
-                    raw_logs = BytesIO(self.__download_full_log__(test_job.job_id))
+                    log_file = self.__download_full_log__(test_job.job_id)
                 except Exception:
                     self.log_warn(("Logs for job %s are not available" % test_job.job_id) + "\n" + traceback.format_exc())
-                return self.__parse_results__(data, test_job, raw_logs)
+                with log_file:
+                    return self.__parse_results__(data, test_job, LogLines(log_file))
         except xmlrpc.client.ProtocolError as error:
             raise TemporaryFetchIssue(self.url_remove_token(str(error)))
         except xmlrpc.client.Fault as fault:
@@ -164,6 +214,40 @@ class Backend(BaseBackend):
                 raise TemporaryFetchIssue(self.url_remove_token(str(fault)))
             else:
                 raise FetchIssue(self.url_remove_token(str(fault)))
+        finally:
+            self.__close_session__()
+
+    def job_statuses(self, test_jobs):
+        # there is no way of listing jobs by id over XML-RPC; multinode
+        # jobs (e.g. "1234.0") are left to be fetched one by one as well
+        if self.use_xml_rpc:
+            return None
+
+        test_jobs_by_job_id = defaultdict(list)
+        for test_job in test_jobs:
+            if test_job.job_id and test_job.job_id.isdigit():
+                test_jobs_by_job_id[test_job.job_id].append(test_job)
+        if not test_jobs_by_job_id:
+            return {}
+
+        statuses = {}
+        try:
+            response = self.__get_page__(urljoin(
+                self.api_url_base,
+                "jobs/?id__in=%s&limit=%d" % (",".join(test_jobs_by_job_id), len(test_jobs_by_job_id))
+            ))
+            while response.status_code == 200:
+                content = response.json()
+                for job in content['results']:
+                    for test_job in test_jobs_by_job_id.get(str(job['id']), []):
+                        statuses[test_job.id] = job['state']
+                if content['next']:
+                    response = self.__get_page__(content['next'])
+                else:
+                    break
+        finally:
+            self.__close_session__()
+        return statuses
 
     def listen(self):
         if not self.listen_websocket():
@@ -248,7 +332,9 @@ class Backend(BaseBackend):
     def __init__(self, data):
         super(Backend, self).__init__(data)
         self.complete_statuses = ['Complete', 'Incomplete', 'Canceled', 'Finished']
+        self.running_statuses = ['Running']
         self.__proxy__ = None
+        self.__session__ = None
         self.use_xml_rpc = True
         url = None
         self.authentication = None
@@ -316,6 +402,41 @@ class Backend(BaseBackend):
             )
         return self.__proxy__
 
+    @property
+    def session(self):
+        """
+        A requests.Session shared by all of the REST API calls that fetch
+        results, so that connections to the LAVA server are kept alive and
+        reused, including by concurrent calls (see __get_testjob_results_yaml__).
+        """
+        if self.__session__ is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_maxsize=self.__fetch_workers__())
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            if self.authentication:
+                session.headers.update(self.authentication)
+            self.__session__ = session
+        return self.__session__
+
+    def __close_session__(self):
+        """
+        Closes the connections of the session, if any. It is closed at the
+        end of each fetch, and a new one is opened by the next one.
+        """
+        if self.__session__ is not None:
+            self.__session__.close()
+            self.__session__ = None
+
+    def __fetch_workers__(self):
+        return max(1, int(self.settings.get(fetch_workers_variable_name, DEFAULT_FETCH_WORKERS)))
+
+    def __get_page__(self, url):
+        return self.session.get(
+            url,
+            timeout=self.settings.get(timeout_variable_name, DEFAULT_TIMEOUT)
+        )
+
     def get_listener_url(self):
         url = urlsplit(self.data.url)
         hostname = url.netloc
@@ -443,36 +564,49 @@ class Backend(BaseBackend):
         raise FetchIssue(response.text)
 
     def __download_full_log__(self, job_id):
-        response = None
-        if self.use_xml_rpc:
-            url = self.data.url.replace('/RPC2', '/scheduler/job/%s/log_file/plain' % job_id)
-            payload = {"user": self.data.username, "token": self.data.token}
-            try:
+        """
+        Downloads the log of the given job, in chunks, into a temporary
+        file, and returns that file. The file is empty if the log could not
+        be downloaded.
+        """
+        log_file = tempfile.TemporaryFile()
+        try:
+            if self.use_xml_rpc:
+                url = self.data.url.replace('/RPC2', '/scheduler/job/%s/log_file/plain' % job_id)
+                payload = {"user": self.data.username, "token": self.data.token}
                 response = requests.get(
                     url,
                     params=payload,
-                    timeout=self.settings.get(timeout_variable_name, DEFAULT_TIMEOUT)
+                    timeout=self.settings.get(timeout_variable_name, DEFAULT_TIMEOUT),
+                    stream=True,
                 )
-
-            except requests.exceptions.RequestException:
-                self.log_error("Unable to download log for {backend_name}/{job_id}".format(backend_name=self.data.name, job_id=job_id))
-        else:
-            try:
+            else:
                 response = requests.get(
                     urljoin(self.api_url_base, "jobs/%s/logs/" % (job_id)),
                     headers=self.authentication,
-                    timeout=self.settings.get(timeout_variable_name, DEFAULT_TIMEOUT)
+                    timeout=self.settings.get(timeout_variable_name, DEFAULT_TIMEOUT),
+                    stream=True,
                 )
-            except requests.exceptions.RequestException:
-                self.log_error("Unable to download log for {backend_name}/{job_id}".format(backend_name=self.data.name, job_id=job_id))
-        if response and response.status_code == 200:
-            return response.content
-        return b''
+            with response:
+                if response.status_code == 200:
+                    for chunk in response.iter_content(chunk_size=LOG_CHUNK_SIZE):
+                        log_file.write(chunk)
+        except requests.exceptions.RequestException:
+            self.log_error("Unable to download log for {backend_name}/{job_id}".format(backend_name=self.data.name, job_id=job_id))
+            log_file.truncate(0)
+        log_file.seek(0)
+        return log_file
 
     def __download_test_log__(self, raw_log, log_start, log_end):
+        """
+        raw_log: a LogLines, or a binary file with the job log
+        """
         if not log_start:
             return ""
 
+        if not isinstance(raw_log, LogLines):
+            raw_log = LogLines(raw_log)
+
         return_lines = StringIO()
         log_start_line = int(log_start)
         log_end_line = None
@@ -480,20 +614,12 @@ class Backend(BaseBackend):
             log_end_line = int(log_end)
         else:
             log_end_line = log_start_line + 2  # LAVA sometimes misses the signals
-        raw_log.seek(0)
-        counter = 0
-        for line in raw_log:
-            counter += 1
-            if counter < log_start_line:
-                continue
+        for line in raw_log.read(log_start_line, max(log_start_line, log_end_line)):
             try:
                 return_lines.write(line.decode("utf-8"))
             except UnicodeDecodeError:
                 return_lines.write(line.decode("iso-8859-1"))
             return_lines.write("\n")
-            if counter >= log_end_line:
-                break
-        raw_log.seek(0)
         return return_lines.getvalue()
 
     def __parse_log__(self, log_data):
@@ -502,8 +628,11 @@ class Backend(BaseBackend):
         tmp_dict = None
         tmp_key = None
         is_value = False
-        self.log_debug("Length of log buffer: %s" % log_data.getbuffer().nbytes)
-        if log_data.getbuffer().nbytes == 0:
+        log_data.seek(0, io.SEEK_END)
+        size = log_data.tell()
+        log_data.seek(0)
+        self.log_debug("Length of log buffer: %s" % size)
+        if size == 0:
             return ""
 
         try:
@@ -563,49 +692,44 @@ class Backend(BaseBackend):
                         limit,
                         offset)
                     yaml_results = yaml.load(results, Loader=yaml.CLoader)
-                    lava_job_results = lava_job_results + yaml_results
+                    lava_job_results.extend(yaml_results)
                     if len(yaml_results) == limit:
                         offset = offset + limit
                     else:
                         break
         else:
-            suites_resp = requests.get(
-                urljoin(self.api_url_base, "jobs/%s/suites/" % (job_id)),
-                headers=self.authentication,
-                timeout=self.settings.get(timeout_variable_name, DEFAULT_TIMEOUT)
-            )
+            suites = []
+            suites_resp = self.__get_page__(urljoin(self.api_url_base, "jobs/%s/suites/" % (job_id)))
             while suites_resp.status_code == 200:
                 suites_content = suites_resp.json()
-                for suite in suites_content['results']:
-                    tests_resp = requests.get(
-                        urljoin(self.api_url_base, "jobs/%s/suites/%s/tests" % (job_id, suite['id'])),
-                        headers=self.authentication,
-                        timeout=self.settings.get(timeout_variable_name, DEFAULT_TIMEOUT)
-                    )
-                    while tests_resp.status_code == 200:
-                        tests_content = tests_resp.json()
-                        for test in tests_content['results']:
-                            test['suite'] = suite['name']
-                        lava_job_results = lava_job_results + tests_content['results']
-                        if tests_content['next']:
-                            tests_resp = requests.get(
-                                tests_content['next'],
-                                headers=self.authentication,
-                                timeout=self.settings.get(timeout_variable_name, DEFAULT_TIMEOUT)
-                            )
-                        else:
-                            break
+                suites.extend(suites_content['results'])
                 if suites_content['next']:
-                    suites_resp = requests.get(
-                        suites_content['next'],
-                        headers=self.authentication,
-                        timeout=self.settings.get(timeout_variable_name, DEFAULT_TIMEOUT)
-                    )
+                    suites_resp = self.__get_page__(suites_content['next'])
                 else:
                     break
 
+            # Suites are fetched concurrently, each one page after the other,
+            # and their results are kept in the order of the suites
+            with ThreadPoolExecutor(max_workers=self.__fetch_workers__()) as executor:
+                for suite_results in executor.map(lambda suite: self.__get_suite_results__(job_id, suite), suites):
+                    lava_job_results.extend(suite_results)
+
         return lava_job_results
 
+    def __get_suite_results__(self, job_id, suite):
+        suite_results = []
+        tests_resp = self.__get_page__(urljoin(self.api_url_base, "jobs/%s/suites/%s/tests" % (job_id, suite['id'])))
+        while tests_resp.status_code == 200:
+            tests_content = tests_resp.json()
+            for test in tests_content['results']:
+                test['suite'] = suite['name']
+            suite_results.extend(tests_content['results'])
+            if tests_content['next']:
+                tests_resp = self.__get_page__(tests_content['next'])
+            else:
+                break
+        return suite_results
+
     def __get_publisher_event_socket__(self):
         if self.use_xml_rpc:
             return self.proxy.scheduler.get_publisher_event_socket()
@@ -719,7 +843,7 @@ class Backend(BaseBackend):
                     if error_type in ['Infrastructure', 'Job', 'Test']:
                         self.__resubmit_job__(test_job, metadata)
         attachments = {}
-        return (data[status_key], completed, job_metadata, results, metrics, self.__parse_log__(raw_logs), attachments)
+        return (data[status_key], completed, job_metadata, results, metrics, self.__parse_log__(raw_logs.file), attachments)
 
     def __resubmit_job__(self, test_job, metadata):
         infra_messages_re_list = []
@@ -774,6 +898,8 @@ class Backend(BaseBackend):
             data = self.__get_job_details__(lava_id)
             definition = yaml.safe_load(data['definition'])
             job.name = definition['job_name'][:255]
+        if job.job_status in self.running_statuses:
+            self.data.schedule_poll(job, job.job_status, self)
         job.save()
         if job.job_status in self.complete_statuses:
             self.log_info("scheduling fetch for job %s" % job.job_id)
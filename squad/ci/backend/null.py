@@ -15,6 +15,9 @@ class Backend:
     actual backend, it's not mandatory to implement every method.
     """
 
+    complete_statuses = []
+    running_statuses = []
+
     def __init__(self, data):
         self.data = data
         self.settings = {}
@@ -85,6 +88,22 @@ class Backend:
         """
         raise NotImplementedError
 
+    def job_statuses(self, test_jobs):
+        """
+        Probes the backend service for the current status of the given test
+        jobs, in as few requests as possible. Used when polling, so that only
+        the jobs that are finished get fetched.
+
+        The return value must be a dictionary mapping the ids of the test
+        jobs (not their job ids in the backend) to their status. Jobs with a
+        status listed in `complete_statuses` are fetched, as well as the ones
+        missing from the dictionary. Jobs with a status listed in
+        `running_statuses` are probed again sooner than the others. Returning
+        None, as this default implementation does, means that all jobs are
+        fetched.
+        """
+        return None
+
     def listen(self):
         """
         Listens the backend service for realtime test results. What to do with
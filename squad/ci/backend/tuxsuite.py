@@ -1,11 +1,14 @@
 import base64
 import hashlib
+import io
 import logging
 import re
 import requests
+import tempfile
 import yaml
 import json
 
+from array import array
 from requests.adapters import HTTPAdapter, Retry
 from functools import reduce
 from urllib.parse import urljoin
@@ -34,6 +37,64 @@ description = "TuxSuite"
 requests_session = None
 
 
+# target logs up to this size are kept in memory, larger ones go to disk
+LOG_SPOOL_MAX_SIZE = 10 * 1024 * 1024
+
+
+class TargetLog(object):
+    """
+    Target lines of a LAVA yaml log, kept in a spooled temporary file instead
+    of a list of strings. Lines are numbered as in the yaml log; lines that
+    are not target output are empty. The offset of every line in the file is
+    recorded so that any range of lines can be read back by seeking to it.
+    """
+
+    def __init__(self):
+        self.file = tempfile.SpooledTemporaryFile(max_size=LOG_SPOOL_MAX_SIZE)
+        self.offsets = array('Q', [0])
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def append(self, line):
+        if line:
+            self.file.write(line.encode() + b'\n')
+        self.offsets.append(self.file.tell())
+
+    def lines(self, start, end):
+        """
+        Returns the non-empty lines in `start:end`, sliced like a list of
+        all the lines of the log would be.
+        """
+        lines = []
+        for index in range(len(self))[start:end]:
+            offset = self.offsets[index]
+            length = self.offsets[index + 1] - offset
+            if length:
+                self.file.seek(offset)
+                lines.append(self.file.read(length - 1).decode())
+        self.file.seek(0, io.SEEK_END)
+        return lines
+
+    def text(self):
+        """
+        Returns all the non-empty lines, joined by newlines.
+        """
+        self.file.seek(0)
+        text = self.file.read()[:-1].decode()
+        self.file.seek(0, io.SEEK_END)
+        return text
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
 class Backend(BaseBackend):
     def has_resubmit(self):
         return False
@@ -402,81 +463,77 @@ class Backend(BaseBackend):
         # Retrieve YAML log
         # NOTE: using `yaml.safe_load` consumes a LOT of memory, avoid when possible
         logger.debug("Downloading logs as yaml")
-        log_data = []
-        response = self.fetch_url(results["download_url"], 'lava-logs.yaml', stream=True)
-        for line in response.iter_lines():
-            if line is None:
-                continue
+        with TargetLog() as log_data:
+            response = self.fetch_url(results["download_url"], 'lava-logs.yaml', stream=True)
+            for line in response.iter_lines():
+                if line is None:
+                    continue
 
-            line = line.decode("utf-8")
+                line = line.decode("utf-8")
 
-            if '"target"' not in line:
-                log_data.append(None)
-                continue
+                if '"target"' not in line:
+                    log_data.append(None)
+                    continue
 
-            try:
                 # 64 is the start of the target log in yaml log files
                 # -2 is to cut off the end of log line that yaml format has: "}
-                raw_line = line[64:-2]
-                log_data.append(raw_line)
-            except IndexError:
-                log_data.append(None)
-
-        # Retrieve plain text log
-        logs = '\n'.join([line for line in log_data if line])
-
-        attachment_list = ["reproducer", "tux_plan.yaml"]
-        attachments = {}
-        for name in attachment_list:
-            logger.debug(f"Downloading {name}")
-            response = self.fetch_url(job_url + '/', name)
-            if response.ok:
-                attachments[name] = ContentFile(response.content)
-
-        # Follow up the chain and retrieve build name
-        self.set_build_name(test_job, job_url, results, metadata, settings)
-
-        # Create a boot test
-        boot_test_name = 'boot/' + (metadata.get('build_name') or 'boot')
-        tests[boot_test_name] = {'result': results['results']['boot']}
-
-        def filter_log(line):
-            return line and not line.startswith("<LAVA_SIGNAL_")
-
-        # Really fetch test results
-        tests_results = self.fetch_url(job_url + '/', 'results').json()
-        if tests_results.get('error', None) is None:
-            for suite, suite_tests in tests_results.items():
-                suite_name = re.sub(r'^[0-9]+_', '', suite)
-                for name, test_data in suite_tests.items():
-                    test_name = f'{suite_name}/{name}'
-                    result = test_data.get('result')
-                    if not result:
-                        continue
-                    if "starttc" in test_data:
-                        try:
-                            # LAVA data counts from 1, we count from 0
-                            starttc = int(test_data["starttc"]) - 1
-                        except ValueError:
+                log_data.append(line[64:-2])
+
+            # Retrieve plain text log
+            logs = log_data.text()
+
+            attachment_list = ["reproducer", "tux_plan.yaml"]
+            attachments = {}
+            for name in attachment_list:
+                logger.debug(f"Downloading {name}")
+                response = self.fetch_url(job_url + '/', name)
+                if response.ok:
+                    attachments[name] = ContentFile(response.content)
+
+            # Follow up the chain and retrieve build name
+            self.set_build_name(test_job, job_url, results, metadata, settings)
+
+            # Create a boot test
+            boot_test_name = 'boot/' + (metadata.get('build_name') or 'boot')
+            tests[boot_test_name] = {'result': results['results']['boot']}
+
+            def filter_log(line):
+                return line and not line.startswith("<LAVA_SIGNAL_")
+
+            # Really fetch test results
+            tests_results = self.fetch_url(job_url + '/', 'results').json()
+            if tests_results.get('error', None) is None:
+                for suite, suite_tests in tests_results.items():
+                    suite_name = re.sub(r'^[0-9]+_', '', suite)
+                    for name, test_data in suite_tests.items():
+                        test_name = f'{suite_name}/{name}'
+                        result = test_data.get('result')
+                        if not result:
                             continue
-                        if "endtc" in test_data:
+                        if "starttc" in test_data:
                             try:
-                                # no -1 as the second index of the slice needs to be
-                                # greater than the first to get at least one item.
-                                endtc = int(test_data["endtc"])
+                                # LAVA data counts from 1, we count from 0
+                                starttc = int(test_data["starttc"]) - 1
                             except ValueError:
+                                continue
+                            if "endtc" in test_data:
+                                try:
+                                    # no -1 as the second index of the slice needs to be
+                                    # greater than the first to get at least one item.
+                                    endtc = int(test_data["endtc"])
+                                except ValueError:
+                                    endtc = starttc + 2
+                            else:
                                 endtc = starttc + 2
+                            log_lines = [
+                                line.replace("\x00", "")
+                                for line in log_data.lines(starttc, endtc)
+                                if filter_log(line)
+                            ]
+                            log_snippet = "\n".join(log_lines)
                         else:
-                            endtc = starttc + 2
-                        log_lines = [
-                            line.replace("\x00", "")
-                            for line in log_data[starttc:endtc]
-                            if filter_log(line)
-                        ]
-                        log_snippet = "\n".join(log_lines)
-                    else:
-                        log_snippet = None
-                    tests[test_name] = {"result": result, "log": log_snippet}
+                            log_snippet = None
+                        tests[test_name] = {"result": result, "log": log_snippet}
 
         return status, completed, metadata, tests, metrics, logs, attachments
 
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-17 08:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ci', '0030_testjob_subtasks_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testjob',
+            name='next_poll_at',
+            field=models.DateTimeField(blank=True, default=None, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='testjob',
+            index=models.Index(fields=['backend', 'fetched', 'next_poll_at'], name='ci_testjob_backend_6714e6_idx'),
+        ),
+    ]
@@ -3,13 +3,14 @@ import logging
 import traceback
 import yaml
 from io import StringIO
+from django.conf import settings
 from django.db import models, transaction, DatabaseError
 from django.db.models import Q
 from django.utils import timezone
 from dateutil.relativedelta import relativedelta
 
 
-from squad.core.tasks import ReceiveTestRun, UpdateProjectStatus
+from squad.core.tasks import ReceiveTestRun, ScheduleProjectStatusUpdate
 from squad.core.models import Project, Build, TestRun, slug_validator
 from squad.core.plugins import get_plugin_instance
 from squad.core.tasks.exceptions import InvalidMetadata, DuplicatedTestJob
@@ -23,6 +24,10 @@ from squad.ci.backend import get_backend_implementation, ALL_BACKENDS
 logger = logging.getLogger()
 
 
+# number of test jobs whose status is probed at once when polling
+POLL_BATCH_SIZE = 100
+
+
 def list_backends():
     for backend in ALL_BACKENDS:
         yield backend
@@ -49,22 +54,90 @@ class Backend(models.Model):
     listen_enabled = models.BooleanField(default=True)
 
     def poll(self):
+        """
+        Yields the test jobs that are due for a fetch. The implementation is
+        first asked, in batches, for the status of those jobs: the ones that
+        are reported as not complete yet are not fetched, but only scheduled
+        to be probed again later (see schedule_poll). The jobs that are
+        yielded are not due again until one poll interval later.
+
+        Jobs that were never scheduled are due once the poll interval has
+        passed since their last fetch attempt.
+        """
         if not self.poll_enabled:
             return
+        now = timezone.now()
+        last_poll = now - relativedelta(minutes=self.poll_interval)
         test_jobs = self.test_jobs.filter(
+            Q(next_poll_at__lte=now) | Q(
+                Q(last_fetch_attempt__isnull=True) | Q(last_fetch_attempt__lt=last_poll),
+                next_poll_at__isnull=True,
+            ),
             submitted=True,
             fetched=False,
-            fetch_attempts__lt=self.max_fetch_attempts
-        )
+            fetch_attempts__lt=self.max_fetch_attempts,
+        ).order_by('id')
+
+        batch = []
+        for test_job in test_jobs.iterator(chunk_size=POLL_BATCH_SIZE):
+            batch.append(test_job)
+            if len(batch) == POLL_BATCH_SIZE:
+                yield from self.__probe__(batch)
+                batch = []
+        if batch:
+            yield from self.__probe__(batch)
+
+    def __probe__(self, test_jobs):
+        implementation = self.get_implementation()
+        try:
+            statuses = implementation.job_statuses(test_jobs)
+        except Exception as e:
+            logger.warning("error probing the status of jobs in %s: %s" % (self.name, str(e)))
+            statuses = None
+
+        # every job gets stamped before it is handed over to be fetched, and
+        # is only due again one poll interval later: a fetch that is still
+        # waiting in the queue then does not get queued once more by the
+        # next polls
+        now = timezone.now()
+        due = []
         for test_job in test_jobs:
-            last = test_job.last_fetch_attempt
-            if last:
-                now = timezone.now()
-                next_poll = last + relativedelta(minutes=self.poll_interval)
-                if now > next_poll:
-                    yield test_job
+            status = None if statuses is None else statuses.get(test_job.id)
+            test_job.last_fetch_attempt = now
+            if status is None or status in implementation.complete_statuses:
+                test_job.next_poll_at = now + relativedelta(minutes=self.poll_interval)
+                due.append(test_job)
             else:
-                yield test_job
+                self.schedule_poll(test_job, status, implementation)
+
+        TestJob.objects.bulk_update(test_jobs, ['last_fetch_attempt', 'next_poll_at'])
+        yield from due
+
+    def schedule_poll(self, test_job, status=None, implementation=None):
+        """
+        Sets when test_job should be polled next, given its status in the
+        backend. Running jobs are checked again shortly, so their results
+        are fetched soon after they finish. Other jobs back off
+        exponentially: each one waits for half of the time the job has been
+        waiting so far, no less than poll_interval and no more than
+        SQUAD_CI_POLL_MAX_BACKOFF times it.
+
+        Callers that already have the implementation of this backend should
+        pass it in, so that it is not created again for every job.
+        """
+        if implementation is None:
+            implementation = self.get_implementation()
+        now = timezone.now()
+        if status in implementation.running_statuses:
+            minutes = min(self.poll_interval, settings.SQUAD_CI_POLL_RUNNING_INTERVAL)
+        else:
+            since = test_job.submitted_at or test_job.created_at or now
+            waited = (now - since).total_seconds() / 60
+            minutes = min(
+                max(waited / 2, self.poll_interval),
+                self.poll_interval * settings.SQUAD_CI_POLL_MAX_BACKOFF,
+            )
+        test_job.next_poll_at = now + relativedelta(seconds=int(minutes * 60))
 
     def fetch(self, job_id):
         # Job statuses can be one of:
@@ -92,14 +165,17 @@ class Backend(models.Model):
             try:
                 logger.debug("Fetching job from the backend")
                 test_job.last_fetch_attempt = timezone.now()
-                results = self.get_implementation().fetch(test_job)
+                implementation = self.get_implementation()
+                results = implementation.fetch(test_job)
                 if results is None:
                     # empty results mean the job is still in progress
                     # or in the queue
+                    self.schedule_poll(test_job, test_job.job_status, implementation)
                     test_job.save()
                     return
             except FetchIssue as issue:
                 logger.warning("error fetching job %s: %s" % (test_job.id, str(issue)))
+                test_job.next_poll_at = timezone.now() + relativedelta(minutes=self.poll_interval)
                 test_job.failure = str(issue)
                 test_job.fetched = not issue.retry
                 test_job.fetch_attempts += 1
@@ -240,8 +316,10 @@ class Backend(models.Model):
 
 class TestJobManager(models.Manager):
 
+    PENDING = Q(fetched=False) | Q(job_status='Fetching')
+
     def pending(self):
-        return self.filter(Q(fetched=False) | Q(job_status='Fetching'))
+        return self.filter(self.PENDING)
 
 
 class TestJob(models.Model):
@@ -277,6 +355,7 @@ class TestJob(models.Model):
     fetched = models.BooleanField(default=False)
     fetch_attempts = models.IntegerField(default=0)
     last_fetch_attempt = models.DateTimeField(null=True, default=None, blank=True)
+    next_poll_at = models.DateTimeField(null=True, default=None, blank=True)
     failure = models.TextField(null=True, blank=True)
 
     can_resubmit = models.BooleanField(default=False)
@@ -407,7 +486,7 @@ class TestJob(models.Model):
         self.save()
 
         if self.testrun:
-            UpdateProjectStatus()(self.testrun)
+            ScheduleProjectStatusUpdate()(self.testrun)
 
     def __str__(self):
         return "%s/%s" % (self.backend.name, self.job_id)
@@ -416,6 +495,8 @@ class TestJob(models.Model):
         # This index speeds up Backend.poll(), where it queries submitted and fetched together
         indexes = [
             models.Index(fields=['submitted', 'fetched']),
+            # and this one lets it find the jobs that are due to be polled
+            models.Index(fields=['backend', 'fetched', 'next_poll_at']),
         ]
 
     @staticmethod
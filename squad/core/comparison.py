@@ -1,16 +1,383 @@
-from collections import OrderedDict, defaultdict
-from django.db.models import F
+from array import array
+from collections import Counter, OrderedDict, defaultdict
+from collections.abc import Mapping, Sequence
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, CharField, Count, Exists, F, OuterRef, Q, Value, When
+from django.db.models.functions import Concat
 from django.db.models import prefetch_related_objects
-from itertools import groupby
 from functools import reduce
-import statistics
+from itertools import groupby
+import operator
+import re
 
 
-from squad.core.queries import test_confidence
-from squad.core.utils import parse_name, join_name, split_dict
+from squad.core.queries import status_confidence
+from squad.core.statistics import measurements_stats
+from squad.core.utils import parse_name, join_name, split_iterable
 from squad.core import models
 
 
+def cached_comparison(kind, baseline, target, compute, *generations):
+    """
+    Returns what `compute` returns for comparing `target` against
+    `baseline`, caching it. The cache key includes the current generation of
+    both builds, which changes whenever either of them gets new results, plus
+    any extra `generations` the comparison depends on, so stale entries are
+    never looked up again. Generations come from the database, so this holds
+    even when each process has a cache of its own.
+
+    `compute` should return plain lists and strings only, so that cached
+    entries stay small.
+    """
+    key = 'comparison:%s:%s:%s:%s' % (
+        kind,
+        *models.Build.comparison_generations(baseline, target),
+        ':'.join(generations),
+    )
+    data = cache.get(key)
+    if data is None:
+        data = compute()
+        cache.set(key, data, settings.SQUAD_COMPARISON_CACHE_TIMEOUT)
+    return data
+
+
+# Test statuses as stored in TestResultsTable; 0 means there is no result
+STATUSES = ('n/a', 'pass', 'fail', 'xfail', 'skip')
+STATUS_CODES = {status: code for code, status in enumerate(STATUSES)}
+
+# Number of test runs, or of test names, fetched in a single query
+TEST_RESULTS_BATCH_SIZE = 500
+
+NONZERO = re.compile(b'[^\x00]')
+
+
+# Same as Test.status, for annotating querysets
+TEST_STATUS = Case(
+    When(result=True, then=Value('pass')),
+    When(result__isnull=True, then=Value('skip')),
+    When(has_known_issues=True, then=Value('xfail')),
+    default=Value('fail'),
+)
+
+
+# Filters for the tests with each status
+STATUS_FILTERS = OrderedDict([
+    ('pass', Q(result=True)),
+    ('fail', Q(result=False) & ~Q(has_known_issues=True)),
+    ('xfail', Q(result=False, has_known_issues=True)),
+    ('skip', Q(result__isnull=True)),
+])
+
+
+def status_code(result, has_known_issues):
+    if result:
+        return STATUS_CODES['pass']
+    elif result is None:
+        return STATUS_CODES['skip']
+    elif has_known_issues:
+        return STATUS_CODES['xfail']
+    else:
+        return STATUS_CODES['fail']
+
+
+def rows_mask(columns_pairs, size):
+    """
+    Given pairs of columns (bytearrays of `size` status codes), returns a
+    bytearray flagging the rows where any of the pairs differ. Columns are
+    compared as whole integers, so that rows are not looped over in Python.
+    """
+    mask = 0
+    for before, after in columns_pairs:
+        if before != after:
+            mask |= int.from_bytes(before, 'little') ^ int.from_bytes(after, 'little')
+    return mask.to_bytes(size, 'little')
+
+
+def flagged_rows(mask):
+    return array('l', (m.start() for m in NONZERO.finditer(mask)))
+
+
+class TestResultsTable(object):
+    """
+    Results of all the tests of a set of builds, kept in columns: one per
+    (Build, environment slug) pair, holding the status code of every test
+    (row) in a bytearray. Rows are identified by the id of the metadata of
+    their tests, and test names are only looked up for the rows that are
+    actually needed.
+
+    A cell with more than one result, i.e. a test that ran more than once in
+    the same build and environment, holds the most common status, and its
+    confidence is kept apart in `confidences`.
+    """
+
+    __test__ = False
+
+    def __init__(self, columns, tests):
+        """
+        columns: list of (Build, environment slug) pairs
+        tests: queryset with all the tests of the builds being compared
+        """
+        self.columns = columns
+        self.column_index = {column: index for index, column in enumerate(columns)}
+        self.cells = [bytearray() for _ in columns]
+        self.metadata_ids = array('q')
+        self.rows = {}
+        self.tests = tests
+        self.confidences = {}
+        self.__duplicates__ = {}
+
+    def __len__(self):
+        return len(self.metadata_ids)
+
+    def add(self, metadata_id, column, code):
+        row = self.rows.get(metadata_id)
+        if row is None:
+            row = self.rows[metadata_id] = len(self.metadata_ids)
+            self.metadata_ids.append(metadata_id)
+            for cells in self.cells:
+                cells.append(0)
+
+        cells = self.cells[column]
+        if cells[row] == 0:
+            cells[row] = code
+            return
+
+        counts = self.__duplicates__.get((row, column))
+        if counts is None:
+            counts = self.__duplicates__[(row, column)] = Counter([STATUSES[cells[row]]])
+        counts[STATUSES[code]] += 1
+
+    def finish(self):
+        """
+        Settles the status of the cells with duplicated results. Must be
+        called once all of the tests were added.
+        """
+        for (row, column), counts in self.__duplicates__.items():
+            status, confidence = status_confidence(counts)
+            self.cells[column][row] = STATUS_CODES[status]
+            self.confidences[(row, column)] = confidence
+        self.__duplicates__ = {}
+
+    def column(self, build, environment):
+        index = self.column_index.get((build, environment))
+        if index is None:
+            return bytes(len(self))
+        return self.cells[index]
+
+    def row_results(self, row, confidence=True):
+        results = OrderedDict()
+        for index, (build, environment) in enumerate(self.columns):
+            code = self.cells[index][row]
+            if code == 0:
+                continue
+            if confidence and (row, index) in self.confidences:
+                results[(build, environment)] = [STATUSES[code], self.confidences[(row, index)]]
+            else:
+                results[(build, environment)] = STATUSES[code]
+        return results
+
+    def names(self, rows=None):
+        """
+        Returns a dictionary with the full names of the given rows, or of all
+        of them.
+        """
+        names = {}
+        if rows is None:
+            metadata = models.SuiteMetadata.objects.filter(id__in=self.tests.values('metadata_id'))
+            batches = [metadata.values_list('id', 'suite', 'name').order_by().iterator()]
+        else:
+            batches = (
+                models.SuiteMetadata.objects.filter(
+                    id__in=[self.metadata_ids[row] for row in batch]
+                ).values_list('id', 'suite', 'name').order_by()
+                for batch in split_iterable(rows, TEST_RESULTS_BATCH_SIZE)
+            )
+
+        for batch in batches:
+            for metadata_id, suite, name in batch:
+                row = self.rows.get(metadata_id)
+                if row is not None:
+                    names[row] = join_name(suite, name)
+        return names
+
+    def find(self, full_name):
+        suite, name = parse_name(full_name)
+        metadata_ids = models.SuiteMetadata.objects.filter(kind='test', suite=suite, name=name).values_list('id', flat=True)
+        for metadata_id in metadata_ids:
+            if metadata_id in self.rows:
+                return self.rows[metadata_id]
+        return None
+
+    def diff_rows(self, builds, environments, rows=None):
+        """
+        Returns the rows, out of `rows` or all of them, whose results differ
+        between any two consecutive builds, considering the given
+        environments of each build (see BaseComparison.diff).
+        """
+        pairs = []
+        previous = None
+        for build in builds:
+            current = [self.column(build, env) for env in environments[build]]
+            if previous:
+                if len(previous) != len(current):
+                    # builds with different numbers of environments never
+                    # have the same results
+                    return self.__select__(b'\x01' * len(self), rows)
+                pairs += zip(previous, current)
+            previous = current
+
+        return self.__select__(rows_mask(pairs, len(self)), rows)
+
+    def transition_rows(self, before, after, environment, transitions, rows=None):
+        """
+        Returns the rows, out of `rows` or all of them, whose status changes
+        in `environment` from `before` to `after` according to any of the
+        given (status, status) transitions.
+        """
+        before_cells = self.column(before, environment)
+        after_cells = self.column(after, environment)
+
+        mask = 0
+        for status_before, status_after in transitions:
+            if status_before not in STATUS_CODES or status_after not in STATUS_CODES:
+                continue
+            flags_before = int.from_bytes(before_cells.translate(self.__equals__(status_before)), 'little')
+            flags_after = int.from_bytes(after_cells.translate(self.__equals__(status_after)), 'little')
+            mask |= flags_before & flags_after
+        return self.__select__(mask.to_bytes(len(self), 'little'), rows)
+
+    def __equals__(self, status):
+        # translation table that flags cells with the given status
+        code = STATUS_CODES[status]
+        return bytes([1 if c == code else 0 for c in range(256)])
+
+    def __select__(self, mask, rows):
+        if rows is None:
+            return flagged_rows(mask)
+        return array('l', (row for row in rows if mask[row]))
+
+
+class TestResults(Mapping):
+    """
+    Read-only mapping of test full names to their results, the same as
+    BaseComparison.results, for a subset of the rows of a TestResultsTable.
+    Rows are sorted by full name when first iterated over; the names
+    themselves are looked up again only for the rows that are read, e.g.
+    for a single page of `items()`.
+    """
+
+    __test__ = False
+
+    def __init__(self, table, rows=None, confidence=True):
+        self.table = table
+        self.rows = rows if rows is not None else array('l', range(len(table)))
+        self.confidence = confidence
+        self.__order__ = None
+        self.__rows_set__ = None
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def order(self):
+        if self.__order__ is None:
+            all_rows = len(self.rows) == len(self.table)
+            names = self.table.names(None if all_rows else self.rows)
+            self.__order__ = array('l', sorted(self.rows, key=lambda row: names[row]))
+        return self.__order__
+
+    def __iter__(self):
+        for name, _ in self.items():
+            yield name
+
+    def __getitem__(self, full_name):
+        row = self.table.find(full_name)
+        if self.__rows_set__ is None:
+            self.__rows_set__ = set(self.rows)
+        if row is None or row not in self.__rows_set__:
+            raise KeyError(full_name)
+        return self.table.row_results(row, self.confidence)
+
+    def items(self):
+        return TestResultsItems(self)
+
+    def subset(self, rows):
+        rows = set(rows)
+        return TestResults(self.table, array('l', (row for row in self.rows if row in rows)), self.confidence)
+
+
+class TestResultsPage(TestResults):
+    """
+    TestResults for a single page of the results of a comparison, whose rows
+    were picked, and sorted by full name, in the database. `count` is the
+    number of results in all of the pages, and `offset` is the position of
+    the first row of this page among them.
+    """
+
+    def __init__(self, table, rows, count, offset, confidence=True):
+        super().__init__(table, rows, confidence)
+        self.__order__ = self.rows
+        self.count = count
+        self.offset = offset
+
+    def items(self):
+        return TestResultsPageItems(self)
+
+
+class TestResultsItems(Sequence):
+    """
+    (full name, results) pairs of TestResults, in order. Slices only look
+    up the names of their own rows, so that paginating over all of the
+    results costs one query per page.
+    """
+
+    __test__ = False
+
+    def __init__(self, results):
+        self.results = results
+
+    def __len__(self):
+        return len(self.results)
+
+    def __materialize__(self, rows):
+        table = self.results.table
+        names = table.names(rows)
+        return [(names[row], table.row_results(row, self.results.confidence)) for row in rows]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.__materialize__(self.results.order[index])
+        return self.__materialize__([self.results.order[index]])[0]
+
+    def __iter__(self):
+        for rows in split_iterable(self.results.order, TEST_RESULTS_BATCH_SIZE):
+            for item in self.__materialize__(rows):
+                yield item
+
+
+class TestResultsPageItems(TestResultsItems):
+    """
+    Items of a TestResultsPage, posing as the items of all of the results of
+    the comparison: their length is the count of all of them, and slices and
+    indexes are taken relative to the offset of the page, so that they can
+    be handed over to a Paginator as is.
+    """
+
+    def __len__(self):
+        return self.results.count
+
+    def __getitem__(self, index):
+        offset = self.results.offset
+        if isinstance(index, slice):
+            start = max((index.start or 0) - offset, 0)
+            stop = None if index.stop is None else max(index.stop - offset, 0)
+            return self.__materialize__(self.results.order[start:stop])
+        if index < offset:
+            raise IndexError(index)
+        return self.__materialize__([self.results.order[index - offset]])[0]
+
+
 class BaseComparison(object):
     """
     Data structure:
@@ -100,9 +467,9 @@ class BaseComparison(object):
         self.__extract_results__()
 
     @classmethod
-    def compare_builds(cls, *builds):
+    def compare_builds(cls, *builds, **kwargs):
         builds = [b for b in builds if b]
-        return cls(*builds)
+        return cls(*builds, **kwargs)
 
     @classmethod
     def compare_projects(cls, *projects):
@@ -211,8 +578,25 @@ class MetricComparison(BaseComparison):
         if self.builds[0] is None:
             # No baseline is present, then no comparison is needed
             return
+
+        regressions, fixes = cached_comparison(
+            'metrics',
+            self.builds[0],
+            self.builds[1],
+            self.__compute_regressions_and_fixes__,
+            models.MetricThreshold.version(models.MetricThreshold.objects.filter(project_id=self.builds[1].project_id)),
+        )
+        self.__regressions__ = OrderedDict(regressions)
+        self.__fixes__ = OrderedDict(fixes)
+
+    def __compute_regressions_and_fixes__(self):
         target = self.builds[1]
 
+        thresholds = models.MetricThreshold.objects.filter(project=target.project, value__isnull=True).order_by('id')
+        thresholds = {t.id: t for t in thresholds}
+        if len(thresholds) == 0:
+            return [], []
+
         query = self.base_sql.copy()
         query['select'].append('target.result - baseline.result AS result')
         query['from'].append('core_metric baseline')
@@ -222,8 +606,6 @@ class MetricComparison(BaseComparison):
         metrics = [m for m in models.Metric.objects.raw(sql)]
         prefetch_related_objects(metrics, 'metadata', 'suite')
 
-        env_ids = set()
-        metrics_per_env = defaultdict(list)
         regressions = defaultdict(list)
         fixes = defaultdict(list)
         regs_and_fixes = {
@@ -237,30 +619,27 @@ class MetricComparison(BaseComparison):
             },
         }
 
+        # Each metric is matched once against all of the thresholds; results
+        # are then reported threshold by threshold, and environment by
+        # environment within each threshold
+        matcher = models.MetricThreshold.matcher(target.project)
+        matches = defaultdict(lambda: defaultdict(list))
         for metric in metrics:
-            env_id = metric.environment_id
-            env_ids.add(env_id)
-            metrics_per_env[env_id].append(metric)
-
-        thresholds = models.MetricThreshold.objects.filter(project=target.project, value__isnull=True)
-        for threshold in thresholds:
-            threshold_envs = threshold.project.environments.all() if threshold.environment is None else [threshold.environment]
-            for env in threshold_envs:
-                if env.id not in metrics_per_env:
+            for threshold_id in matcher(metric.full_name):
+                threshold = thresholds.get(threshold_id)
+                if threshold is None:
+                    continue
+                if threshold.environment_id is not None and threshold.environment_id != metric.environment_id:
                     continue
+                matches[threshold_id][metric.environment_id].append(metric)
 
-                for metric in metrics_per_env[env.id]:
-                    if not threshold.match(metric.full_name):
-                        continue
-                    regs_and_fixes[threshold.is_higher_better][metric.result > 0][env.slug].append(metric.full_name)
+        environments = dict(target.project.environments.order_by('id').values_list('id', 'slug'))
+        for threshold_id, threshold in thresholds.items():
+            for env_id, env_metrics in sorted(matches[threshold_id].items()):
+                for metric in env_metrics:
+                    regs_and_fixes[threshold.is_higher_better][metric.result > 0][environments[env_id]].append(metric.full_name)
 
-        self.__regressions__ = OrderedDict()
-        for env in regressions.keys():
-            self.__regressions__[env] = regressions[env]
-
-        self.__fixes__ = OrderedDict()
-        for env in fixes.keys():
-            self.__fixes__[env] = fixes[env]
+        return list(regressions.items()), list(fixes.items())
 
     @property
     def regressions(self):
@@ -276,23 +655,29 @@ class MetricComparison(BaseComparison):
         return self.__builds_dict__[build_id]
 
     def __extract_stats__(self, query):
+        keys = []
+        groups = []
+        for key, metrics in groupby(query, lambda x: (x['environment__slug'], x['build_id'], x['suite__slug'], x['metadata__name'])):
+            keys.append(key)
+            groups.append([
+                m['measurements'] if m['packed_measurements'] is None else m['packed_measurements']
+                for m in metrics
+            ])
+
         stats = []
-        for environment_slug, builds in groupby(query, lambda x: x['environment__slug']):
-            for build_id, suites in groupby(builds, lambda x: x['build_id']):
-                for suite_slug, metrics in groupby(suites, lambda x: x['suite__slug']):
-                    for metric_name, measurements in groupby(metrics, lambda x: x['metadata__name']):
-                        values = []
-                        for m in measurements:
-                            values += [float(v) for v in m['measurements'].split(',')]
-                        stat = {
-                            'environment_slug': environment_slug,
-                            'build_id': build_id,
-                            'full_name': join_name(suite_slug, metric_name),
-                            'mean': statistics.mean(values),
-                            'stddev': statistics.pstdev(values),
-                            'count': len(values)
-                        }
-                        stats.append(stat)
+        for (environment_slug, build_id, suite_slug, metric_name), group_stats in zip(keys, measurements_stats(groups)):
+            if group_stats is None:
+                continue
+            mean, stddev, count = group_stats
+            stat = {
+                'environment_slug': environment_slug,
+                'build_id': build_id,
+                'full_name': join_name(suite_slug, metric_name),
+                'mean': mean,
+                'stddev': stddev,
+                'count': count,
+            }
+            stats.append(stat)
         return stats
 
     def __extract_results__(self):
@@ -308,7 +693,8 @@ class MetricComparison(BaseComparison):
             'build_id',
             'suite__slug',
             'metadata__name',
-            'measurements'
+            'measurements',
+            'packed_measurements',
         ).order_by(
             'environment__slug',
             'build_id',
@@ -342,11 +728,23 @@ class TestComparison(BaseComparison):
 
     __test__ = False
 
-    def __init__(self, *builds, regressions_and_fixes_only=False):
+    def __init__(self, *builds, regressions_and_fixes_only=False, transitions=None, differences_only=False, page=None):
+        """
+        page: optional (offset, limit) pair. When given, only the results in
+        that slice of all of them, sorted by full name, are kept in
+        `results`, a TestResultsPage. Without transitions, only the tests of
+        the page are loaded at all; with them, the page is only sliced once
+        the transitions were applied, so that it holds, and `results_count`
+        counts, only the tests that actually go through them.
+        """
         self.__intermittent__ = {}
-        self.tests_with_issues = {}
         self.__failures__ = None
+        self.table = None
         self.regressions_and_fixes_only = regressions_and_fixes_only
+        self.transitions = transitions
+        self.differences_only = differences_only
+        self.page = page
+        self.results_count = None
 
         BaseComparison.__init__(self, *builds)
 
@@ -354,87 +752,242 @@ class TestComparison(BaseComparison):
 
         # New implementation below is only stable for getting regressions and fixes
         # that is used for receiving tests and generating ProjectStatus.regressions and fixes
-        # It is still not good for applying transitions and getting a comparison
-        # results table, for that, use legacy code, which is slow and eats up lots
-        # of memory
+        # For applying transitions and getting a comparison results table,
+        # all of the results are loaded into a TestResultsTable
         if self.regressions_and_fixes_only:
             self.__new_extract_results__()
             return
 
+        builds = {build.id: build for build in self.builds}
         test_runs = models.TestRun.objects.filter(
             build__in=self.builds,
-        ).prefetch_related(
-            'build',
-            'environment',
-        ).only('build', 'environment')
+        ).values_list('id', 'build_id', 'environment__slug').order_by()
 
-        test_runs_ids = {}
-        for test_run in test_runs:
-            build = test_run.build
-            env = test_run.environment.slug
+        test_runs_columns = {}
+        for test_run_id, build_id, env in test_runs:
+            build = builds[build_id]
 
             self.all_environments.add(env)
             self.environments[build].add(env)
+            test_runs_columns[test_run_id] = (build, env)
 
-            if test_runs_ids.get(test_run.id, None) is None:
-                test_runs_ids[test_run.id] = (build, env)
-
-        for ids in split_dict(test_runs_ids, chunk_size=100):
-            self.__extract_test_results__(ids)
-
-        self.__resolve_intermittent_tests__()
-
-        self.results = OrderedDict(sorted(self.results.items()))
         for build in self.builds:
             self.environments[build] = sorted(self.environments[build])
 
-    def __extract_test_results__(self, test_runs_ids):
-        self.__failures__ = OrderedDict()
+        columns = [(build, env) for build, envs in self.environments.items() for env in envs]
+        page = None
+        if self.page is not None and not self.transitions:
+            page = self.__page_metadata_ids__()
 
-        tests = models.Test.objects.filter(test_run_id__in=test_runs_ids.keys()).annotate(
-            suite_slug=F('suite__slug'),
-        ).prefetch_related('metadata').defer('log').order_by()
+        if self.differences_only:
+            self.__extract_differences__(columns, page)
+        else:
+            # With transitions, only tests that might go through them between
+            # the last two builds are loaded at all
+            tests_filter = Q()
+            if page is not None:
+                tests_filter = Q(metadata_id__in=page)
+            elif self.transitions and len(self.builds) >= 2:
+                tests_filter = self.__transitions_filter__(self.transitions)
+
+            tests = models.Test.objects.filter(tests_filter, build__in=self.builds)
+            self.table = TestResultsTable(columns, tests)
+
+            for test_runs_ids in split_iterable(test_runs_columns.keys(), TEST_RESULTS_BATCH_SIZE):
+                self.__extract_test_results__({
+                    test_run_id: self.table.column_index[test_runs_columns[test_run_id]]
+                    for test_run_id in test_runs_ids
+                }, tests_filter)
+
+        self.table.finish()
+        if page is not None:
+            rows = array('l', (self.table.rows[m] for m in page if m in self.table.rows))
+            self.results = TestResultsPage(self.table, rows, self.results_count, self.page[0])
+        else:
+            self.results = TestResults(self.table)
 
-        for test in tests:
-            build, env = test_runs_ids.get(test.test_run_id)
+        if self.transitions:
+            self.apply_transitions(self.transitions)
+            if self.page is not None:
+                offset, limit = self.page
+                self.results_count = len(self.results)
+                rows = self.results.order[offset:offset + limit]
+                self.results = TestResultsPage(self.table, rows, self.results_count, offset)
 
-            full_name = join_name(test.suite_slug, test.name)
-            if full_name not in self.results:
-                self.results[full_name] = OrderedDict()
+    def __page_metadata_ids__(self):
+        """
+        Returns the ids of the metadata of the tests in the requested page,
+        sorted by full name, and sets `results_count` to the number of tests
+        in all of the pages. Both are left to the database, so that only the
+        tests of the page itself are loaded afterwards.
+        """
+        if self.differences_only:
+            _, _, candidates = self.__differing_groups__()
+        else:
+            candidates = models.Test.objects.filter(build__in=self.builds).values('metadata_id')
 
-            key = (build, env)
-            if key in self.results[full_name]:  # Duplicate found.
-                if not isinstance(self.results[full_name][key], tuple):
-                    # Test confidence is NOT already caclulated.
-                    self.results[full_name][key] = test_confidence(test)
-            else:
-                self.results[full_name][key] = test.status
+        metadata = models.SuiteMetadata.objects.filter(id__in=candidates)
+        self.results_count = metadata.count()
 
-            if test.has_known_issues:
-                self.tests_with_issues[test.id] = (full_name, env)
+        full_name = Case(
+            When(suite='/', then=F('name')),
+            default=Concat('suite', Value('/'), 'name'),
+            output_field=CharField(),
+        )
+        offset, limit = self.page
+        ordered = metadata.annotate(full_name=full_name).order_by('full_name', 'id')
+        return list(ordered.values_list('id', flat=True)[offset:offset + limit])
 
-            if test.status == 'fail' and build.id == self.builds[-1].id:
-                if env not in self.__failures__:
-                    self.__failures__[env] = []
-                self.__failures__[env].append(test)
+    def __differing_groups__(self):
+        """
+        Returns the builds being compared, without repetitions, the tests
+        grouped by metadata and environment with the count of tests of each
+        status in each build, and the ids of the metadata with groups where
+        not every build has tests with one and the same status.
+        """
+        builds = list(OrderedDict((build.id, build) for build in self.builds).values())
+
+        counts = OrderedDict()
+        for index, build in enumerate(builds):
+            for status, status_filter in STATUS_FILTERS.items():
+                counts['build%d_%s' % (index, status)] = Count('id', filter=Q(build_id=build.id) & status_filter)
+
+        uniform = []
+        for status in STATUS_FILTERS.keys():
+            condition = Q()
+            for index in range(len(builds)):
+                condition &= Q(**{'build%d_%s__gt' % (index, status): 0})
+                for other in STATUS_FILTERS.keys():
+                    if other != status:
+                        condition &= Q(**{'build%d_%s' % (index, other): 0})
+            uniform.append(condition)
+
+        groups = models.Test.objects.filter(
+            build__in=builds,
+            metadata__isnull=False,
+        ).values('metadata_id', 'environment__slug').annotate(**counts).order_by()
+        differing = groups.filter(~reduce(operator.or_, uniform)).values('metadata_id')
+        return builds, groups, differing
+
+    def __extract_differences__(self, columns, page=None):
+        """
+        Loads only the tests whose results differ across the builds, with a
+        single pivot query: tests are grouped by metadata and environment,
+        counting the tests of each status in each build. Groups where every
+        build has tests with one and the same status are left out, and so
+        are tests that have no other groups. `page`, when given, holds the
+        ids of the metadata of the differing tests to load.
+        """
+        builds, groups, differing = self.__differing_groups__()
+        if page is not None:
+            differing = page
+
+        self.table = TestResultsTable(columns, models.Test.objects.filter(build__in=builds, metadata_id__in=differing))
+        for group in groups.filter(metadata_id__in=differing).iterator():
+            for index, build in enumerate(builds):
+                column = self.table.column_index.get((build, group['environment__slug']))
+                if column is None:
+                    continue
+                for status in STATUS_FILTERS.keys():
+                    for _ in range(group['build%d_%s' % (index, status)]):
+                        self.table.add(group['metadata_id'], column, STATUS_CODES[status])
+
+        intermittent = models.Test.objects.filter(
+            build__in=builds,
+            metadata_id__in=differing,
+            has_known_issues=True,
+            known_issues__intermittent=True,
+        ).values_list('metadata_id', 'environment__slug').distinct().order_by()
+
+        for metadata_id, env in intermittent:
+            if metadata_id in self.table.rows:
+                self.__intermittent__[(self.table.rows[metadata_id], env)] = True
+
+    def __transitions_filter__(self, transitions):
+        """
+        Returns a filter for the tests whose metadata has, in some
+        environment, a test in the second to last build and a test in the
+        last build whose statuses go through any of the given transitions;
+        'n/a' stands for no test at all. This is done with correlated
+        subqueries, so that the database only returns the tests that matter.
+
+        Tests that ran more than once are only matched loosely here (any of
+        their statuses will do), as are tests whose results do not differ in
+        other builds and environments; apply_transitions() then filters out
+        the ones that do not actually go through the transitions.
+        """
+        before = self.builds[-2]
+        after = self.builds[-1]
 
-    def __resolve_intermittent_tests__(self):
-        if len(self.tests_with_issues) == 0:
-            return
+        if before.project_id == after.project_id:
+            same_environment = {'environment_id': OuterRef('environment_id')}
+        else:
+            same_environment = {'environment__slug': OuterRef('environment__slug')}
 
-        for chunk in split_dict(self.tests_with_issues, chunk_size=100):
-            tests = models.Test.objects.filter(id__in=chunk.keys()).prefetch_related(
-                'known_issues'
-            ).only('known_issues')
-            for test in tests.all():
-                for issue in test.known_issues.all():
-                    if issue.intermittent:
-                        self.__intermittent__[chunk[test.id]] = True
-                        break
+        def exists(build, status=None):
+            tests = models.Test.objects.filter(
+                build=build,
+                metadata_id=OuterRef('metadata_id'),
+                **same_environment,
+            )
+            if status is not None:
+                tests = tests.annotate(test_status=TEST_STATUS).filter(test_status=status)
+            return Exists(tests.order_by())
+
+        after_conditions = []
+        before_conditions = []
+        for status_before, status_after in set(transitions):
+            if status_before not in STATUS_CODES or status_after not in STATUS_CODES:
+                continue
+            if status_after != 'n/a':
+                if status_before == 'n/a':
+                    condition = ~exists(before)
+                else:
+                    condition = exists(before, status_before)
+                after_conditions.append(Q(test_status=status_after) & condition)
+            elif status_before != 'n/a':
+                before_conditions.append(Q(test_status=status_before) & ~exists(after))
+
+        tests_filter = Q(pk__in=[])
+        for build, conditions in ((after, after_conditions), (before, before_conditions)):
+            if conditions:
+                candidates = models.Test.objects.filter(build=build).annotate(
+                    test_status=TEST_STATUS,
+                ).filter(reduce(operator.or_, conditions)).values('metadata_id')
+                tests_filter |= Q(metadata_id__in=candidates)
+        return tests_filter
+
+    def __extract_test_results__(self, test_runs_columns, tests_filter=Q()):
+        tests = models.Test.objects.filter(
+            tests_filter,
+            test_run_id__in=test_runs_columns.keys(),
+            metadata__isnull=False,
+        ).values_list('metadata_id', 'test_run_id', 'result', 'has_known_issues').order_by()
+
+        for metadata_id, test_run_id, result, has_known_issues in tests.iterator():
+            self.table.add(metadata_id, test_runs_columns[test_run_id], status_code(result, has_known_issues))
+
+        intermittent = models.Test.objects.filter(
+            tests_filter,
+            test_run_id__in=test_runs_columns.keys(),
+            has_known_issues=True,
+            known_issues__intermittent=True,
+        ).values_list('metadata_id', 'test_run_id').distinct().order_by()
+
+        for metadata_id, test_run_id in intermittent:
+            _, env = self.table.columns[test_runs_columns[test_run_id]]
+            self.__intermittent__[(self.table.rows[metadata_id], env)] = True
 
     __regressions__ = None
     __fixes__ = None
 
+    @property
+    def diff(self):
+        if self.__diff__ is None and self.table is not None:
+            rows = self.table.diff_rows(self.builds, self.environments, self.results.rows)
+            self.__diff__ = TestResults(self.table, rows, confidence=False)
+        return BaseComparison.diff.fget(self)
+
     @property
     def regressions(self):
         if self.__regressions__ is None:
@@ -470,7 +1023,7 @@ class TestComparison(BaseComparison):
         if transitions is None or len(transitions) == 0:
             return
 
-        filtered = self.__status_changes__(*transitions)
+        filtered = self.__status_changes__(*transitions, names=False)
 
         self.all_environments = set(filtered.keys())
         self.environments = OrderedDict({build: self.all_environments for build in self.builds})
@@ -478,35 +1031,50 @@ class TestComparison(BaseComparison):
         self.__fixes__ = None
         self.__diff__ = None
 
-        if len(filtered) == 0:
-            self.results = OrderedDict()
-            return
-
         # filter results
-        all_tests = set(reduce(lambda a, b: a + b, filtered.values()))
-        self.results = OrderedDict({full_name: self.results[full_name] for full_name in all_tests})
-        self.results = OrderedDict(sorted(self.results.items()))
+        all_rows = set()
+        for rows in filtered.values():
+            all_rows.update(rows)
+        self.results = self.results.subset(all_rows)
 
-    def __status_changes__(self, *transitions, predicate=lambda test, env: True):
+    def __status_changes__(self, *transitions, predicate=lambda test, env: True, names=True):
+        """
+        Returns the names of the tests, or their rows in the results table
+        if `names` is False, whose status changes between the last two
+        builds according to the given transitions, by environment.
+        """
         if len(self.builds) < 2:
             return {}
 
         comparisons = OrderedDict()
         after = self.builds[-1]  # last
         before = self.builds[-2]  # second to last
+        if self.table is None:
+            for env in self.all_environments:
+                comparison_list = []
+                # Let's try to avoid using .diff, it's only used here
+                # and in core/notification.py to determine if there is change
+                # between builds
+                for test, results in self.diff.items():
+                    results_after = results.get((after, env), 'n/a')
+                    results_before = results.get((before, env), 'n/a')
+                    if (results_before, results_after) in transitions:
+                        if predicate(test, env):
+                            comparison_list.append(test)
+                if comparison_list:
+                    comparisons[env] = comparison_list
+            return comparisons
+
+        diff_rows = self.diff.rows
         for env in self.all_environments:
-            comparison_list = []
-            # Let's try to avoid using .diff, it's only used here
-            # and in core/notification.py to determine if there is change
-            # between builds
-            for test, results in self.diff.items():
-                results_after = results.get((after, env), 'n/a')
-                results_before = results.get((before, env), 'n/a')
-                if (results_before, results_after) in transitions:
-                    if predicate(test, env):
-                        comparison_list.append(test)
-            if comparison_list:
-                comparisons[env] = comparison_list
+            rows = self.table.transition_rows(before, after, env, transitions, diff_rows)
+            rows = array('l', (row for row in rows if predicate(row, env)))
+            if rows:
+                comparisons[env] = rows
+
+        if names:
+            for env, rows in comparisons.items():
+                comparisons[env] = sorted(self.table.names(rows).values())
 
         return comparisons
 
@@ -542,6 +1110,48 @@ class TestComparison(BaseComparison):
         baseline = self.builds[0]
         target = self.builds[1]
 
+        # Whether a fix is intermittent depends on known issues as well
+        envs_slugs, regressions, fixes, intermittent_fixes = cached_comparison(
+            'tests',
+            baseline,
+            target,
+            self.__compute_regressions_and_fixes__,
+            models.KnownIssue.version(),
+        )
+
+        for build in self.builds:
+            self.environments[build] = envs_slugs
+
+        for env_slug, tests in regressions:
+            self.__regressions__[env_slug] = tests
+            for test in tests:
+                self.results.setdefault(test, OrderedDict())
+                self.results[test][(target, env_slug)] = 'fail'
+                self.results[test][(baseline, env_slug)] = 'pass'
+                self.__diff__[test][target][env_slug] = False
+                self.__diff__[test][baseline][env_slug] = True
+
+        for env_slug, tests in fixes:
+            self.__fixes__[env_slug] = tests
+            for test in tests:
+                self.__diff__[test][target][env_slug] = True
+                self.__diff__[test][baseline][env_slug] = False
+
+        for env_slug, tests in fixes + intermittent_fixes:
+            for test in tests:
+                self.results.setdefault(test, OrderedDict())
+                self.results[test][(target, env_slug)] = 'pass'
+                self.results[test][(baseline, env_slug)] = 'fail'
+
+        self.results = OrderedDict(sorted(self.results.items()))
+
+    def __compute_regressions_and_fixes__(self):
+        """
+        Returns the slugs of the environments compared, followed by lists of
+        (environment slug, test full names) pairs with the regressions, the
+        fixes, and the fixes that were left out because the test failed
+        intermittently in the baseline.
+        """
         query = self.base_sql.copy()
         query['select'].append('target.result')
         query['select'].append('target.has_known_issues')
@@ -556,59 +1166,37 @@ class TestComparison(BaseComparison):
         envs = {e.id: e for e in models.Environment.objects.filter(id__in=env_ids).all()}
         envs_slugs = sorted({e.slug for e in envs.values()})
 
-        for build in self.builds:
-            self.environments[build] = envs_slugs
-
         fixed_tests = defaultdict(set)
         regressions = defaultdict(set)
         fixes = defaultdict(set)
 
         for test in tests:
             env_id = test.environment_id
-
-            full_name = test.full_name
-            if full_name not in self.results:
-                self.results[full_name] = OrderedDict()
-
-            baseline_key = (baseline, envs[env_id].slug)
-            target_key = (target, envs[env_id].slug)
-
             if test.status == 'fail':
-                regressions[env_id].add(full_name)
-                self.results[full_name][target_key] = 'fail'
-                self.results[full_name][baseline_key] = 'pass'
+                regressions[env_id].add(test.full_name)
             elif test.status == 'pass':
-                fixes[env_id].add(full_name)
+                fixes[env_id].add(test.full_name)
                 fixed_tests[env_id].add(test.metadata_id)
-                self.results[full_name][target_key] = 'pass'
-                self.results[full_name][baseline_key] = 'fail'
-
-        self.results = OrderedDict(sorted(self.results.items()))
 
-        for env_id in regressions.keys():
-            self.__regressions__[envs[env_id].slug] = list(regressions[env_id])
+        regressions_list = [(envs[env_id].slug, list(tests)) for env_id, tests in regressions.items()]
 
         # It's not a fix if baseline test is intermittent for a given environment:
         # - test.has_known_issues == True and
         # - test.known_issues[env].intermittent == True
         fixed_tests_environment_slugs = [envs[env_id] for env_id in fixed_tests.keys()]
         intermittent_fixed_tests = self.__intermittent_fixed_tests__(fixed_tests, fixed_tests_environment_slugs)
+        fixes_list = []
+        intermittent_list = []
         for env_id in fixes.keys():
             env_slug = envs[env_id].slug
             test_list = [test for test in fixes[env_id] if (test, env_slug) not in intermittent_fixed_tests]
             if len(test_list):
-                self.__fixes__[env_slug] = test_list
-
-        for env in envs.values():
-            if env.slug in self.__regressions__:
-                for test in self.__regressions__[env.slug]:
-                    self.__diff__[test][target][env.slug] = False
-                    self.__diff__[test][baseline][env.slug] = True
-
-            if env.slug in self.__fixes__:
-                for test in self.__fixes__[env.slug]:
-                    self.__diff__[test][target][env.slug] = True
-                    self.__diff__[test][baseline][env.slug] = False
+                fixes_list.append((env_slug, test_list))
+            intermittent = [test for test in fixes[env_id] if (test, env_slug) in intermittent_fixed_tests]
+            if len(intermittent):
+                intermittent_list.append((env_slug, intermittent))
+
+        return envs_slugs, regressions_list, fixes_list, intermittent_list
 
     def __intermittent_fixed_tests__(self, fixed_tests, environment_slugs):
         intermittent_fixed_tests = {}
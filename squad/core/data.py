@@ -1,3 +1,4 @@
+import codecs
 import json
 import math
 from statistics import mean
@@ -17,6 +18,105 @@ def parse_test_result(value):
     return test_result_mapping.get(v, None)
 
 
+def iter_json_object(stream, chunk_size=65536):
+    """
+    Incrementally decodes a JSON document whose top-level value is an
+    object, yielding its (key, value) pairs one at a time.
+
+    `stream` is anything with a `read(size)` method returning either str or
+    bytes (e.g. a Django FieldFile or an io.StringIO). Only the pair being
+    decoded is kept in memory, so the size of the whole document does not
+    matter.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    state = {'buffer': '', 'pos': 0, 'eof': False}
+
+    def fill():
+        chunk = stream.read(chunk_size)
+        if isinstance(chunk, bytes):
+            chunk = utf8.decode(chunk, final=not chunk)
+        if not chunk:
+            state['eof'] = True
+            return False
+        state['buffer'] = state['buffer'][state['pos']:] + chunk
+        state['pos'] = 0
+        return True
+
+    def skip_whitespace():
+        while True:
+            buffer = state['buffer']
+            pos = state['pos']
+            while pos < len(buffer) and buffer[pos] in ' \t\n\r':
+                pos += 1
+            state['pos'] = pos
+            if pos < len(buffer) or not fill():
+                return
+
+    def next_char():
+        skip_whitespace()
+        if state['pos'] >= len(state['buffer']):
+            raise json.JSONDecodeError('Unexpected end of document', state['buffer'], state['pos'])
+        return state['buffer'][state['pos']]
+
+    def expect(char):
+        if next_char() != char:
+            raise json.JSONDecodeError('Expecting %r' % char, state['buffer'], state['pos'])
+        state['pos'] += 1
+
+    def value():
+        skip_whitespace()
+        while True:
+            try:
+                obj, end = decoder.raw_decode(state['buffer'], state['pos'])
+                # a value touching the end of the buffer might be truncated
+                # (e.g. a number), so only accept it when followed by
+                # something else or when there is nothing more to read
+                if end < len(state['buffer']) or state['eof']:
+                    state['pos'] = end
+                    return obj
+            except json.JSONDecodeError:
+                if state['eof']:
+                    raise
+            fill()
+
+    skip_whitespace()
+    if state['pos'] >= len(state['buffer']):
+        return
+
+    expect('{')
+    if next_char() == '}':
+        return
+
+    while True:
+        key = value()
+        if not isinstance(key, str):
+            raise json.JSONDecodeError('Expecting property name', state['buffer'], state['pos'])
+        expect(':')
+        yield key, value()
+
+        if next_char() == ',':
+            state['pos'] += 1
+            continue
+        expect('}')
+        return
+
+
+def parse_test(key, value):
+    group_name, test_name = parse_name(key)
+    result = value
+    log = None
+    if isinstance(value, dict):
+        result = value.get('result', None)
+        log = value.get('log', None)
+    return {
+        "group_name": group_name,
+        "test_name": test_name,
+        "pass": parse_test_result(result),
+        "log": log
+    }
+
+
 class JSONTestDataParser(object):
     """
     Parser for test data as JSON string
@@ -28,21 +128,16 @@ class JSONTestDataParser(object):
             return []
 
         input_data = json.loads(test_data)
-        data = []
-        for key, value in input_data.items():
-            group_name, test_name = parse_name(key)
-            result = value
-            log = None
-            if isinstance(value, dict):
-                result = value.get('result', None)
-                log = value.get('log', None)
-            data.append({
-                "group_name": group_name,
-                "test_name": test_name,
-                "pass": parse_test_result(result),
-                "log": log
-            })
-        return data
+        return [parse_test(key, value) for key, value in input_data.items()]
+
+    @staticmethod
+    def iterparse(stream):
+        """
+        Same as calling the parser, but reads test data incrementally from
+        a file-like object and yields tests one by one.
+        """
+        for key, value in iter_json_object(stream):
+            yield parse_test(key, value)
 
 
 def parse_metric(value):
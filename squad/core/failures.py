@@ -1,6 +1,15 @@
-from django.db.models import prefetch_related_objects
+from collections import defaultdict
+
+from functools import reduce
+
+from django.db.models import Q, prefetch_related_objects
 
 from squad.core.models import Test
+from squad.core.utils import split_iterable
+
+
+# Number of failures whose history is fetched in a single query
+FAILURES_BATCH_SIZE = 500
 
 
 def failures_with_confidence(project, build, failures, releases_only=False):
@@ -12,17 +21,31 @@ def failures_with_confidence(project, build, failures, releases_only=False):
     queryset = project.builds.filter(id__lt=build.id)
     if releases_only:
         queryset = queryset.filter(is_release=True)
-    builds = queryset.order_by('-id').all()[:limit]
-    builds_ids = [b.id for b in builds]
-
-    # Find previous `limit` tests that contain this test x environment
-    for failure in failures:
-        history = Test.objects.filter(
+    builds_ids = list(queryset.order_by('-id').values_list('id', flat=True)[:limit])
+
+    # Find previous `limit` tests that contain each test x environment, for
+    # a whole batch of failures at once
+    for batch in split_iterable(failures, FAILURES_BATCH_SIZE):
+        # only the exact test x environment pairs of the batch are fetched,
+        # grouped by environment to keep the query short
+        metadata_by_environment = defaultdict(set)
+        for failure in batch:
+            metadata_by_environment[failure.environment_id].add(failure.metadata_id)
+        pairs = reduce(lambda a, b: a | b, [
+            Q(environment_id=environment_id, metadata_id__in=metadata_ids)
+            for environment_id, metadata_ids in metadata_by_environment.items()
+        ])
+
+        history = defaultdict(list)
+        tests = Test.objects.filter(
+            pairs,
             build_id__in=builds_ids,
-            metadata_id=failure.metadata_id,
-            environment_id=failure.environment_id,
-        ).only("result").order_by()
+        ).only("result", "metadata_id", "environment_id").order_by()
+
+        for test in tests.iterator():
+            history[(test.metadata_id, test.environment_id)].append(test)
 
-        failure.set_confidence(threshold, history)
+        for failure in batch:
+            failure.set_confidence(threshold, history[(failure.metadata_id, failure.environment_id)])
 
     return failures
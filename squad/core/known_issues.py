@@ -0,0 +1,86 @@
+import re
+from collections import defaultdict
+
+
+def pattern_to_regex(pattern):
+    # The * character should be replaced by .*?, which is regex for "everything"
+    return re.escape(pattern).replace('\\*', '.*?')
+
+
+class KnownIssueMatcher(object):
+    """
+    Matches test full names against KnownIssue.test_name patterns, returning
+    the ids of the issues whose pattern matches.
+
+    Patterns are matched the same way they always were, i.e. as regexes
+    anchored at the beginning of the test name only. That means a literal
+    pattern (with no "*", or with a trailing "*" only) matches every test
+    whose name starts with it, so those are stored in a prefix tree and cost
+    one dictionary lookup per character of the test name. Any other pattern
+    goes into a single combined regex, with one named group per pattern,
+    that is tried once per test.
+
+    The prefix tree is kept flat (edges are keyed by (node, character)) so
+    that matchers can be pickled into the cache regardless of how long the
+    patterns are.
+    """
+
+    def __init__(self, patterns):
+        """
+        patterns: iterable of (issue_id, test_name) pairs
+        """
+        issues_by_pattern = defaultdict(list)
+        for issue_id, pattern in patterns:
+            issues_by_pattern[pattern].append(issue_id)
+
+        self.edges = {}
+        self.leaves = defaultdict(list)
+        self.globs = []
+
+        for pattern, issues_ids in issues_by_pattern.items():
+            literal = pattern.rstrip('*')
+            if '*' in literal:
+                self.globs.append((re.compile(pattern_to_regex(pattern)), issues_ids))
+                continue
+
+            node = 0
+            for char in literal:
+                child = self.edges.get((node, char))
+                if child is None:
+                    child = len(self.edges) + 1
+                    self.edges[(node, char)] = child
+                node = child
+            self.leaves[node] += issues_ids
+
+        self.leaves = dict(self.leaves)
+        self.combined = None
+        if self.globs:
+            self.combined = re.compile('|'.join([
+                '(?P<g%d>%s)' % (index, regex.pattern)
+                for index, (regex, _) in enumerate(self.globs)
+            ]))
+
+    def __call__(self, full_name):
+        issues_ids = []
+
+        if self.leaves:
+            node = 0
+            issues_ids += self.leaves.get(node, [])
+            for char in full_name:
+                node = self.edges.get((node, char))
+                if node is None:
+                    break
+                issues_ids += self.leaves.get(node, [])
+
+        if self.combined is not None:
+            match = self.combined.match(full_name)
+            if match:
+                # the combined regex only tells the first pattern that
+                # matches; the following ones still need to be tried
+                first = int(match.lastgroup[1:])
+                issues_ids += self.globs[first][1]
+                for regex, glob_issues_ids in self.globs[first + 1:]:
+                    if regex.match(full_name):
+                        issues_ids += glob_issues_ids
+
+        return issues_ids
@@ -0,0 +1,80 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from squad.core.models import Metric, MetricPoint
+
+
+logger = logging.getLogger()
+
+
+class Command(BaseCommand):
+
+    help = """helper that creates the chart points of metrics received before they existed"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--show-progress',
+            action='store_true',
+            help='Prints out one dot every batch of metrics processed'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of metrics to create points for at once'
+        )
+
+    def handle(self, *args, **options):
+        show_progress = options['show_progress']
+        batch_size = options['batch_size']
+
+        logger.info('Discovering number of metrics that need work...')
+        queryset = Metric.objects.filter(
+            point__isnull=True,
+            metadata__isnull=False,
+            build__isnull=False,
+            environment__isnull=False,
+        )
+        count = queryset.count()
+
+        if count == 0:
+            logger.info('Nothing to do!')
+            return
+
+        logger.info('Working on %d metrics' % count)
+
+        created = 0
+        last_id = 0
+        while True:
+            metrics = list(queryset.filter(id__gt=last_id).select_related('test_run').only(
+                'id',
+                'environment_id',
+                'metadata_id',
+                'build_id',
+                'result',
+                'is_outlier',
+                'measurements',
+                'measurements_count',
+                'measurements_min',
+                'measurements_max',
+                'test_run__created_at',
+                'test_run__datetime',
+            ).order_by('id')[:batch_size])
+            if len(metrics) == 0:
+                break
+
+            points = []
+            for metric in metrics:
+                if metric.measurements_count is None:
+                    # not packed yet, see the fill_packed_measurements command
+                    metric.fill_packed_measurements()
+                points.append(MetricPoint.from_metric(metric, metric.test_run))
+            # points of metrics received meanwhile are created on their own
+            created += len(MetricPoint.objects.bulk_create(points, ignore_conflicts=True))
+            last_id = metrics[-1].id
+
+            if show_progress:
+                print('.', end='', flush=True)
+
+        logger.info('Done creating points for %d metrics' % created)
@@ -0,0 +1,64 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from squad.core.models import Metric
+
+
+logger = logging.getLogger()
+
+
+class Command(BaseCommand):
+
+    help = """helper that fills packed measurements and their aggregates for metrics received before they existed"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--show-progress',
+            action='store_true',
+            help='Prints out one dot every batch of metrics processed'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of metrics to update at once'
+        )
+
+    def handle(self, *args, **options):
+        show_progress = options['show_progress']
+        batch_size = options['batch_size']
+
+        logger.info('Discovering number of metrics that need work...')
+        queryset = Metric.objects.filter(measurements_count__isnull=True)
+        count = queryset.count()
+
+        if count == 0:
+            logger.info('Nothing to do!')
+            return
+
+        logger.info('Working on %d metrics' % count)
+
+        fields = [
+            'packed_measurements',
+            'measurements_count',
+            'measurements_min',
+            'measurements_max',
+            'measurements_mean',
+        ]
+        updated = 0
+        last_id = 0
+        while True:
+            metrics = list(queryset.filter(id__gt=last_id).only('id', 'measurements').order_by('id')[:batch_size])
+            if len(metrics) == 0:
+                break
+
+            for metric in metrics:
+                metric.fill_packed_measurements()
+            updated += Metric.objects.bulk_update(metrics, fields)
+            last_id = metrics[-1].id
+
+            if show_progress:
+                print('.', end='', flush=True)
+
+        logger.info('Done updating %d metrics' % updated)
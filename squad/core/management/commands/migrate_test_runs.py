@@ -79,6 +79,8 @@ class Command(BaseCommand):
                     created_at=build.created_at)
                 for testrun in build.test_runs.filter(environment=env):
                     testrun.build = new_build
+                    testrun.project_status_updated = False
+                    testrun.build_summary_updated = False
                     testrun.save()
                     testrun.environment.project = new_project
                     testrun.environment.save()
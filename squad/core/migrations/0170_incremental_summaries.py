@@ -0,0 +1,76 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0169_userpreferences"),
+    ]
+
+    # Existing test runs are already accounted for in the summaries of their
+    # builds, and existing summaries have no running sums for the metrics
+    # summary (left NULL so that they get summarized in full once more).
+    # The final defaults are only set afterwards, so that they do not apply
+    # to existing rows.
+    operations = [
+        migrations.AddField(
+            model_name="testrun",
+            name="project_status_updated",
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AlterField(
+            model_name="testrun",
+            name="project_status_updated",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name="testrun",
+            name="build_summary_updated",
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AlterField(
+            model_name="testrun",
+            name="build_summary_updated",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name="projectstatus",
+            name="metrics_log_sum",
+            field=models.FloatField(null=True),
+        ),
+        migrations.AlterField(
+            model_name="projectstatus",
+            name="metrics_log_sum",
+            field=models.FloatField(default=0.0, null=True),
+        ),
+        migrations.AddField(
+            model_name="projectstatus",
+            name="metrics_count",
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AlterField(
+            model_name="projectstatus",
+            name="metrics_count",
+            field=models.IntegerField(default=0, null=True),
+        ),
+        migrations.AddField(
+            model_name="buildsummary",
+            name="metrics_log_sum",
+            field=models.FloatField(null=True),
+        ),
+        migrations.AlterField(
+            model_name="buildsummary",
+            name="metrics_log_sum",
+            field=models.FloatField(default=0.0, null=True),
+        ),
+        migrations.AddField(
+            model_name="buildsummary",
+            name="metrics_count",
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AlterField(
+            model_name="buildsummary",
+            name="metrics_count",
+            field=models.IntegerField(default=0, null=True),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0170_incremental_summaries"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="projectstatus",
+            name="update_scheduled_at",
+            field=models.DateTimeField(default=None, null=True),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-17 06:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0171_projectstatus_update_scheduled_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TestTimeline',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('runs', models.TextField(null=True)),
+                ('environment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.environment')),
+                ('metadata', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.suitemetadata')),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.project')),
+            ],
+            options={
+                'unique_together': {('environment', 'metadata')},
+            },
+        ),
+    ]
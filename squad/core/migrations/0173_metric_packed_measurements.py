@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-17 07:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0172_testtimeline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='metric',
+            name='measurements_count',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='metric',
+            name='measurements_max',
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name='metric',
+            name='measurements_mean',
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name='metric',
+            name='measurements_min',
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name='metric',
+            name='packed_measurements',
+            field=models.BinaryField(null=True),
+        ),
+    ]
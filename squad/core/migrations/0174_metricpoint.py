@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-17 07:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0173_metric_packed_measurements'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricPoint',
+            fields=[
+                ('metric', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='point', serialize=False, to='core.metric')),
+                ('created_at', models.DateTimeField()),
+                ('datetime', models.DateTimeField()),
+                ('result', models.FloatField()),
+                ('is_outlier', models.BooleanField(default=False)),
+                ('measurements_min', models.FloatField(null=True)),
+                ('measurements_max', models.FloatField(null=True)),
+                ('build', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.build')),
+                ('environment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.environment')),
+                ('metadata', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.suitemetadata')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['environment', 'metadata', 'created_at'], name='core_metric_environ_9bd98f_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.30 on 2026-10-17 09:00
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0174_metricpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='knownissue',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
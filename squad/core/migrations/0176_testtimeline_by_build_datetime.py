@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-17 09:30
+
+from django.db import migrations
+
+
+def invalidate_timelines(apps, schema_editor):
+    # timelines used to be ordered by build id; have them rebuilt in the
+    # order of the build datetimes
+    TestTimeline = apps.get_model('core', 'TestTimeline')
+    TestTimeline.objects.update(runs=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0175_knownissue_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            invalidate_timelines,
+            reverse_code=migrations.RunPython.noop,
+        ),
+    ]
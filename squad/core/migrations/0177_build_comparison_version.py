@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 09:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0176_testtimeline_by_build_datetime'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='build',
+            name='comparison_version',
+            field=models.IntegerField(default=0),
+        ),
+    ]
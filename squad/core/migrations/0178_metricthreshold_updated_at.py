@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 09:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0177_build_comparison_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='metricthreshold',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -1,3 +1,4 @@
+import io
 import json
 import yaml
 import logging
@@ -10,16 +11,17 @@ import re
 from django.db import models
 from django.db import transaction
 from django.db.utils import IntegrityError
-from django.db.models import Q, Count, Sum, F, Value
-from django.db.models.functions import Concat
+from django.db.models import Q, Count, Max, Sum, F, Value
+from django.db.models.functions import Cast, Coalesce, Exp
 from django.db.models.query import prefetch_related_objects
 from django.contrib.auth.models import User, AnonymousUser, Group as auth_group
 from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelation
 from django.contrib.contenttypes.models import ContentType
-from django.db.models.signals import post_save, pre_delete, pre_save
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
 
 from django.conf import settings
+from django.core.cache import cache
 from squad.mail import Message
 from django.forms.fields import URLField as FormURLField
 from django.core.exceptions import ValidationError
@@ -30,9 +32,12 @@ from django.utils.translation import gettext_lazy as N_
 from simple_history.models import HistoricalRecords
 
 from squad.core.utils import parse_name, join_name, yaml_validator, jinja2_validator, storage_save
-from squad.core.utils import encrypt, decrypt
+from squad.core.utils import encrypt, decrypt, pack_measurements, unpack_measurements, split_iterable, OnCommitBatch
 from squad.core.comparison import TestComparison, MetricComparison
-from squad.core.statistics import geomean
+from squad.core.statistics import GeomeanAccumulator
+from squad.core.known_issues import KnownIssueMatcher
+from squad.core.thresholds import MetricThresholdMatcher
+from squad.core.timeline import Timeline
 from squad.core.plugins import Plugin
 from squad.core.plugins import PluginListField
 from squad.core.plugins import PluginField
@@ -486,6 +491,10 @@ class Build(models.Model):
         help_text="Name or label applied to the release build"
     )
 
+    # bumped whenever the results of the build change, see
+    # comparison_generations; only ever written with F() expressions
+    comparison_version = models.IntegerField(default=0)
+
     callbacks = CallbackForeignKey()
 
     class Meta:
@@ -498,6 +507,12 @@ class Build(models.Model):
         # testrun.datetime (handled in ReceiveTestRun.__call__).
         if not self.datetime:
             self.datetime = timezone.now()
+        if not self._state.adding and 'update_fields' not in kwargs and not args:
+            # never write back a comparison_version that might be outdated
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name != 'comparison_version'
+            ]
         with transaction.atomic():
             super(Build, self).save(*args, **kwargs)
             ProjectStatus.objects.get_or_create(build=self)
@@ -508,6 +523,31 @@ class Build(models.Model):
     def prefetch(self, *related):
         prefetch_related_objects([self], *related)
 
+    @classmethod
+    def comparison_generations(cls, *builds):
+        """
+        Identifies the current results of the given builds in the keys of
+        cached comparisons (see squad.core.comparison.cached_comparison).
+        They change whenever the builds get new test runs, tests or metrics,
+        as counted by comparison_version in the database, so that every
+        process agrees on them.
+        """
+        versions = dict(cls.objects.filter(id__in=[b.id for b in builds]).order_by().values_list('id', 'comparison_version'))
+        # ids might be reused when a database is recreated, creation times
+        # are not
+        return [
+            '%d.%s.%d' % (build.id, build.created_at.timestamp(), versions.get(build.id, 0))
+            for build in builds
+        ]
+
+    @classmethod
+    def invalidate_comparisons(cls, build_id):
+        # only once the new results are committed, otherwise a comparison
+        # computed in the meantime from the previous results would be cached
+        # under the new version; builds get a single bump per transaction,
+        # however many of their objects were saved in it
+        comparisons_to_invalidate.add(build_id)
+
     def reset_events(self):
         """
         It might be useful for some projects to "reset" build events like
@@ -631,33 +671,39 @@ class Build(models.Model):
 
         # XXX note that by using test_jobs here, we are adding an implicit
         # dependency on squad.ci, what in theory violates our architecture.
-        testjobs = self.test_jobs
-        if testjobs.count() > 0:
-            if testjobs.pending().count() > 0:
-                # a build that has pending CI jobs is NOT finished
-                reasons.append("There are unfinished CI jobs")
-            else:
-                # carry on, and check whether the number of expected test runs
-                # per environment is satisfied.
-                pass
-        elif self.test_runs.count() == 0:
-            reasons.append("There are no testjobs or testruns for the build")
+        testjobs = self.test_jobs.aggregate(
+            total=Count('id'),
+            pending=Count('id', filter=self.test_jobs.PENDING),
+        )
 
         # builds with no CI jobs are finished when each environment has
         # received the expected amount of test runs
-        testruns = {
-            e.id: {
+        environments = self.project.environments.annotate(
+            test_runs_total=Count('test_runs', filter=Q(test_runs__build=self)),
+            test_runs_completed=Count('test_runs', filter=Q(test_runs__build=self, test_runs__completed=True)),
+        )
+        testruns = [
+            {
                 'name': str(e),
                 'expected': e.expected_test_runs,
-                'received': 0
+                'total': e.test_runs_total,
+                'received': e.test_runs_completed,
             }
-            for e in self.project.environments.all()
-        }
+            for e in environments
+        ]
 
-        for t in self.test_runs.filter(completed=True).only('build_id', 'environment_id').all():
-            testruns[t.environment_id]['received'] += 1
+        if testjobs['total'] > 0:
+            if testjobs['pending'] > 0:
+                # a build that has pending CI jobs is NOT finished
+                reasons.append("There are unfinished CI jobs")
+            else:
+                # carry on, and check whether the number of expected test runs
+                # per environment is satisfied.
+                pass
+        elif sum([count['total'] for count in testruns]) == 0:
+            reasons.append("There are no testjobs or testruns for the build")
 
-        for env, count in testruns.items():
+        for count in testruns:
             expected = count['expected']
             received = count['received']
             env_name = count['name']
@@ -831,6 +877,12 @@ class TestRun(models.Model):
     data_processed = models.BooleanField(default=False)
     status_recorded = models.BooleanField(default=False)
 
+    # whether the results of this test run were already added to the
+    # ProjectStatus of its build, and to the BuildSummary of its
+    # build/environment, respectively
+    project_status_updated = models.BooleanField(default=False)
+    build_summary_updated = models.BooleanField(default=False)
+
     class Meta:
         unique_together = ('build', 'job_id')
 
@@ -868,6 +920,18 @@ class TestRun(models.Model):
                 self.__tests_file__ = ''
         return self.__tests_file__
 
+    def open_tests_file(self):
+        """
+        Returns a file-like object for reading the tests file without
+        loading it all in memory, unless it is already cached.
+        """
+        if self.__tests_file__ is not None:
+            return io.StringIO(self.__tests_file__)
+        if self.tests_file_storage:
+            storage = self.tests_file_storage
+            return storage.storage.open(storage.name, 'rb')
+        return io.StringIO('')
+
     __metrics_file__ = None
 
     @property
@@ -1102,6 +1166,15 @@ class Test(models.Model):
         if self.__history__:
             return self.__history__
 
+        timeline = TestTimeline.objects.filter(
+            environment_id=self.environment_id,
+            metadata_id=self.metadata_id,
+        ).first()
+        if timeline is not None:
+            self.__history__ = timeline.history(self)
+            if self.__history__:
+                return self.__history__
+
         date = self.test_run.build.datetime
         previous_tests = Test.objects.filter(
             suite=self.suite,
@@ -1126,6 +1199,177 @@ class Test(models.Model):
         ordering = ['metadata__name']
 
 
+class TestTimeline(models.Model):
+    """
+    The results of a test in an environment, across all the builds of a
+    project, run-length encoded (see squad.core.timeline.Timeline) in the
+    order of the builds' datetimes, so that the history of a test can be
+    told from a single row instead of going through all of its previous
+    results.
+
+    Timelines are kept up to date off the ingestion path: the tests of a
+    test run are added once it is committed, by the update_test_timelines
+    task. Until then, those tests are missing from their timelines, which
+    is noticed by comparing the number of results in the timeline with the
+    number of tests in the database, and Test.history looks them up the
+    slow way.
+
+    `runs` is NULL when the timeline needs to be rebuilt from the tests in
+    the database, which is done when it is next read. That is the case for
+    new timelines, since there might be results from before they existed,
+    for timelines with results from removed test runs, and for the ones of
+    the tests of a build whose datetime changed.
+    """
+
+    __test__ = False
+
+    project = models.ForeignKey(Project, related_name='+', on_delete=models.CASCADE)
+    environment = models.ForeignKey(Environment, related_name='+', on_delete=models.CASCADE)
+    metadata = models.ForeignKey(SuiteMetadata, related_name='+', on_delete=models.CASCADE)
+    runs = models.TextField(null=True)
+
+    class Meta:
+        unique_together = ('environment', 'metadata')
+
+    @staticmethod
+    def position(build_datetime):
+        # builds are ordered by datetime, in microseconds so that they fit
+        # in the JSON representation of the runs
+        return int(build_datetime.timestamp() * 1000000)
+
+    @classmethod
+    def add_tests(cls, environment, build, tests):
+        """
+        Adds the given tests, all from the given environment and build, to
+        their timelines.
+        """
+        tests = [t for t in tests if t.metadata_id is not None]
+        if len(tests) == 0:
+            return
+
+        position = cls.position(build.datetime)
+        metadata_ids = set([t.metadata_id for t in tests])
+        cls.objects.bulk_create([
+            cls(project_id=environment.project_id, environment=environment, metadata_id=metadata_id)
+            for metadata_id in metadata_ids
+        ], ignore_conflicts=True)
+
+        with transaction.atomic():
+            # rows are locked in a consistent order to avoid deadlocks
+            timelines = cls.objects.select_for_update().filter(
+                environment=environment,
+                metadata_id__in=metadata_ids,
+            ).exclude(runs=None).order_by('id')
+            timelines = {t.metadata_id: t for t in timelines}
+            runs = {m: Timeline(json.loads(t.runs)) for m, t in timelines.items()}
+
+            for test in tests:
+                timeline = runs.get(test.metadata_id)
+                if timeline is not None and not timeline.add(position, test.id, test.result):
+                    runs[test.metadata_id] = None
+
+            for metadata_id, timeline in timelines.items():
+                if runs[metadata_id] is None:
+                    timeline.runs = None
+                else:
+                    timeline.runs = json.dumps(runs[metadata_id].runs)
+            cls.objects.bulk_update(timelines.values(), ['runs'])
+
+    @classmethod
+    def add_test_run(cls, test_run):
+        """
+        Adds all of the tests of the given test run to their timelines, in
+        batches, each timeline being written once per batch.
+        """
+        tests = test_run.tests.only('id', 'metadata_id', 'result').order_by('id')
+        for batch in split_iterable(tests.iterator(), settings.SQUAD_TESTS_BATCH_SIZE):
+            cls.add_tests(test_run.environment, test_run.build, batch)
+
+    @classmethod
+    def invalidate_build(cls, build):
+        """
+        Marks the timelines with tests from the given build as stale, as
+        needed when the datetime of the build changes.
+        """
+        cls.objects.filter(
+            project_id=build.project_id,
+            metadata_id__in=Test.objects.filter(build=build).values('metadata_id'),
+        ).update(runs=None)
+
+    def rebuild(self):
+        with transaction.atomic():
+            timeline = TestTimeline.objects.select_for_update().get(pk=self.pk)
+            if timeline.runs is None:
+                runs = Timeline()
+                tests = Test.objects.filter(
+                    environment_id=self.environment_id,
+                    metadata_id=self.metadata_id,
+                ).order_by('build__datetime', 'id').values_list('build__datetime', 'id', 'result')
+                for build_datetime, test_id, result in tests.iterator():
+                    runs.add(self.position(build_datetime), test_id, result)
+                timeline.runs = json.dumps(runs.runs)
+                timeline.save(update_fields=['runs'])
+            self.runs = timeline.runs
+
+    def history(self, test):
+        """
+        Returns the Test.History of the given test, or None if it cannot be
+        told from the timeline.
+        """
+        if self.runs is None:
+            self.rebuild()
+
+        timeline = Timeline(json.loads(self.runs))
+        count = Test.objects.filter(environment_id=self.environment_id, metadata_id=self.metadata_id).count()
+        if timeline.count() != count:
+            if timeline.count() > count:
+                # tests were added twice, e.g. by a retried task
+                TestTimeline.objects.filter(pk=self.pk).update(runs=None)
+            return None
+
+        history = timeline.history(self.position(test.build.datetime), test.id)
+        if history is None:
+            return None
+
+        since_id, count, last_different_id = history
+        tests = Test.objects.in_bulk([i for i in (since_id, last_different_id) if i is not None])
+        since = tests.get(since_id)
+        last_different = tests.get(last_different_id)
+        if (since_id and since is None) or (last_different_id and last_different is None):
+            return None
+
+        return Test.History(since, count, last_different)
+
+
+def add_tests_to_timelines(test_ids):
+    tests = Test.objects.filter(id__in=test_ids).select_related('environment', 'build').order_by('id')
+    groups = {}
+    for test in tests:
+        groups.setdefault((test.environment_id, test.build_id), []).append(test)
+    for group in groups.values():
+        TestTimeline.add_tests(group[0].environment, group[0].build, group)
+
+
+tests_to_add_to_timelines = OnCommitBatch(add_tests_to_timelines)
+
+
+@receiver(post_save, sender=Test)
+def add_test_to_timeline(sender, instance, created, **kwargs):
+    # tests created in bulk are added to their timelines by a separate
+    # task, see squad.core.tasks.update_test_timelines; the ones saved one by
+    # one are gathered and added once the transaction commits
+    if created and instance.environment_id is not None and instance.build_id is not None:
+        tests_to_add_to_timelines.add(instance.id)
+
+
+@receiver(pre_delete, sender=TestRun)
+def invalidate_test_timelines(sender, instance, **kwargs):
+    TestTimeline.objects.filter(
+        environment_id=instance.environment_id,
+        metadata_id__in=instance.tests.values('metadata_id'),
+    ).update(runs=None)
+
+
 class MetricManager(models.Manager):
 
     def by_full_name(self, name):
@@ -1150,11 +1394,50 @@ class Metric(models.Model):
     measurements = models.TextField()  # comma-separated float numbers
     is_outlier = models.BooleanField(default=False)
 
+    # The same measurements, as packed floats (see
+    # squad.core.utils.pack_measurements), and their aggregates, so that
+    # they can be read without parsing `measurements`. All of these are NULL
+    # for metrics received before they existed, until the
+    # fill_packed_measurements command is run.
+    packed_measurements = models.BinaryField(null=True)
+    measurements_count = models.IntegerField(null=True)
+    measurements_min = models.FloatField(null=True)
+    measurements_max = models.FloatField(null=True)
+    measurements_mean = models.FloatField(null=True)
+
     objects = MetricManager()
 
+    def save(self, *args, **kwargs):
+        self.fill_packed_measurements()
+        super().save(*args, **kwargs)
+
+    def set_measurements(self, values):
+        self.measurements = ','.join([str(v) for v in values])
+        self.__pack__([float(v) for v in values])
+
+    def fill_packed_measurements(self):
+        if self.measurements:
+            self.__pack__([float(n) for n in self.measurements.split(',')])
+        else:
+            self.__pack__([])
+
+    def __pack__(self, values):
+        self.packed_measurements = pack_measurements(values)
+        self.measurements_count = len(values)
+        if values:
+            self.measurements_min = min(values)
+            self.measurements_max = max(values)
+            self.measurements_mean = sum(values) / len(values)
+        else:
+            self.measurements_min = None
+            self.measurements_max = None
+            self.measurements_mean = None
+
     @property
     def measurement_list(self):
-        if self.measurements:
+        if self.packed_measurements is not None:
+            return unpack_measurements(self.packed_measurements)
+        elif self.measurements:
             return [float(n) for n in self.measurements.split(',')]
         else:
             return []
@@ -1173,6 +1456,67 @@ class Metric(models.Model):
         return '%s: %f' % (self.name, self.result)
 
 
+class MetricPoint(models.Model):
+    """
+    A single point in the time series of a metric, in a given environment,
+    as plotted in the metrics charts. There is one point per metric, filled
+    in when the metric is received, holding everything the charts need from
+    the metric and its test run; so that the series of any number of metrics
+    are read with a single scan of the (environment, metadata, created_at)
+    index, instead of a query per metric and environment. Metrics received
+    before points existed have none until the fill_metric_points command is
+    run.
+    """
+    metric = models.OneToOneField(Metric, related_name='point', primary_key=True, on_delete=models.CASCADE)
+    environment = models.ForeignKey(Environment, related_name='+', on_delete=models.CASCADE)
+    metadata = models.ForeignKey(SuiteMetadata, related_name='+', on_delete=models.CASCADE)
+    build = models.ForeignKey(Build, related_name='+', on_delete=models.CASCADE)
+
+    # created_at and datetime of the test run
+    created_at = models.DateTimeField()
+    datetime = models.DateTimeField()
+
+    result = models.FloatField()
+    is_outlier = models.BooleanField(default=False)
+    measurements_min = models.FloatField(null=True)
+    measurements_max = models.FloatField(null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['environment', 'metadata', 'created_at']),
+        ]
+
+    @classmethod
+    def from_metric(cls, metric, test_run):
+        """
+        Returns the (unsaved) point for the given metric, or None if it does
+        not belong in any series.
+        """
+        if metric.metadata_id is None or metric.build_id is None or metric.environment_id is None:
+            return None
+        return cls(
+            metric_id=metric.id,
+            environment_id=metric.environment_id,
+            metadata_id=metric.metadata_id,
+            build_id=metric.build_id,
+            created_at=test_run.created_at,
+            datetime=test_run.datetime,
+            result=metric.result,
+            is_outlier=metric.is_outlier,
+            measurements_min=metric.measurements_min,
+            measurements_max=metric.measurements_max,
+        )
+
+
+@receiver(post_save, sender=Metric)
+def update_metric_point(sender, instance, **kwargs):
+    point = MetricPoint.from_metric(instance, instance.test_run)
+    if point is None:
+        MetricPoint.objects.filter(metric_id=instance.id).delete()
+    else:
+        point.save()
+
+
 class StatusManager(models.Manager):
 
     def by_suite(self):
@@ -1261,6 +1605,8 @@ class MetricThreshold(models.Model):
     value = models.FloatField(null=True, blank=True)
     is_higher_better = models.BooleanField(default=False)
 
+    updated_at = models.DateTimeField(auto_now=True)
+
     def _check_duplicates(self):
         """
         We have to make sure of the following
@@ -1300,6 +1646,52 @@ class MetricThreshold(models.Model):
 
         return self.__regex__.match(metric_fullname)
 
+    @classmethod
+    def version(cls, queryset=None):
+        """
+        Identifies the current state of the given thresholds (all of them by
+        default), from the database itself so that every process agrees on
+        it: it changes whenever one of them is edited, and whenever
+        thresholds are added or removed.
+        """
+        if queryset is None:
+            queryset = cls.objects.all()
+        version = queryset.order_by().aggregate(last_update=Max('updated_at'), count=Count('id'))
+        last_update = version['last_update']
+        return '%s.%d' % (last_update.timestamp() if last_update else 0, version['count'])
+
+    @classmethod
+    def matcher(cls, project):
+        """
+        Returns a MetricThresholdMatcher for all of the thresholds of the
+        given project. Matchers are cached under the version of those
+        thresholds, so a cached matcher is left behind as soon as any of them
+        changes.
+        """
+        thresholds = cls.objects.filter(project=project)
+        key = 'metric_thresholds_matcher:%s:%s' % (project.id, cls.version(thresholds))
+        matcher = cache.get(key)
+        if matcher is None:
+            matcher = MetricThresholdMatcher(thresholds.values_list('id', 'name'))
+            cache.set(key, matcher)
+        return matcher
+
+
+def bump_comparison_versions(build_ids):
+    Build.objects.filter(pk__in=build_ids).update(comparison_version=F('comparison_version') + 1)
+
+
+comparisons_to_invalidate = OnCommitBatch(bump_comparison_versions)
+
+
+@receiver(post_save, sender=TestRun)
+@receiver(post_delete, sender=TestRun)
+@receiver(post_save, sender=Test)
+@receiver(post_save, sender=Metric)
+def invalidate_build_comparisons(sender, instance, **kwargs):
+    if instance.build_id is not None:
+        Build.invalidate_comparisons(instance.build_id)
+
 
 class ProjectStatus(models.Model, TestSummaryBase):
     """
@@ -1316,9 +1708,18 @@ class ProjectStatus(models.Model, TestSummaryBase):
     notified_on_timeout = models.BooleanField(default=None, null=True)
     approved = models.BooleanField(default=False)
 
+    # when an update of this status was scheduled, see
+    # squad.core.tasks.ScheduleProjectStatusUpdate
+    update_scheduled_at = models.DateTimeField(null=True, default=None)
+
     metrics_summary = models.FloatField(null=True)
     has_metrics = models.BooleanField(default=False)
 
+    # running sum of the logarithms of the metric results, and their count,
+    # from which metrics_summary (their geometric mean) is derived
+    metrics_log_sum = models.FloatField(null=True, default=0.0)
+    metrics_count = models.IntegerField(null=True, default=0)
+
     tests_pass = models.IntegerField(default=0)
     tests_fail = models.IntegerField(default=0)
     tests_xfail = models.IntegerField(default=0)
@@ -1354,18 +1755,19 @@ class ProjectStatus(models.Model, TestSummaryBase):
         verbose_name_plural = "Project statuses"
 
     @classmethod
-    def create_or_update(cls, build):
+    def create_or_update(cls, build, incremental=False):
         """
         Creates (or updates) a new ProjectStatus for the given build and
         returns it.
+
+        If `incremental` is True, only the results of the test runs not
+        accounted for yet are added to the status, instead of summarizing
+        all the test runs in the build again. Statuses created before the
+        running sums for the metrics summary existed are always summarized
+        in full.
         """
 
-        test_summary = build.test_summary
-        metrics_summary = MetricsSummary(build)
         now = timezone.now()
-        test_runs_completed = build.test_runs.filter(completed=True).count()
-        test_runs_incomplete = build.test_runs.filter(completed=False).count()
-        test_runs_total = test_runs_completed + test_runs_incomplete
         regressions = None
         fixes = None
         metric_regressions = None
@@ -1397,50 +1799,55 @@ class ProjectStatus(models.Model, TestSummaryBase):
                 metric_fixes = yaml.dump(metric_comparison.fixes)
 
         data = {
-            'tests_pass': test_summary.tests_pass,
-            'tests_fail': test_summary.tests_fail,
-            'tests_xfail': test_summary.tests_xfail,
-            'tests_skip': test_summary.tests_skip,
-            'metrics_summary': metrics_summary.value,
-            'has_metrics': metrics_summary.has_metrics,
             'last_updated': now,
             'finished': finished,
-            'test_runs_total': test_runs_total,
-            'test_runs_completed': test_runs_completed,
-            'test_runs_incomplete': test_runs_incomplete,
             'regressions': regressions,
             'fixes': fixes,
             'metric_regressions': metric_regressions,
             'metric_fixes': metric_fixes,
             'baseline': previous_build,
         }
+        data.update(count_test_runs(build.test_runs))
 
-        status, created = cls.objects.get_or_create(
-            build=build,
-            defaults=data)
-        if not created and test_summary.tests_total >= status.tests_total:
-            # XXX the test above for the new total number of tests prevents
-            # results that arrived earlier, but are only being processed now,
-            # from overwriting a ProjectStatus created by results that arrived
-            # later but were already processed.
-            status.tests_pass = test_summary.tests_pass
-            status.tests_fail = test_summary.tests_fail
-            status.tests_xfail = test_summary.tests_xfail
-            status.tests_skip = test_summary.tests_skip
-            status.metrics_summary = metrics_summary.value
-            status.has_metrics = metrics_summary.has_metrics
-            status.last_updated = now
-            status.finished = finished
-            status.build = build
-            status.baseline = previous_build
-            status.test_runs_total = test_runs_total
-            status.test_runs_completed = test_runs_completed
-            status.test_runs_incomplete = test_runs_incomplete
-            status.regressions = regressions
-            status.fixes = fixes
-            status.metric_regressions = metric_regressions
-            status.metric_fixes = metric_fixes
-            status.save()
+        status, created = cls.objects.get_or_create(build=build, defaults=data)
+
+        with transaction.atomic():
+            status = cls.objects.select_for_update().get(pk=status.pk)
+
+            if incremental and not created and status.metrics_count is not None:
+                pending = build.test_runs.filter(status_recorded=True, project_status_updated=False)
+                pending_ids = list(pending.values_list('id', flat=True))
+                if pending_ids:
+                    test_runs = TestRun.objects.filter(id__in=pending_ids)
+                    test_runs.update(project_status_updated=True)
+                    data.update(TestRunSummary(test_runs).deltas())
+                cls.objects.filter(pk=status.pk).update(**data)
+                status.refresh_from_db()
+            else:
+                build.test_runs.filter(status_recorded=True).update(project_status_updated=True)
+                test_summary = build.test_summary
+                metrics_summary = MetricsSummary(build)
+
+                if created or status.metrics_count is None or test_summary.tests_total >= status.tests_total:
+                    # XXX the test above for the new total number of tests prevents
+                    # results that arrived earlier, but are only being processed now,
+                    # from overwriting a ProjectStatus created by results that arrived
+                    # later but were already processed. Statuses without running
+                    # sums, e.g. after a test run was deleted, are always summarized.
+                    status.tests_pass = test_summary.tests_pass
+                    status.tests_fail = test_summary.tests_fail
+                    status.tests_xfail = test_summary.tests_xfail
+                    status.tests_skip = test_summary.tests_skip
+                    status.metrics_summary = metrics_summary.value
+                    status.metrics_log_sum = metrics_summary.log_sum
+                    status.metrics_count = metrics_summary.count
+                    status.has_metrics = metrics_summary.has_metrics
+                    for field, value in data.items():
+                        setattr(status, field, value)
+                    status.save()
+
+        # keep build.status in sync with the updated status
+        status.build = build
 
         status.build.project.datetime = now
         status.build.project.save()
@@ -1491,19 +1898,40 @@ class ProjectStatus(models.Model, TestSummaryBase):
         if not self.has_metrics:
             return []
 
-        thresholds_exceeded = []
+        project = self.build.project
+        thresholds = MetricThreshold.objects.filter(project=project, value__isnull=False).select_related('environment').order_by('id')
+        thresholds = {t.id: t for t in thresholds}
+        if len(thresholds) == 0:
+            return []
 
-        thresholds = MetricThreshold.objects.filter(project=self.build.project, value__isnull=False).prefetch_related('project')
-        for threshold in thresholds:
-            environments = threshold.project.environments.all() if threshold.environment is None else [threshold.environment]
-            queryset = Metric.objects.annotate(fullname=Concat(F('metadata__suite'), Value('/'), F('metadata__name'))).filter(
-                fullname__regex=threshold.name_regex,
-                environment__in=environments,
-                build=self.build)
-            queryset = queryset.filter(result__lt=threshold.value) if threshold.is_higher_better else queryset.filter(result__gt=threshold.value)
+        # Only metrics beyond the loosest of the thresholds can exceed any
+        # of them, so anything else is left out of the query
+        exceeding = Q()
+        higher_better = [t.value for t in thresholds.values() if t.is_higher_better]
+        if higher_better:
+            exceeding |= Q(result__lt=max(higher_better))
+        lower_better = [t.value for t in thresholds.values() if not t.is_higher_better]
+        if lower_better:
+            exceeding |= Q(result__gt=min(lower_better))
+
+        metrics = Metric.objects.filter(exceeding, build=self.build, metadata__isnull=False).select_related('metadata').order_by('id')
+
+        matcher = MetricThreshold.matcher(project)
+        exceeded = defaultdict(list)
+        for metric in metrics:
+            full_name = '%s/%s' % (metric.metadata.suite, metric.metadata.name)
+            for threshold_id in matcher(full_name):
+                threshold = thresholds.get(threshold_id)
+                if threshold is None:
+                    continue
+                if threshold.environment_id is not None and threshold.environment_id != metric.environment_id:
+                    continue
+                if metric.result < threshold.value if threshold.is_higher_better else metric.result > threshold.value:
+                    exceeded[threshold_id].append(metric)
 
-            metrics = queryset.prefetch_related('metadata').distinct()
-            thresholds_exceeded += [(threshold, m) for m in metrics]
+        thresholds_exceeded = []
+        for threshold_id, threshold in thresholds.items():
+            thresholds_exceeded += [(threshold, m) for m in exceeded[threshold_id]]
 
         return thresholds_exceeded
 
@@ -1568,10 +1996,74 @@ class MetricsSummary(object):
         queryset = Metric.objects.filter(build=build)
         if environment:
             queryset = queryset.filter(environment=environment)
-        metrics = queryset.all()
-        values = [m.result for m in metrics]
-        self.value = geomean(values)
-        self.has_metrics = len(values) > 0
+        accumulator = GeomeanAccumulator()
+        self.has_metrics = False
+        for result in queryset.values_list('result', flat=True).iterator():
+            accumulator.add(result)
+            self.has_metrics = True
+        self.value = accumulator.value
+        self.log_sum = accumulator.log_sum
+        self.count = accumulator.count
+
+
+class TestRunSummary(TestSummaryBase):
+    """
+    The results of some test runs, as they add up to the ProjectStatus and
+    BuildSummary of their build.
+    """
+
+    __test__ = False
+
+    def __init__(self, test_runs):
+        stats = Status.objects.overall().filter(test_run__in=test_runs).aggregate(
+            Sum('tests_pass'), Sum('tests_fail'), Sum('tests_xfail'), Sum('tests_skip'),
+        )
+        self.tests_pass = stats['tests_pass__sum'] or 0
+        self.tests_fail = stats['tests_fail__sum'] or 0
+        self.tests_xfail = stats['tests_xfail__sum'] or 0
+        self.tests_skip = stats['tests_skip__sum'] or 0
+
+        self.metrics = GeomeanAccumulator()
+        self.has_metrics = False
+        metrics = Metric.objects.filter(test_run__in=test_runs)
+        for result in metrics.values_list('result', flat=True).iterator():
+            self.metrics.add(result)
+            self.has_metrics = True
+
+    def deltas(self):
+        """
+        Returns the changes to apply to a summary, as expressions over its
+        current values, suitable for QuerySet.update().
+        """
+        deltas = {}
+        if self.metrics.count:
+            log_sum = F('metrics_log_sum') + self.metrics.log_sum
+            count = F('metrics_count') + self.metrics.count
+            # metrics_summary goes first, as MySQL evaluates the assignments
+            # in order and the others would already have been incremented
+            deltas['metrics_summary'] = Exp(log_sum / Cast(count, models.FloatField()))
+            deltas['metrics_log_sum'] = log_sum
+            deltas['metrics_count'] = count
+        else:
+            # as in a full summary, no positive metrics make for a 0 summary
+            deltas['metrics_summary'] = Coalesce('metrics_summary', Value(0.0))
+        if self.has_metrics:
+            deltas['has_metrics'] = True
+        for field in ('tests_pass', 'tests_fail', 'tests_xfail', 'tests_skip'):
+            deltas[field] = F(field) + getattr(self, field)
+        return deltas
+
+
+def count_test_runs(queryset):
+    """
+    Returns the test_runs_* fields of a summary of the given test runs.
+    """
+    counts = queryset.aggregate(
+        test_runs_completed=Count('id', filter=Q(completed=True)),
+        test_runs_incomplete=Count('id', filter=Q(completed=False)),
+    )
+    counts['test_runs_total'] = counts['test_runs_completed'] + counts['test_runs_incomplete']
+    return counts
 
 
 class BuildSummary(models.Model, TestSummaryBase):
@@ -1580,6 +2072,10 @@ class BuildSummary(models.Model, TestSummaryBase):
     metrics_summary = models.FloatField(null=True)
     has_metrics = models.BooleanField(default=False)
 
+    # see ProjectStatus
+    metrics_log_sum = models.FloatField(null=True, default=0.0)
+    metrics_count = models.IntegerField(null=True, default=0)
+
     tests_pass = models.IntegerField(default=0)
     tests_fail = models.IntegerField(default=0)
     tests_xfail = models.IntegerField(default=0)
@@ -1592,29 +2088,18 @@ class BuildSummary(models.Model, TestSummaryBase):
         unique_together = ('build', 'environment',)
 
     @classmethod
-    def create_or_update(cls, build, environment):
+    def create_or_update(cls, build, environment, incremental=False):
         """
         Creates (or updates) a BuildSummary given build/environment and
         returns it.
+
+        If `incremental` is True, only the results of the test runs not
+        accounted for yet are added to the summary, the same way as in
+        ProjectStatus.create_or_update.
         """
 
-        metrics_summary = MetricsSummary(build, environment)
-        test_summary = TestSummary(build, environment)
-        test_runs_total = build.test_runs.filter(environment=environment).count()
-        test_runs_completed = build.test_runs.filter(environment=environment, completed=True).count()
-        test_runs_incomplete = build.test_runs.filter(environment=environment, completed=False).count()
-
-        data = {
-            'metrics_summary': metrics_summary.value,
-            'has_metrics': metrics_summary.has_metrics,
-            'tests_pass': test_summary.tests_pass,
-            'tests_fail': test_summary.tests_fail,
-            'tests_xfail': test_summary.tests_xfail,
-            'tests_skip': test_summary.tests_skip,
-            'test_runs_total': test_runs_total,
-            'test_runs_completed': test_runs_completed,
-            'test_runs_incomplete': test_runs_incomplete,
-        }
+        test_runs = build.test_runs.filter(environment=environment)
+        data = count_test_runs(test_runs)
 
         try:
             # Occasionally, there might be scenarios where multiple threads call the line below,
@@ -1627,20 +2112,51 @@ class BuildSummary(models.Model, TestSummaryBase):
         except IntegrityError:
             return
 
-        if not created:
-            summary.metrics_summary = metrics_summary.value
-            summary.has_metrics = metrics_summary.has_metrics
-            summary.tests_pass = test_summary.tests_pass
-            summary.tests_fail = test_summary.tests_fail
-            summary.tests_xfail = test_summary.tests_xfail
-            summary.tests_skip = test_summary.tests_skip
-            summary.test_runs_total = test_runs_total
-            summary.test_runs_completed = test_runs_completed
-            summary.test_runs_incomplete = test_runs_incomplete
-            summary.save()
+        with transaction.atomic():
+            summary = cls.objects.select_for_update().get(pk=summary.pk)
+
+            if incremental and not created and summary.metrics_count is not None:
+                pending = test_runs.filter(status_recorded=True, build_summary_updated=False)
+                pending_ids = list(pending.values_list('id', flat=True))
+                if pending_ids:
+                    pending = TestRun.objects.filter(id__in=pending_ids)
+                    pending.update(build_summary_updated=True)
+                    data.update(TestRunSummary(pending).deltas())
+                cls.objects.filter(pk=summary.pk).update(**data)
+                summary.refresh_from_db()
+            else:
+                test_runs.filter(status_recorded=True).update(build_summary_updated=True)
+                metrics_summary = MetricsSummary(build, environment)
+                test_summary = TestSummary(build, environment)
+
+                summary.metrics_summary = metrics_summary.value
+                summary.metrics_log_sum = metrics_summary.log_sum
+                summary.metrics_count = metrics_summary.count
+                summary.has_metrics = metrics_summary.has_metrics
+                summary.tests_pass = test_summary.tests_pass
+                summary.tests_fail = test_summary.tests_fail
+                summary.tests_xfail = test_summary.tests_xfail
+                summary.tests_skip = test_summary.tests_skip
+                for field, value in data.items():
+                    setattr(summary, field, value)
+                summary.save()
         return summary
 
 
+@receiver(pre_delete, sender=TestRun)
+def reset_summaries_running_sums(sender, instance, **kwargs):
+    # the results of a deleted test run cannot be taken back out of the
+    # running sums, so the next update of the summaries of its build falls
+    # back to summarizing the whole build again
+    if instance.project_status_updated:
+        ProjectStatus.objects.filter(build_id=instance.build_id).update(metrics_log_sum=None, metrics_count=None)
+    if instance.build_summary_updated:
+        BuildSummary.objects.filter(
+            build_id=instance.build_id,
+            environment_id=instance.environment_id,
+        ).update(metrics_log_sum=None, metrics_count=None)
+
+
 class Subscription(models.Model):
     project = models.ForeignKey(Project, related_name='subscriptions', on_delete=models.CASCADE)
     email = models.CharField(
@@ -1717,10 +2233,42 @@ class KnownIssue(models.Model):
     intermittent = models.BooleanField(default=False)
     environments = models.ManyToManyField(Environment)
 
+    updated_at = models.DateTimeField(auto_now=True)
+
     @classmethod
     def active_by_environment(cls, environment):
         return cls.objects.filter(active=True, environments=environment)
 
+    @classmethod
+    def version(cls, queryset=None):
+        """
+        Identifies the current state of the given issues (all of them by
+        default), from the database itself so that every process agrees on
+        it: it changes whenever one of them is edited, or has its
+        environments changed, and whenever issues are added or removed.
+        """
+        if queryset is None:
+            queryset = cls.objects.all()
+        version = queryset.order_by().aggregate(last_update=Max('updated_at'), count=Count('id'))
+        last_update = version['last_update']
+        return '%s.%d' % (last_update.timestamp() if last_update else 0, version['count'])
+
+    @classmethod
+    def matcher_by_environment(cls, environment):
+        """
+        Returns a KnownIssueMatcher for the active issues of the given
+        environment. Matchers are cached under the version of those issues,
+        so a cached matcher is left behind as soon as any of them changes.
+        """
+        issues = cls.active_by_environment(environment)
+        key = 'known_issues_matcher:%s:%s' % (environment.id, cls.version(issues))
+
+        matcher = cache.get(key)
+        if matcher is None:
+            matcher = KnownIssueMatcher(issues.values_list('id', 'test_name'))
+            cache.set(key, matcher)
+        return matcher
+
     @classmethod
     def active_by_project_and_test(cls, project, test_name=None):
         qs = cls.objects.filter(active=True, environments__project=project).prefetch_related('environments')
@@ -1729,6 +2277,23 @@ class KnownIssue(models.Model):
         return qs.distinct()
 
 
+@receiver(m2m_changed, sender=KnownIssue.environments.through)
+def update_known_issue_version(sender, instance, action, reverse, pk_set, **kwargs):
+    # changing environments does not save the issues themselves
+    if reverse:
+        if action == 'pre_clear':
+            issues = KnownIssue.objects.filter(environments=instance)
+        elif action in ['post_add', 'post_remove']:
+            issues = KnownIssue.objects.filter(pk__in=pk_set)
+        else:
+            return
+    elif action in ['post_add', 'post_remove', 'post_clear']:
+        issues = KnownIssue.objects.filter(pk=instance.pk)
+    else:
+        return
+    issues.update(updated_at=timezone.now())
+
+
 class Annotation(models.Model):
     description = models.CharField(max_length=1024, null=True, blank=True)
     build = models.OneToOneField(Build, on_delete=models.CASCADE)
@@ -1,45 +1,118 @@
 import datetime
-from collections import Counter
-from itertools import groupby
+from collections import Counter, defaultdict
 from functools import reduce
+from itertools import groupby
 
 from squad.core import models
-from squad.core.statistics import geomean
-from squad.core.utils import parse_name
-from django.core.exceptions import ObjectDoesNotExist
+from squad.core.statistics import downsample, GeomeanAccumulator
+from squad.core.utils import parse_name, unpack_measurements
 from django.db.models import Q, F, Sum
 from django.utils import timezone
 
 
+# Number of rows fetched at a time from the database when streaming metric
+# data (see iter_metric_data)
+METRIC_DATA_CHUNK_SIZE = 2000
+
+AGGREGATED_SERIES = [':tests:', ':summary:', ':dynamic_summary:']
+
+
 def get_metric_data(project, metrics, environments, date_start=None,
-                    date_end=None):
+                    date_end=None, max_points=None):
     # Note that date_start and date_end **must** be datetime objects and not
     # strings, if used.
+    #
+    # If max_points is given, each series with more points than that is
+    # downsampled to max_points (see squad.core.statistics.downsample).
 
-    date_start = timezone.make_aware(
-        date_start or datetime.datetime.fromtimestamp(0))
-    date_end = timezone.make_aware(date_end or datetime.datetime.now())
+    date_start, date_end = get_date_range(date_start, date_end)
 
     results = {}
+    real_metrics = [m for m in metrics if m not in AGGREGATED_SERIES]
+    series = get_metrics_series(project, real_metrics, environments,
+                                date_start, date_end)
     for metric in metrics:
-        if metric == ':tests:':
-            results[metric] = get_tests_series(project, environments,
-                                               date_start, date_end)
-        elif metric == ':summary:':
-            results[metric] = get_summary_series(project, environments,
-                                                 date_start, date_end)
-        elif metric == ':dynamic_summary:':
-            real_metrics = [m for m in metrics if m not in [':tests:', ':summary:', ':dynamic_summary:']]
-            results[metric] = get_dynamic_summary(project, environments,
-                                                  real_metrics, date_start,
-                                                  date_end)
+        if metric in AGGREGATED_SERIES:
+            results[metric] = get_aggregated_series(project, metric, environments,
+                                                    real_metrics, date_start,
+                                                    date_end)
         else:
-            results[metric] = get_metric_series(project, metric, environments,
-                                                date_start, date_end)
+            results[metric] = series[metric]
+
+    if max_points is not None:
+        for data in results.values():
+            for environment, points in data.items():
+                data[environment] = downsample(points, max_points)
 
     return results
 
 
+def iter_metric_data(project, metrics, environments, date_start=None,
+                     date_end=None, max_points=None):
+    """
+    Yields the same data as get_metric_data, as (metric, environment slug,
+    point) tuples, metric by metric and environment by environment.
+
+    The series of each metric are read off a database cursor, in chunks of
+    METRIC_DATA_CHUNK_SIZE rows, and yielded as they come, so that they are
+    never held in memory as a whole; except when they are downsampled, which
+    needs one whole series at a time.
+    """
+    date_start, date_end = get_date_range(date_start, date_end)
+    real_metrics = [m for m in metrics if m not in AGGREGATED_SERIES]
+    environments = list(environments)
+    slugs = {e.id: e.slug for e in environments}
+
+    for metric in metrics:
+        if metric in AGGREGATED_SERIES:
+            data = get_aggregated_series(project, metric, environments,
+                                         real_metrics, date_start, date_end)
+            for environment, points in data.items():
+                for point in downsample(points, max_points):
+                    yield metric, environment, point
+            continue
+
+        metadata = get_metrics_metadata([metric])
+        if not metadata or not environments:
+            continue
+
+        rows = get_metric_points(
+            slugs.keys(),
+            metadata.keys(),
+            date_start,
+            date_end,
+        ).order_by(
+            'environment_id',
+            'datetime',
+            'metric_id',
+        ).iterator(chunk_size=METRIC_DATA_CHUNK_SIZE)
+
+        for environment_id, environment_rows in groupby(rows, lambda row: row[1]):
+            points = (metric_point(row) for row in environment_rows)
+            if max_points is not None:
+                points = downsample(list(points), max_points)
+            for point in points:
+                yield metric, slugs[environment_id], point
+
+
+def get_date_range(date_start, date_end):
+    return (
+        timezone.make_aware(date_start or datetime.datetime.fromtimestamp(0)),
+        timezone.make_aware(date_end or datetime.datetime.now()),
+    )
+
+
+def get_aggregated_series(project, metric, environments, real_metrics,
+                          date_start, date_end):
+    if metric == ':tests:':
+        return get_tests_series(project, environments, date_start, date_end)
+    elif metric == ':summary:':
+        return get_summary_series(project, environments, date_start, date_end)
+    else:
+        return get_dynamic_summary(project, environments, real_metrics,
+                                   date_start, date_end)
+
+
 def split_measurements(liststr):
     return sorted([float(f) for f in liststr.split(',')])
 
@@ -53,35 +126,84 @@ def get_max(liststr):
 
 
 def get_metric_series(project, metric, environments, date_start, date_end):
-    entry = {}
-    for environment in environments:
-        series = models.Metric.objects.by_full_name(metric).filter(
-            environment=environment,
-            test_run__created_at__range=(date_start, date_end)
-        ).order_by(
-            'test_run__datetime',
-        ).values(
-            'id',
-            'build__datetime',
-            'build__version',
-            'result',
-            'build__annotation__description',
-            'is_outlier',
-            'measurements',
-        )
-        entry[environment.slug] = [
-            [
-                int(p['build__datetime'].timestamp()),
-                p['result'],
-                p['build__version'],
-                p['build__annotation__description'] or "",
-                p['id'],
-                str(p['is_outlier']),
-                get_min(p['measurements']),
-                get_max(p['measurements']),
-            ] for p in series
-        ]
-    return entry
+    return get_metrics_series(project, [metric], environments, date_start, date_end)[metric]
+
+
+def get_metrics_metadata(metrics):
+    """
+    Returns a dictionary with the id of the SuiteMetadata of each of the
+    given metric full names, mapped to the list of those names.
+    """
+    names = defaultdict(list)
+    for metric in metrics:
+        names[parse_name(metric)].append(metric)
+
+    metadata_filter = reduce(lambda x, y: x | y, [Q(suite=suite, name=name) for suite, name in names.keys()])
+    metadata = {}
+    for metadata_id, suite, name in models.SuiteMetadata.objects.filter(metadata_filter).values_list('id', 'suite', 'name'):
+        metadata[metadata_id] = names[(suite, name)]
+    return metadata
+
+
+def get_metrics_series(project, metrics, environments, date_start, date_end):
+    """
+    Returns the series of each of the given metrics, in each of the given
+    environments, all read from MetricPoint with a single query.
+    """
+    environments = {e.id: e.slug for e in environments}
+    entries = {metric: {slug: [] for slug in environments.values()} for metric in metrics}
+    if not metrics or not environments:
+        return entries
+
+    metadata = get_metrics_metadata(metrics)
+    points = get_metric_points(
+        environments.keys(),
+        metadata.keys(),
+        date_start,
+        date_end,
+    ).order_by(
+        'datetime',
+        'metric_id',
+    )
+
+    for row in points.iterator():
+        for metric in metadata[row[0]]:
+            entries[metric][environments[row[1]]].append(metric_point(row))
+
+    return entries
+
+
+def get_metric_points(environments_ids, metadata_ids, date_start, date_end):
+    return models.MetricPoint.objects.filter(
+        environment_id__in=environments_ids,
+        metadata_id__in=metadata_ids,
+        created_at__range=(date_start, date_end),
+    ).values_list(
+        'metadata_id',
+        'environment_id',
+        'build__datetime',
+        'result',
+        'build__version',
+        'build__annotation__description',
+        'metric_id',
+        'is_outlier',
+        'measurements_min',
+        'measurements_max',
+    )
+
+
+def metric_point(row):
+    _, _, build_datetime, result, version, description, metric_id, is_outlier, measurements_min, measurements_max = row
+    return [
+        int(build_datetime.timestamp()),
+        result,
+        version,
+        description or "",
+        metric_id,
+        str(is_outlier),
+        measurements_min,
+        measurements_max,
+    ]
 
 
 def get_tests_series(project, environments, date_start, date_end):
@@ -147,57 +269,85 @@ def get_summary_series(project, environments, date_start, date_end):
 
 def get_dynamic_summary(project, environments, metrics, date_start, date_end):
     entry = {}
-    filters = []
     if not metrics:
         for env in environments:
             entry[env.slug] = []
         return entry
-    for m in metrics:
-        suite, metric = parse_name(m)
-        filters.append(Q(suite__slug=suite) & Q(metadata__name=metric))
-    metric_filter = reduce(lambda x, y: x | y, filters)
 
+    environments = {e.id: e.slug for e in environments}
     data = models.Metric.objects.filter(
-        environment__in=environments,
+        environment_id__in=environments.keys(),
+        metadata_id__in=get_metrics_metadata(metrics).keys(),
         test_run__created_at__range=(date_start, date_end),
-    ).filter(
-        metric_filter
-    ).prefetch_related(
-        'environment',
-        'build__annotation',
-    ).order_by('environment_id', 'build_id')
-
-    for environment, metrics_by_environment in groupby(data, lambda m: m.environment):
-        envdata = []
-        metrics_by_build = groupby(metrics_by_environment, lambda m: m.build)
-        for build, metric_list in metrics_by_build:
+    ).order_by().values_list(
+        'environment_id',
+        'build_id',
+        'is_outlier',
+        'packed_measurements',
+        'measurements',
+    )
+
+    # The geometric mean of the measurements of each build is accumulated
+    # as the metrics come, without holding them in memory
+    summaries = defaultdict(GeomeanAccumulator)
+    for environment_id, build_id, is_outlier, packed_measurements, measurements in data.iterator():
+        summary = summaries[(environment_id, build_id)]
+        if is_outlier:
+            continue
+        if packed_measurements is not None:
+            values = unpack_measurements(packed_measurements)
+        elif measurements:
+            values = [float(v) for v in measurements.split(',')]
+        else:
             values = []
-            for metric in metric_list:
-                if not metric.is_outlier:
-                    values = values + metric.measurement_list
-            try:
-                description = build.annotation.description
-            except ObjectDoesNotExist:
-                description = ""
-            envdata.append([
-                build.datetime.timestamp(),
-                geomean(values),
-                build.version,
-                description,
-            ])
-        entry[environment.slug] = sorted(envdata, key=(lambda e: e[0]))
+        for value in values:
+            summary.add(value)
+
+    builds = models.Build.objects.filter(
+        id__in=set(build_id for _, build_id in summaries.keys()),
+    ).values_list('id', 'datetime', 'version', 'annotation__description')
+    builds = {b[0]: b[1:] for b in builds}
+
+    for (environment_id, build_id), summary in sorted(summaries.items(), key=lambda s: s[0]):
+        build_datetime, version, description = builds[build_id]
+        entry.setdefault(environments[environment_id], []).append([
+            build_datetime.timestamp(),
+            summary.value,
+            version,
+            description or "",
+        ])
+
+    for envdata in entry.values():
+        envdata.sort(key=(lambda e: e[0]))
 
     return entry
 
 
-def test_confidence(test, list_of_duplicates=None):
-    status_priority = ['fail', 'pass', 'xfail', 'skip']
+STATUS_PRIORITY = ['fail', 'pass', 'xfail', 'skip']
 
-    def most_common(lst):
-        data = Counter(lst)
-        max_count = max(data.values())
-        return {value: count for value, count in data.items() if count == max_count}
 
+def status_confidence(counts):
+    """
+    Given a Counter with the statuses of duplicated tests, returns the most
+    common status (the most prioritized one on ties) and the percentage of
+    tests that have it, as a list.
+    """
+    max_count = max(counts.values())
+    most_frequent_statuses = [status for status, count in counts.items() if count == max_count]
+    if not len(most_frequent_statuses) == 1:
+        for s in STATUS_PRIORITY:
+            # Get the most prioritized status based on priority list.
+            if s in most_frequent_statuses:
+                return_status = s
+                break
+    else:
+        return_status = most_frequent_statuses[0]
+
+    confidence_score = max_count / sum(counts.values()) * 100
+    return [return_status, confidence_score]
+
+
+def test_confidence(test, list_of_duplicates=None):
     if test:
         duplicates = models.Test.objects.filter(metadata_id=test.metadata_id, environment_id=test.environment_id, build_id=test.build_id).order_by()
     else:
@@ -206,16 +356,4 @@ def test_confidence(test, list_of_duplicates=None):
     if len(duplicates) == 1:
         return test.status, None
     else:
-        most_frequent_statuses = most_common(
-            [t.status for t in duplicates])
-        if not len(most_frequent_statuses) == 1:
-            for s in status_priority:
-                # Get the most prioritized status based on priority list.
-                if s in most_frequent_statuses.keys():
-                    return_status = s
-                    break
-        else:
-            return_status = list(most_frequent_statuses.keys())[0]
-
-        confidence_score = list(most_frequent_statuses.values())[0] / len(duplicates) * 100
-        return [return_status, confidence_score]
+        return status_confidence(Counter([t.status for t in duplicates]))
@@ -1,4 +1,12 @@
 from math import log, exp
+import statistics
+
+from squad.core.utils import unpack_measurements
+
+try:
+    import numpy
+except ImportError:  # NumPy is optional, see measurements_stats()
+    numpy = None
 
 
 def geomean(values):
@@ -28,3 +36,140 @@ def geomean(values):
     for v in values:
         log_sum = log_sum + log(v)
     return exp(log_sum / n)
+
+
+class GeomeanAccumulator(object):
+    """
+    Computes the same as geomean(), but without holding the values in
+    memory: values are added one at a time and only the sum of their
+    logarithms and their count are kept. Accumulators over disjoint sets of
+    values can be combined with `merge`.
+    """
+
+    def __init__(self, log_sum=0.0, count=0):
+        self.log_sum = log_sum
+        self.count = count
+
+    def add(self, value):
+        if value > 0:
+            self.log_sum = self.log_sum + log(value)
+            self.count += 1
+
+    def merge(self, other):
+        self.log_sum = self.log_sum + other.log_sum
+        self.count += other.count
+
+    @property
+    def value(self):
+        if self.count == 0:
+            return 0
+        return exp(self.log_sum / self.count)
+
+
+def measurements_stats(groups):
+    """
+    Given a list of groups of measurements, returns a list with the mean,
+    population standard deviation and count of the values of each group.
+    Each group is a list of the measurements of single metrics, either
+    packed (see squad.core.utils.pack_measurements) or as strings of
+    comma-separated values.
+
+    When NumPy is available, all of the measurements are loaded at once into
+    a single array, and the statistics of every group are computed with
+    reductions over its slice of the array (see numpy.add.reduceat).
+    Otherwise each group is handled in turn, in pure Python.
+
+    Groups without any values get None instead.
+    """
+    if numpy is None or len(groups) == 0:
+        return [__group_stats__(group) for group in groups]
+
+    counts = numpy.array([
+        sum(__count__(m) for m in group) for group in groups
+    ])
+    stats = [None] * len(groups)
+    nonempty = counts > 0
+    if not nonempty.any():
+        return stats
+
+    if all(not isinstance(m, str) for group in groups for m in group):
+        values = numpy.frombuffer(b''.join([m for group in groups for m in group]), dtype='<f8')
+    else:
+        values = numpy.array(','.join([__text__(m) for group in groups for m in group if __count__(m)]).split(','), dtype=float)
+
+    # reduceat gives an empty group the value at its offset, i.e. the first
+    # one of the next group, so only the groups with values are reduced
+    offsets = numpy.concatenate(([0], numpy.cumsum(counts)[:-1]))[nonempty]
+    counts = counts[nonempty]
+    means = numpy.add.reduceat(values, offsets) / counts
+    deviations = values - numpy.repeat(means, counts)
+    stddevs = numpy.sqrt(numpy.add.reduceat(deviations * deviations, offsets) / counts)
+
+    for index, mean, stddev, count in zip(numpy.flatnonzero(nonempty), means, stddevs, counts):
+        stats[index] = (float(mean), float(stddev), int(count))
+    return stats
+
+
+def __count__(measurements):
+    if isinstance(measurements, str):
+        return measurements.count(',') + 1
+    return len(measurements) // 8
+
+
+def __text__(measurements):
+    if isinstance(measurements, str):
+        return measurements
+    return ','.join([repr(v) for v in unpack_measurements(measurements)])
+
+
+def __group_stats__(group):
+    values = []
+    for measurements in group:
+        if isinstance(measurements, str):
+            values += [float(v) for v in measurements.split(',')]
+        else:
+            values += unpack_measurements(measurements)
+    if len(values) == 0:
+        return None
+    return (statistics.mean(values), statistics.pstdev(values), len(values))
+
+
+def downsample(points, max_points):
+    """
+    Reduces a series of points to at most `max_points` of them, with the
+    Largest-Triangle-Three-Buckets algorithm: the first and last points are
+    kept, and the others are split into `max_points - 2` buckets, from each
+    of which the point that forms the largest triangle with the point
+    picked from the previous bucket and the average of the next bucket is
+    kept. That preserves the visual shape of the series, peaks included.
+
+    Points are sequences whose first two items are x and y; any other items
+    are left untouched, since only whole points are picked.
+    """
+    count = len(points)
+    if max_points is None or count <= max_points or count <= 2:
+        return points
+    if max_points < 3:
+        return [points[0], points[-1]][:max_points]
+
+    sampled = [points[0]]
+    every = (count - 2) / (max_points - 2)
+    previous = 0
+    for i in range(max_points - 2):
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, count)
+        next_bucket = points[next_start:next_end]
+        average_x = sum(p[0] for p in next_bucket) / len(next_bucket)
+        average_y = sum(p[1] for p in next_bucket) / len(next_bucket)
+
+        x, y = points[previous][0], points[previous][1]
+        largest = -1
+        for j in range(int(i * every) + 1, next_start):
+            area = abs((x - average_x) * (points[j][1] - y) - (x - points[j][0]) * (average_y - y))
+            if area > largest:
+                largest = area
+                previous = j
+        sampled.append(points[previous])
+
+    sampled.append(points[-1])
+    return sampled
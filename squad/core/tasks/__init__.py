@@ -1,17 +1,16 @@
 from django.core.exceptions import MultipleObjectsReturned
 from django.utils import timezone
 from collections import defaultdict
-import itertools
 import json
 import logging
-import re
 import traceback
 import uuid
 import yaml
 
 
+from django.conf import settings
 from django.db import transaction
-from django.db.models import Count
+from django.db.models import Count, Q
 
 
 from squad.celery import app as celery
@@ -21,7 +20,9 @@ from squad.core.models import (
     SuiteVersion,
     SuiteMetadata,
     Test,
+    TestTimeline,
     Metric,
+    MetricPoint,
     Status,
     ProjectStatus,
     KnownIssue,
@@ -33,10 +34,10 @@ from squad.core.models import (
 )
 from squad.core.callback import dispatch_callbacks_on_build_finished
 from squad.core.data import JSONTestDataParser, JSONMetricDataParser
-from squad.core.statistics import geomean
+from squad.core.statistics import GeomeanAccumulator
 from squad.core.notification import Notification
 from squad.core.plugins import apply_plugins
-from squad.core.utils import join_name, split_dict
+from squad.core.utils import join_name, split_iterable, unpack_measurements
 from rest_framework import status
 from jinja2 import TemplateSyntaxError
 from . import exceptions
@@ -182,6 +183,7 @@ class ReceiveTestRun(object):
         if not build.datetime or testrun.datetime < build.datetime:
             build.datetime = testrun.datetime
             build.save()
+            TestTimeline.invalidate_build(build)
 
         processor = ProcessTestRun()
         processor(testrun)
@@ -210,6 +212,128 @@ def get_suite(test_run, suite_name):
     return suite
 
 
+class StatusAccumulator(object):
+    """
+    Accumulates per-suite test counts and metrics geomeans of a test run, as
+    its tests and metrics are inserted, so that RecordTestRunStatus does not
+    need to read them all back from the database.
+
+    `last_test_id` and `last_metric_id` are the highest ids accumulated so
+    far; anything in the test run with a higher id (e.g. tests created by
+    plugins after parsing) is read from the database by `add_from_database`.
+    """
+
+    def __init__(self):
+        self.tests = defaultdict(lambda: {'pass': 0, 'fail': 0, 'xfail': 0, 'skip': 0})
+        self.metrics = defaultdict(GeomeanAccumulator)
+        self.last_test_id = 0
+        self.last_metric_id = 0
+        self.incomplete = False
+
+    def __discard__(self):
+        # the database backend did not return ids for inserted objects, so
+        # there is no way to tell what was accumulated: start over from the
+        # database later
+        self.__init__()
+        self.incomplete = True
+
+    def __count_test__(self, suite_id, result, has_known_issues, count=1):
+        if result:
+            key = 'pass'
+        elif result is None:
+            key = 'skip'
+        elif has_known_issues:
+            key = 'xfail'
+        else:
+            key = 'fail'
+        self.tests[suite_id][key] += count
+
+    def add_test(self, test_id, suite_id, result, has_known_issues):
+        if self.incomplete:
+            return
+        if test_id is None:
+            self.__discard__()
+            return
+
+        self.__count_test__(suite_id, result, has_known_issues)
+        self.last_test_id = max(self.last_test_id, test_id)
+
+    def replace_test(self, suite_id, old_result, old_has_known_issues, result, has_known_issues):
+        if self.incomplete:
+            return
+        self.__count_test__(suite_id, old_result, old_has_known_issues, count=-1)
+        self.__count_test__(suite_id, result, has_known_issues)
+
+    def add_metric(self, metric_id, suite_id, measurements):
+        if self.incomplete:
+            return
+        if metric_id is None:
+            self.__discard__()
+            return
+
+        accumulator = self.metrics[suite_id]
+        for value in measurements:
+            accumulator.add(float(value))
+        self.last_metric_id = max(self.last_metric_id, metric_id)
+
+    def add_from_database(self, testrun):
+        """
+        Reads everything in the test run that was not accumulated yet, with
+        one grouped query for tests and one query for metrics.
+        """
+        if self.incomplete:
+            self.__init__()
+
+        tests = testrun.tests.filter(id__gt=self.last_test_id)
+        counts = tests.values('suite_id', 'result', 'has_known_issues').annotate(count=Count('id')).order_by()
+        for c in counts:
+            self.__count_test__(c['suite_id'], c['result'], c['has_known_issues'], c['count'])
+
+        metrics = testrun.metrics.filter(id__gt=self.last_metric_id).values_list(
+            'id', 'suite_id', 'packed_measurements', 'measurements',
+        ).order_by('id')
+        for metric_id, suite_id, packed_measurements, measurements in metrics.iterator():
+            if packed_measurements is not None:
+                values = unpack_measurements(packed_measurements)
+            elif measurements:
+                values = measurements.split(',')
+            else:
+                continue
+            if values:
+                self.add_metric(metric_id, suite_id, values)
+
+    def get_statuses(self, testrun):
+        """
+        Returns unsaved Status objects, keyed by suite id. The one with key
+        None is the test run's summary.
+        """
+        status = defaultdict(lambda: Status(test_run=testrun))
+        overall = status[None]
+
+        for sid, counts in self.tests.items():
+            for s in (overall, status[sid]):
+                s.tests_pass += counts['pass']
+                s.tests_xfail += counts['xfail']
+                s.tests_fail += counts['fail']
+                s.tests_skip += counts['skip']
+
+        # One Status has many test suites and each of one of them
+        # has their own summary (i.e. geomean).
+        # The status having no test suite (suite=None) represent
+        # the TestRun's summary
+        metrics = GeomeanAccumulator()
+        for sid, accumulator in self.metrics.items():
+            status[sid].metrics_summary = accumulator.value
+            status[sid].has_metrics = True
+            metrics.merge(accumulator)
+        overall.metrics_summary = metrics.value
+        overall.has_metrics = True
+
+        for sid, s in status.items():
+            s.suite_id = sid
+        return status
+
+
 class ParseTestRunData(object):
 
     @staticmethod
@@ -283,86 +407,168 @@ class ParseTestRunData(object):
         # Attach known issues, if any
         for test in created_tests:
             test_full_name = metadata_names[test.metadata_id]
-            test_full_name = join_name(metadata.suite, metadata.name)
             issues = issues_by_full_name.get(test_full_name, [])
             if len(issues) > 0:
                 test.known_issues.add(*issues)
 
-    @staticmethod
-    def __call__(test_run):
-        if test_run.data_processed:
-            return
-
-        project = test_run.build.project
+        return created_tests
 
-        # Issues' test_name should be interpreted as regexes
-        # so compile them prior to matching against test names
-        # The * character should be replaced by .*?, which is regex for "everything"
-        issues = defaultdict(list)
-        issues_regex = {}
-        for issue in KnownIssue.active_by_environment(test_run.environment):
-            issues[issue.test_name].append(issue)
-
-        for test_name_regex in issues.keys():
-            pattern = re.escape(test_name_regex).replace('\\*', '.*?')
-            regex = re.compile(pattern)
-            issues_regex[regex] = issues[test_name_regex]
-
-        tests_details = {}
-        suites_slugs = set()
-        issues_by_full_name = {}
-        for test in test_parser()(test_run.tests_file):
-            # TODO: remove check below when test_name size changes in the schema
-            if len(test['test_name']) > 256:
+    @staticmethod
+    def update_tests(testrun, tests_details, issues_by_full_name, status):
+        """
+        Overwrites tests already inserted in testrun with later results for
+        the same full names.
+        """
+        tests = Test.objects.filter(
+            test_run=testrun,
+            metadata__name__in=[t['test_name'] for t in tests_details.values()],
+        ).select_related('metadata')
+
+        updated = []
+        for test in tests:
+            full_name = join_name(test.metadata.suite, test.metadata.name)
+            details = tests_details.get(full_name)
+            if details is None:
                 continue
 
-            full_name = join_name(test['group_name'], test['test_name'])
-            test_issues = list(itertools.chain(*[
-                issue for regex, issue in issues_regex.items()
-                if regex.match(full_name)
-            ]))
+            status.replace_test(test.suite_id, test.result, test.has_known_issues, details['result'], details['has_known_issues'])
+            test.result = details['result']
+            test.log = details['log']
+            test.has_known_issues = details['has_known_issues']
+            test.known_issues.set(issues_by_full_name.get(full_name, []))
+            updated.append(test)
 
-            suites_slugs.add(test['group_name'])
-            tests_details[full_name] = {
-                'suite_slug': test['group_name'],
-                'test_name': test['test_name'],
-                'result': test['pass'],
-                'log': test['log'],
-                'has_known_issues': bool(test_issues),
-            }
+        Test.objects.bulk_update(updated, ['result', 'log', 'has_known_issues'])
 
-            issues_by_full_name[full_name] = test_issues
+    @staticmethod
+    def create_metrics_batch(testrun, metrics_batch, suites_ids):
+
+        # Create SuiteMetadata in bulk
+        SuiteMetadata.objects.bulk_create([
+            SuiteMetadata(
+                suite=metric['group_name'],
+                name=metric['name'],
+                kind='metric',
+            ) for metric in metrics_batch
+        ], ignore_conflicts=True)
 
-        suites_ids = ParseTestRunData.create_suites(project, suites_slugs)
+        # We need the extra SELECT due to `ignore_conflicts=True` above
+        metadata_ids = {}
+        metadatas = SuiteMetadata.objects.filter(
+            kind='metric',
+            name__in=set(m['name'] for m in metrics_batch),
+        ).values_list('id', 'suite', 'name')
 
-        # Insert tests in batches
-        batch_size = 1000
-        for batch in split_dict(tests_details, batch_size):
-            ParseTestRunData.create_tests_batch(test_run, batch, issues_by_full_name, suites_ids)
+        for metadata_id, suite, name in metadatas:
+            metadata_ids[(suite, name)] = metadata_id
 
-        for metric in metric_parser()(test_run.metrics_file):
-            # TODO: remove check below when test_name size changes in the schema
-            if len(metric['name']) > 256:
-                continue
-            suite = get_suite(
-                test_run,
-                metric['group_name']
-            )
-            metadata, _ = SuiteMetadata.objects.get_or_create(suite=suite.slug, name=metric['name'], kind='metric')
-            Metric.objects.create(
-                test_run=test_run,
-                suite=suite,
-                metadata=metadata,
+        metrics = []
+        for metric in metrics_batch:
+            m = Metric(
+                test_run=testrun,
+                suite_id=suites_ids[metric['group_name']],
+                metadata_id=metadata_ids[(metric['group_name'], metric['name'])],
                 result=metric['result'],
-                measurements=','.join([str(m) for m in metric['measurements']]),
                 unit=metric['unit'],
-                build=test_run.build,
-                environment=test_run.environment,
+                build_id=testrun.build_id,
+                environment_id=testrun.environment_id,
             )
+            m.set_measurements(metric['measurements'])
+            metrics.append(m)
+
+        metrics = Metric.objects.bulk_create(metrics)
+        MetricPoint.objects.bulk_create([MetricPoint.from_metric(m, testrun) for m in metrics])
+        return metrics
+
+    @staticmethod
+    def __call__(test_run):
+        """
+        Returns a StatusAccumulator with the status of everything that was
+        inserted, to be handed over to RecordTestRunStatus, or None if the
+        test run had already been processed.
+        """
+        if test_run.data_processed:
+            return None
+
+        project = test_run.build.project
+        status = StatusAccumulator()
+
+        # Issues' test_name should be interpreted as patterns, and matching
+        # them against every test is the hot path here; use a precompiled
+        # matcher instead of trying each pattern in turn
+        known_issues = KnownIssue.matcher_by_environment(test_run.environment)
+
+        # Tests are read incrementally from the tests file and inserted in
+        # batches, so that huge test runs do not have to be held in memory.
+        # Repeated names collapse into a single test, with the last result
+        # for the name: within a batch, later results overwrite earlier ones,
+        # and results for names inserted by an earlier batch are kept apart
+        # and written over the inserted tests at the end
+        suites_ids = {}
+        inserted_full_names = set()
+        repeated_tests = {}
+        repeated_issues = {}
+        with test_run.open_tests_file() as tests_file:
+            for batch in split_iterable(test_parser().iterparse(tests_file), settings.SQUAD_TESTS_BATCH_SIZE):
+                tests_details = {}
+                issues_by_full_name = {}
+                for test in batch:
+                    # TODO: remove check below when test_name size changes in the schema
+                    if len(test['test_name']) > 256:
+                        continue
+
+                    full_name = join_name(test['group_name'], test['test_name'])
+                    test_issues = known_issues(full_name)
+                    details = {
+                        'suite_slug': test['group_name'],
+                        'test_name': test['test_name'],
+                        'result': test['pass'],
+                        'log': test['log'],
+                        'has_known_issues': bool(test_issues),
+                    }
+
+                    if full_name in inserted_full_names:
+                        repeated_tests[full_name] = details
+                        repeated_issues[full_name] = test_issues
+                        continue
+
+                    tests_details[full_name] = details
+                    issues_by_full_name[full_name] = test_issues
+
+                if len(tests_details) == 0:
+                    continue
+
+                inserted_full_names.update(tests_details.keys())
+                suites_slugs = set(t['suite_slug'] for t in tests_details.values()) - set(suites_ids.keys())
+                if len(suites_slugs):
+                    suites_ids.update(ParseTestRunData.create_suites(project, suites_slugs))
+
+                created_tests = ParseTestRunData.create_tests_batch(test_run, tests_details, issues_by_full_name, suites_ids)
+                for test in created_tests:
+                    status.add_test(test.id, test.suite_id, test.result, test.has_known_issues)
+
+        if repeated_tests:
+            ParseTestRunData.update_tests(test_run, repeated_tests, repeated_issues, status)
+
+        metrics = (
+            metric for metric in metric_parser()(test_run.metrics_file)
+            # TODO: remove check below when test_name size changes in the schema
+            if len(metric['name']) <= 256
+        )
+        for batch in split_iterable(metrics, settings.SQUAD_METRICS_BATCH_SIZE):
+            suites_slugs = set(m['group_name'] for m in batch) - set(suites_ids.keys())
+            if len(suites_slugs):
+                suites_ids.update(ParseTestRunData.create_suites(project, suites_slugs))
+
+            created_metrics = ParseTestRunData.create_metrics_batch(test_run, batch, suites_ids)
+            for metric, created in zip(batch, created_metrics):
+                status.add_metric(created.id, created.suite_id, metric['measurements'])
 
         test_run.data_processed = True
         test_run.save()
 
+        return status
+
 
 class PostProcessTestRun(object):
 
@@ -475,53 +681,19 @@ def prepare_report(delayed_report_id):
 class RecordTestRunStatus(object):
 
     @staticmethod
-    def __call__(testrun):
+    def __call__(testrun, status=None):
+        """
+        `status` is the StatusAccumulator returned by ParseTestRunData, if
+        available. Otherwise, the status is computed from the database.
+        """
         if testrun.status_recorded:
             return
 
-        status = defaultdict(lambda: Status(test_run=testrun))
-
-        # Get number of passing tests per suite
-        passes = testrun.tests.filter(result=True).values('suite_id').annotate(pass_count=Count('suite_id')).order_by()
-        xfails = testrun.tests.filter(result=False, has_known_issues=True).values('suite_id').annotate(xfail_count=Count('suite_id')).order_by()
-        fails = testrun.tests.filter(result=False).exclude(has_known_issues=True).values('suite_id').annotate(fail_count=Count('suite_id')).order_by()
-        skips = testrun.tests.filter(result__isnull=True).values('suite_id').annotate(skip_count=Count('suite_id')).order_by()
-
-        for p in passes:
-            status[None].tests_pass += p['pass_count']
-            status[p['suite_id']].tests_pass += p['pass_count']
-
-        for x in xfails:
-            status[None].tests_xfail += x['xfail_count']
-            status[x['suite_id']].tests_xfail += x['xfail_count']
-
-        for f in fails:
-            status[None].tests_fail += f['fail_count']
-            status[f['suite_id']].tests_fail += f['fail_count']
-
-        for s in skips:
-            status[None].tests_skip += s['skip_count']
-            status[s['suite_id']].tests_skip += s['skip_count']
+        if status is None:
+            status = StatusAccumulator()
+        status.add_from_database(testrun)
 
-        metrics = defaultdict(lambda: [])
-        for metric in testrun.metrics.all():
-            sid = metric.suite_id
-            for v in metric.measurement_list:
-                metrics[None].append(v)
-                metrics[sid].append(v)
-
-        # One Status has many test suites and each of one of them
-        # has their own summary (i.e. geomean).
-        # The status having no test suite (suite=None) represent
-        # the TestRun's summary
-        if len(metrics[None]):
-            status[None].has_metrics = True
-        for sid, values in metrics.items():
-            status[sid].metrics_summary = geomean(values)
-            status[sid].has_metrics = True
-
-        for sid, s in status.items():
-            s.suite_id = sid
+        for sid, s in status.get_statuses(testrun).items():
             s.suite_version = get_suite_version(testrun, s.suite)
             s.save()
 
@@ -531,21 +703,61 @@ class RecordTestRunStatus(object):
 
 class UpdateProjectStatus(object):
 
+    def __call__(self, testrun):
+        self.update(testrun.build)
+
     @staticmethod
-    def __call__(testrun):
-        projectstatus = ProjectStatus.create_or_update(testrun.build)
+    def update(build):
+        projectstatus = ProjectStatus.create_or_update(build, incremental=True)
 
         if projectstatus.finished:
-            dispatch_callbacks_on_build_finished(testrun.build)
+            dispatch_callbacks_on_build_finished(build)
 
         maybe_notify_project_status.delay(projectstatus.id)
 
 
+class ScheduleProjectStatusUpdate(object):
+    """
+    Does the same as UpdateProjectStatus, but at most once every
+    SQUAD_PROJECT_STATUS_UPDATE_DELAY seconds for each build: the first
+    test run schedules an update of the build status, and the ones that
+    arrive before it runs are included in it.
+    """
+
+    # a scheduled update that did not run after this long (on top of the
+    # delay) is considered lost, and a new one is scheduled
+    LOST_UPDATE_TIMEOUT = 600
+
+    def __call__(self, testrun):
+        delay = settings.SQUAD_PROJECT_STATUS_UPDATE_DELAY
+        if not delay:
+            UpdateProjectStatus()(testrun)
+            return
+
+        now = timezone.now()
+        lost = now - timezone.timedelta(seconds=delay + self.LOST_UPDATE_TIMEOUT)
+        scheduled = ProjectStatus.objects.filter(
+            Q(update_scheduled_at=None) | Q(update_scheduled_at__lt=lost),
+            build_id=testrun.build_id,
+        ).update(update_scheduled_at=now)
+
+        if scheduled:
+            update_project_status.apply_async(args=[testrun.build_id], countdown=delay)
+
+
+@celery.task
+def update_project_status(build_id):
+    # clear the flag first: test runs arriving while the status is being
+    # updated will schedule a new update
+    ProjectStatus.objects.filter(build_id=build_id).update(update_scheduled_at=None)
+    UpdateProjectStatus.update(Build.objects.get(pk=build_id))
+
+
 class UpdateBuildSummary(object):
 
     @staticmethod
     def __call__(testrun):
-        BuildSummary.create_or_update(testrun.build, testrun.environment)
+        BuildSummary.create_or_update(testrun.build, testrun.environment, incremental=True)
 
 
 class ProcessTestRun(object):
@@ -553,9 +765,20 @@ class ProcessTestRun(object):
     @staticmethod
     def __call__(testrun):
         with transaction.atomic():
-            ParseTestRunData()(testrun)
+            status = ParseTestRunData()(testrun)
             PostProcessTestRun()(testrun)
-            RecordTestRunStatus()(testrun)
+            RecordTestRunStatus()(testrun, status)
+            if status is not None:
+                transaction.on_commit(lambda: update_test_timelines.delay(testrun.id))
+
+
+@celery.task
+def update_test_timelines(test_run_id):
+    try:
+        testrun = TestRun.objects.select_related('build', 'environment').get(pk=test_run_id)
+    except TestRun.DoesNotExist:
+        return
+    TestTimeline.add_test_run(testrun)
 
 
 class ProcessAllTestRuns(object):
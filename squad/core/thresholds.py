@@ -0,0 +1,56 @@
+import re
+from collections import defaultdict
+
+from squad.core.known_issues import pattern_to_regex
+
+
+class MetricThresholdMatcher(object):
+    """
+    Matches metric full names against MetricThreshold.name patterns,
+    returning the ids of the thresholds whose pattern matches.
+
+    Patterns must match the whole metric name. A pattern with no "*" can then
+    only match itself, so those are kept in a dictionary and cost a single
+    lookup per metric. Any other pattern goes into a single combined regex,
+    with one named group per pattern, that is tried once per metric.
+    """
+
+    def __init__(self, patterns):
+        """
+        patterns: iterable of (threshold_id, name) pairs
+        """
+        literals = defaultdict(list)
+        thresholds_by_glob = defaultdict(list)
+        for threshold_id, pattern in patterns:
+            if '*' in pattern:
+                thresholds_by_glob[pattern].append(threshold_id)
+            else:
+                literals[pattern].append(threshold_id)
+
+        self.literals = dict(literals)
+        self.globs = [
+            (re.compile(pattern_to_regex(pattern)), thresholds_ids)
+            for pattern, thresholds_ids in thresholds_by_glob.items()
+        ]
+        self.combined = None
+        if self.globs:
+            self.combined = re.compile('|'.join([
+                '(?P<g%d>%s)' % (index, regex.pattern)
+                for index, (regex, _) in enumerate(self.globs)
+            ]))
+
+    def __call__(self, full_name):
+        thresholds_ids = list(self.literals.get(full_name, []))
+
+        if self.combined is not None:
+            match = self.combined.fullmatch(full_name)
+            if match:
+                # the combined regex only tells the first pattern that
+                # matches; the following ones still need to be tried
+                first = int(match.lastgroup[1:])
+                thresholds_ids += self.globs[first][1]
+                for regex, glob_thresholds_ids in self.globs[first + 1:]:
+                    if regex.fullmatch(full_name):
+                        thresholds_ids += glob_thresholds_ids
+
+        return thresholds_ids
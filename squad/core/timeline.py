@@ -0,0 +1,115 @@
+RESULT = 0
+COUNT = 1
+FIRST_BUILD = 2
+FIRST_TEST = 3
+LAST_BUILD = 4
+LAST_TEST = 5
+LAST_BUILD_COUNT = 6
+
+
+class Timeline(object):
+    """
+    Run-length encoded results of a single test in a single environment,
+    ordered by build, and then by test within the same build. Builds are
+    identified by anything that sorts them in order, e.g. their datetime.
+
+    Each run holds consecutive results that are equal, as a list:
+
+        [result, count, first_build, first_test_id, last_build,
+         last_test_id, last_build_count]
+
+    where last_build_count is how many of the results in the run come from
+    its last build. That is enough to tell the history of the latest result
+    of each run (see `history`) without looking at the tests themselves.
+    """
+
+    def __init__(self, runs=None):
+        self.runs = runs if runs is not None else []
+
+    def count(self):
+        return sum(run[COUNT] for run in self.runs)
+
+    def __find__(self, key):
+        # index of the first run that starts after `key`
+        low, high = 0, len(self.runs)
+        while low < high:
+            middle = (low + high) // 2
+            run = self.runs[middle]
+            if key < (run[FIRST_BUILD], run[FIRST_TEST]):
+                high = middle
+            else:
+                low = middle + 1
+        return low
+
+    def add(self, build, test_id, result):
+        """
+        Adds a result to the timeline. Returns False if that cannot be done
+        without knowing all of the results, i.e. when the result falls in
+        the middle of a run of different results; the timeline must then be
+        rebuilt from scratch.
+        """
+        key = (build, test_id)
+        index = self.__find__(key)
+
+        if index > 0:
+            run = self.runs[index - 1]
+            if key < (run[LAST_BUILD], run[LAST_TEST]):
+                if run[RESULT] != result:
+                    return False
+                run[COUNT] += 1
+                if build == run[LAST_BUILD]:
+                    run[LAST_BUILD_COUNT] += 1
+                return True
+
+            if run[RESULT] == result:
+                run[COUNT] += 1
+                if build == run[LAST_BUILD]:
+                    run[LAST_BUILD_COUNT] += 1
+                else:
+                    run[LAST_BUILD_COUNT] = 1
+                run[LAST_BUILD], run[LAST_TEST] = key
+                return True
+
+        if index < len(self.runs) and self.runs[index][RESULT] == result:
+            run = self.runs[index]
+            run[COUNT] += 1
+            if build == run[LAST_BUILD]:
+                run[LAST_BUILD_COUNT] += 1
+            run[FIRST_BUILD], run[FIRST_TEST] = key
+            return True
+
+        self.runs.insert(index, [result, 1, build, test_id, build, test_id, 1])
+        return True
+
+    def history(self, build, test_id):
+        """
+        Returns (since_test_id, count, last_different_test_id) for the given
+        test, considering only the results from previous builds: `count`
+        results equal to the one of the test immediately precede it, the
+        oldest of which is `since_test_id`, and are preceded by
+        `last_different_test_id`.
+
+        Returns None when that cannot be told from the runs alone, i.e. when
+        the test is not in the timeline or is not in the last build of its
+        run.
+        """
+        key = (build, test_id)
+        index = self.__find__(key) - 1
+        if index < 0:
+            return None
+
+        run = self.runs[index]
+        if key > (run[LAST_BUILD], run[LAST_TEST]) or run[LAST_BUILD] != build:
+            return None
+
+        count = run[COUNT] - run[LAST_BUILD_COUNT]
+        since = run[FIRST_TEST] if count > 0 else None
+
+        last_different = None
+        if index > 0:
+            previous = self.runs[index - 1]
+            if previous[LAST_BUILD] == build:
+                return None
+            last_different = previous[LAST_TEST]
+
+        return (since, count, last_different)
@@ -1,9 +1,12 @@
+import itertools
 import random
 import string
 import yaml
 import jinja2
 import hashlib
 import base64
+import struct
+import threading
 
 
 from cryptography.fernet import Fernet
@@ -13,6 +16,7 @@ from django.template.defaultfilters import safe, escape
 from django.core.exceptions import ValidationError
 from django.core.files.base import ContentFile
 from django.conf import settings
+from django.db import transaction
 from django.utils.encoding import force_str as force_text
 
 
@@ -126,6 +130,18 @@ def split_dict(_dict, chunk_size=1):
     return chunks
 
 
+def pack_measurements(values):
+    """
+    Packs a list of floats as little-endian doubles, the way
+    Metric.packed_measurements stores them.
+    """
+    return struct.pack('<%dd' % len(values), *values)
+
+
+def unpack_measurements(data):
+    return list(struct.unpack('<%dd' % (len(data) // 8), data))
+
+
 def split_list(_list, chunk_size=1):
     chunks = []
     while _list:
@@ -134,6 +150,50 @@ def split_list(_list, chunk_size=1):
     return chunks
 
 
+def split_iterable(iterable, chunk_size=1):
+    """
+    Lazy version of split_list: consumes `iterable` as chunks are
+    requested, so that only one chunk is held in memory at a time.
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class OnCommitBatch(object):
+    """
+    Gathers items while a transaction goes on, and hands all of them over to
+    `flush` at once after it commits, so that work triggered by each object
+    saved in the transaction (e.g. from a post_save signal) is done only
+    once. Outside of a transaction, items are flushed right away.
+
+    Every item registers its own on_commit callback, but the first one to
+    run flushes everything and the others find nothing left to do. Items
+    left behind by a transaction that was rolled back are flushed along with
+    the ones of the next transaction.
+    """
+
+    def __init__(self, flush):
+        self.flush = flush
+        self.local = threading.local()
+
+    def add(self, item):
+        items = getattr(self.local, 'items', None)
+        if items is None:
+            items = self.local.items = set()
+        items.add(item)
+        transaction.on_commit(self.__run__)
+
+    def __run__(self):
+        items = getattr(self.local, 'items', None)
+        if items:
+            self.local.items = set()
+            self.flush(items)
+
+
 def _log_entry(request, object, message, flag):
     from django.contrib.auth.models import AnonymousUser
     from django.contrib.contenttypes.models import ContentType
@@ -1,3 +1,4 @@
+from collections.abc import Sequence
 from functools import reduce
 
 from django.shortcuts import render, get_object_or_404
@@ -22,13 +23,23 @@ def __get_comparison_class(comparison_type):
         return TestComparison
 
 
-def __paginate(results, request):
+RESULTS_PER_PAGE = 50
+
+
+def __get_page(request):
     try:
-        page = int(request.GET.get('page', '1'))
+        return int(request.GET.get('page', '1'))
     except ValueError:
-        page = 1
-    paginator = Paginator(tuple(results.items()), 50)
-    return paginator.page(page)
+        return 1
+
+
+def __paginate(results, request):
+    # test results only look up the names of the tests in the page
+    items = results.items()
+    if not isinstance(items, Sequence):
+        items = tuple(items)
+    paginator = Paginator(items, RESULTS_PER_PAGE)
+    return paginator.page(__get_page(request))
 
 
 def __get_transitions(request):
@@ -77,10 +88,18 @@ def compare_projects(request):
             build_filters = reduce(lambda x, y: x | y, filters)
             builds = Build.objects.filter(build_filters)
             comparison_class = __get_comparison_class(comparison_type)
-            comparison = comparison_class.compare_builds(*builds)
-
-            if comparison_type == 'test' and len(transitions):
-                comparison.apply_transitions([t for t, checked in transitions.items() if checked])
+            if comparison_type == 'test':
+                # filtering by transitions, and paginating, happen in the database
+                checked_transitions = [t for t, checked in transitions.items() if checked]
+                offset = max(__get_page(request) - 1, 0) * RESULTS_PER_PAGE
+                comparison = comparison_class.compare_builds(
+                    *builds,
+                    transitions=checked_transitions,
+                    differences_only=bool(request.GET.get('differences_only')),
+                    page=(offset, RESULTS_PER_PAGE),
+                )
+            else:
+                comparison = comparison_class.compare_builds(*builds)
 
             comparison.results = __paginate(comparison.results, request)
 
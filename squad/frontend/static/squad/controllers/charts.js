@@ -669,6 +669,9 @@ function ChartsController($scope, $http, $location, $compile, ChartPanel, DATA)
             metric: $scope.getMetricIds(),
             environment: $scope.getEnvironmentIds()
         }
+        if ($scope.maxPoints) {
+            params.max_points = $scope.maxPoints
+        }
         if (params.metric.length == 0 || params.environment.length == 0) {
             callback()
             return
@@ -835,6 +838,7 @@ function ChartsController($scope, $http, $location, $compile, ChartPanel, DATA)
 
         $scope.data = DATA.data
         $scope.project = DATA.project
+        $scope.maxPoints = DATA.max_points
         $scope.calculate_max_results()
 
         $scope.redraw()
@@ -651,10 +651,18 @@ def metrics(request, group_slug, project_slug):
     environments = [{"name": e.slug} for e in env_qs]
     metrics = get_metrics_list(project)
 
+    try:
+        max_points = int(request.GET.get('max_points', settings.SQUAD_CHARTS_MAX_POINTS))
+    except ValueError:
+        max_points = settings.SQUAD_CHARTS_MAX_POINTS
+    if max_points < 3:
+        max_points = None
+
     data = get_metric_data(
         project,
         request.GET.getlist('metric'),
-        env_qs.filter(slug__in=request.GET.getlist('environment'))
+        env_qs.filter(slug__in=request.GET.getlist('environment')),
+        max_points=max_points,
     )
 
     thresholds = []
@@ -667,6 +675,7 @@ def metrics(request, group_slug, project_slug):
         "metrics": metrics,
         "thresholds": thresholds,
         "data": data,
+        "max_points": max_points,
     }
     return render(request, 'squad/metrics.jinja2', context)
 
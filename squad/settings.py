@@ -354,7 +354,7 @@ CELERY_BEAT_SCHEDULE_FILENAME = os.path.join(DATA_DIR, 'celerybeat-schedule')
 CELERY_BEAT_SCHEDULE = {
     'poll-every-hour': {
         'task': 'squad.ci.tasks.poll',
-        'schedule': crontab(hour='*/1', minute=17),
+        'schedule': crontab(minute='*/%d' % int(os.getenv('SQUAD_CI_POLL_SCHEDULE', 5))),
     },
     'cleanup': {
         'task': 'squad.core.tasks.cleanup_old_builds',
@@ -375,6 +375,7 @@ CELERY_TASK_ROUTES = {
     'squad.core.tasks.remove_delayed_reports': {'queue': 'core_quick'},
     'squad.core.tasks.cleanup_build': {'queue': 'core_quick'},
     'squad.core.tasks.update_build_patch_url': {'queue': 'core_quick'},
+    'squad.core.tasks.update_project_status': {'queue': 'core_postprocess'},
     'squad.core.tasks.notification.*': {'queue': 'core_notification'},
     'squad.ci.tasks.poll': {'queue': 'ci_poll'},
     'squad.ci.tasks.fetch': {'queue': 'ci_fetch'},
@@ -438,6 +439,15 @@ if SENTRY_DSN:
     except ImportError:
         pass
 
+# Number of tests and metrics inserted at once when processing test runs
+SQUAD_TESTS_BATCH_SIZE = int(os.getenv('SQUAD_TESTS_BATCH_SIZE', 1000))
+SQUAD_METRICS_BATCH_SIZE = int(os.getenv('SQUAD_METRICS_BATCH_SIZE', 1000))
+SQUAD_PROJECT_STATUS_UPDATE_DELAY = int(os.getenv('SQUAD_PROJECT_STATUS_UPDATE_DELAY', 30))
+SQUAD_COMPARISON_CACHE_TIMEOUT = int(os.getenv('SQUAD_COMPARISON_CACHE_TIMEOUT', 86400))
+SQUAD_CHARTS_MAX_POINTS = int(os.getenv('SQUAD_CHARTS_MAX_POINTS', 0))
+SQUAD_CI_POLL_RUNNING_INTERVAL = int(os.getenv('SQUAD_CI_POLL_RUNNING_INTERVAL', 5))
+SQUAD_CI_POLL_MAX_BACKOFF = int(os.getenv('SQUAD_CI_POLL_MAX_BACKOFF', 8))
+
 # Django's default is 2.5MB, which is a bit low
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10485760  # 10MB
 
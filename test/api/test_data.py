@@ -70,10 +70,51 @@ class ApiDataTest(TestCase):
         })
 
         resp = self.client.get('/api/data/mygroup/myproject?metric=foo&environment=env1&format=csv')
-        data = resp.content.decode('utf-8').split("\n")
+        data = b''.join(resp.streaming_content).decode('utf-8').split("\n")
         self.assertIn('"foo","env1","1537142400","1.0","2018-09-17",""', data[0])
         self.assertIn('"foo","env1","1537228800","2.0","2018-09-18",""', data[1])
 
+    def test_metrics_csv_all_series(self):
+        self.receive("2018-09-17", metrics={"foo": {"value": 1, "unit": ""}}, tests={"t": "pass"})
+        self.receive("2018-09-18", metrics={"foo": {"value": 2, "unit": ""}}, tests={"t": "fail"})
+
+        resp = self.client.get('/api/data/mygroup/myproject?metric=:tests:&metric=foo&metric=missing&environment=env1&format=csv')
+        self.assertEqual('test/csv; charset=utf-8', resp['Content-Type'])
+        data = b''.join(resp.streaming_content).decode('utf-8').split("\n")
+        self.assertEqual(5, len(data))
+        self.assertEqual('":tests:","env1","1537142400","100","2018-09-17",""', data[0])
+        self.assertEqual('":tests:","env1","1537228800","0","2018-09-18",""', data[1])
+        self.assertTrue(data[2].startswith('"foo","env1","1537142400","1.0","2018-09-17",""'))
+        self.assertTrue(data[3].startswith('"foo","env1","1537228800","2.0","2018-09-18",""'))
+        self.assertEqual('', data[4])
+
+    def test_metrics_ndjson(self):
+        self.receive("2018-09-17", metrics={"foo": {"value": [1, 3], "unit": ""}})
+        self.receive("2018-09-18", metrics={"foo": {"value": 2, "unit": ""}})
+
+        resp = self.client.get('/api/data/mygroup/myproject?metric=foo&environment=env1&format=ndjson')
+        self.assertEqual('application/x-ndjson; charset=utf-8', resp['Content-Type'])
+        lines = b''.join(resp.streaming_content).decode('utf-8').splitlines()
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual(2, len(rows))
+        self.assertEqual(['foo', 'env1', 1537142400, 2.0, '2018-09-17', ''], rows[0][0:6])
+        self.assertEqual([1.0, 3.0], rows[0][8:10])
+        self.assertEqual(['foo', 'env1', 1537228800, 2.0, '2018-09-18', ''], rows[1][0:6])
+
+    def test_metrics_ndjson_max_points(self):
+        for day in range(1, 11):
+            self.receive("2018-09-%02d" % day, metrics={"foo": {"value": day, "unit": ""}})
+
+        resp = self.client.get('/api/data/mygroup/myproject?metric=foo&environment=env1&format=ndjson&max_points=4')
+        rows = [json.loads(line) for line in b''.join(resp.streaming_content).decode('utf-8').splitlines()]
+        self.assertEqual(4, len(rows))
+        self.assertEqual(1.0, rows[0][3])
+        self.assertEqual(10.0, rows[-1][3])
+
+    def test_invalid_format(self):
+        resp = self.client.get('/api/data/mygroup/myproject?metric=foo&environment=env1&format=xml')
+        self.assertEqual(400, resp.status_code)
+
     def test_tests(self):
         self.receive("2017-01-01", tests={
             "foo": "pass",
@@ -154,6 +195,49 @@ class ApiDataTest(TestCase):
 
         self.assertEqual('application/json; charset=utf-8', resp.http['Content-Type'])
 
+    def test_metrics_in_multiple_environments(self):
+        for env in ['env1', 'env2']:
+            receive = ReceiveTestRun(self.project)
+            receive(
+                version='2018-09-01',
+                environment_slug=env,
+                metadata_file=json.dumps({"datetime": "2018-09-01T00:00:00+00:00", "job_id": env}),
+                metrics_file=json.dumps({
+                    "foo": {"value": [1, 3], "unit": ""},
+                    "bar/baz": {"value": 2, "unit": ""},
+                }),
+            )
+
+        url = '/api/data/mygroup/myproject?metric=foo&metric=bar/baz&metric=missing&environment=env1&environment=env2'
+        with self.assertNumQueries(6):
+            resp = self.client.get_json(url)
+
+        for env in ['env1', 'env2']:
+            foo = resp.data['foo'][env]
+            self.assertEqual(1, len(foo))
+            self.assertEqual([1535760000, 2.0, '2018-09-01', ''], foo[0][0:4])
+            self.assertEqual([1.0, 3.0], foo[0][6:8])
+            self.assertEqual([[1535760000, 2.0]], [p[0:2] for p in resp.data['bar/baz'][env]])
+            self.assertEqual([], resp.data['missing'][env])
+
+    def test_max_points(self):
+        for day in range(1, 11):
+            self.receive("2018-09-%02d" % day, metrics={"foo": {"value": day % 3, "unit": ""}})
+
+        resp = self.get_json('/api/data/mygroup/myproject?metric=foo&metric=:tests:&environment=env1&max_points=4')
+        foo = resp.data['foo']['env1']
+        self.assertEqual(4, len(foo))
+        self.assertEqual([1535760000, 1.0], foo[0][0:2])
+        self.assertEqual([1536537600, 1.0], foo[-1][0:2])
+
+        resp = self.get_json('/api/data/mygroup/myproject?metric=foo&environment=env1')
+        self.assertEqual(10, len(resp.data['foo']['env1']))
+
+    def test_invalid_max_points(self):
+        for max_points in ['2', 'foo']:
+            resp = self.client.get('/api/data/mygroup/myproject?metric=foo&environment=env1&max_points=' + max_points)
+            self.assertEqual(400, resp.status_code)
+
     def test_dynamic_summary(self):
         self.receive("2019-06-04", metrics={
             "foo": {"value": 2, "unit": ""},
@@ -174,6 +258,29 @@ class ApiDataTest(TestCase):
         first = resp.data[':dynamic_summary:']['env1'][1][1]
         self.assertAlmostEqual(first, 3)
 
+    def test_dynamic_summary_measurements_and_outliers(self):
+        self.receive("2019-06-04", metrics={
+            "foo": {"value": [1, 4], "unit": ""},
+            "bar/baz": {"value": [8], "unit": ""},
+        })  # geomean = 2 + outlier
+        self.receive("2019-06-05", metrics={
+            "foo": {"value": [3], "unit": ""},
+        })
+        models.Metric.objects.filter(metadata__name='baz', build__version='2019-06-04').update(is_outlier=True)
+        self.receive("2019-06-06", metrics={
+            "bar/baz": {"value": [2, 8], "unit": ""},
+        })  # geomean = 4
+
+        with self.assertNumQueries(9):
+            resp = self.client.get_json(
+                '/api/data/mygroup/myproject?environment=env1&metric=foo&metric=bar/baz&metric=:dynamic_summary:')
+
+        summary = resp.data[':dynamic_summary:']['env1']
+        self.assertEqual(['2019-06-04', '2019-06-05', '2019-06-06'], [e[2] for e in summary])
+        self.assertAlmostEqual(2, summary[0][1])
+        self.assertAlmostEqual(3, summary[1][1])
+        self.assertAlmostEqual(4, summary[2][1])
+
     def test_dynamic_summary_no_selected_metrics(self):
         self.receive("2019-06-04", metrics={
             "foo": {"value": 2, "unit": "kg"},
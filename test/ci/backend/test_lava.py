@@ -10,7 +10,7 @@ import xmlrpc
 
 
 from squad.ci.models import Backend, TestJob
-from squad.ci.backend.lava import Backend as LAVABackend
+from squad.ci.backend.lava import Backend as LAVABackend, LogLines
 from squad.ci.exceptions import SubmissionIssue, TemporarySubmissionIssue, TemporaryFetchIssue
 from squad.core.models import Group, Project
 
@@ -530,7 +530,7 @@ class LavaTest(TestCase):
         self.assertEqual('bar', testjob.name)
         __submit__.assert_called_with(test_definition)
 
-    @patch("squad.ci.backend.lava.Backend.__download_full_log__", return_value=LOG_DATA)
+    @patch("squad.ci.backend.lava.Backend.__download_full_log__", side_effect=lambda job_id: BytesIO(LOG_DATA))
     @patch("squad.ci.backend.lava.Backend.__get_job_details__", return_value=JOB_DETAILS)
     @patch("squad.ci.backend.lava.Backend.__get_testjob_results_yaml__", return_value=TEST_RESULTS)
     def test_fetch_basics(self, get_results, get_details, test_log):
@@ -548,7 +548,7 @@ class LavaTest(TestCase):
         self.assertIsNotNone(testjob.started_at)
         self.assertIsNotNone(testjob.ended_at)
 
-    @patch("squad.ci.backend.lava.Backend.__download_full_log__", return_value=LOG_DATA)
+    @patch("squad.ci.backend.lava.Backend.__download_full_log__", side_effect=lambda job_id: BytesIO(LOG_DATA))
     @patch("squad.ci.backend.lava.Backend.__get_job_details__", return_value=JOB_DETAILS_INVALID_DATES)
     @patch("squad.ci.backend.lava.Backend.__get_testjob_results_yaml__", return_value=TEST_RESULTS)
     def test_fetch_invalid_dates(self, get_results, get_details, test_log):
@@ -566,7 +566,7 @@ class LavaTest(TestCase):
         self.assertIsNone(testjob.started_at)
         self.assertIsNone(testjob.ended_at)
 
-    @patch("squad.ci.backend.lava.Backend.__download_full_log__", return_value=LOG_DATA)
+    @patch("squad.ci.backend.lava.Backend.__download_full_log__", side_effect=lambda job_id: BytesIO(LOG_DATA))
     @patch("squad.ci.backend.lava.Backend.__get_job_details__", return_value=JOB_DETAILS_START_DATE)
     @patch("squad.ci.backend.lava.Backend.__get_testjob_results_yaml__", return_value=TEST_RESULTS)
     def test_fetch_missing_dates(self, get_results, get_details, test_log):
@@ -609,7 +609,22 @@ class LavaTest(TestCase):
         with self.assertRaises(TemporaryFetchIssue):
             lava.fetch(testjob)
 
-    @patch("squad.ci.backend.lava.Backend.__download_full_log__", return_value=LOG_DATA)
+    @patch("squad.ci.backend.lava.Backend.__get_job_details__", side_effect=requests.exceptions.Timeout)
+    def test_fetch_closes_session(self, get_details):
+        lava = self.backend.get_implementation()
+        testjob = TestJob(
+            job_id='9999',
+            target=self.project,
+            backend=self.backend)
+
+        session = lava.session
+        with patch.object(session, 'close') as close:
+            with self.assertRaises(TemporaryFetchIssue):
+                lava.fetch(testjob)
+        close.assert_called_once_with()
+        self.assertIsNot(session, lava.session)
+
+    @patch("squad.ci.backend.lava.Backend.__download_full_log__", side_effect=lambda job_id: BytesIO(LOG_DATA))
     @patch("squad.ci.backend.lava.Backend.__get_job_details__", return_value=JOB_DETAILS)
     @patch("squad.ci.backend.lava.Backend.__get_testjob_results_yaml__", return_value=TEST_RESULTS)
     def test_parse_results_metadata(self, get_results, get_details, test_log):
@@ -622,7 +637,7 @@ class LavaTest(TestCase):
 
         self.assertEqual(JOB_METADATA, metadata)
 
-    @patch("squad.ci.backend.lava.Backend.__download_full_log__", return_value=LOG_DATA)
+    @patch("squad.ci.backend.lava.Backend.__download_full_log__", side_effect=lambda job_id: BytesIO(LOG_DATA))
     @patch("squad.ci.backend.lava.Backend.__get_job_details__", return_value=JOB_DETAILS_NO_METADATA)
     @patch("squad.ci.backend.lava.Backend.__get_testjob_results_yaml__", return_value=TEST_RESULTS)
     def test_parse_results_empty_metadata(self, get_results, get_details, test_log):
@@ -635,7 +650,7 @@ class LavaTest(TestCase):
 
         self.assertEqual({}, metadata)
 
-    @patch("squad.ci.backend.lava.Backend.__download_full_log__", return_value=LOG_DATA)
+    @patch("squad.ci.backend.lava.Backend.__download_full_log__", side_effect=lambda job_id: BytesIO(LOG_DATA))
     @patch("squad.ci.backend.lava.Backend.__get_job_details__", return_value=JOB_DETAILS_WITH_SUITE_VERSIONS)
     @patch("squad.ci.backend.lava.Backend.__get_testjob_results_yaml__", return_value=TEST_RESULTS_WITH_SUITE_VERSIONS)
     def test_parse_results_metadata_with_suite_versions(self, get_results, get_details, test_log):
@@ -648,7 +663,7 @@ class LavaTest(TestCase):
 
         self.assertEqual({"suite1": "1.0"}, metadata['suite_versions'])
 
-    @patch("squad.ci.backend.lava.Backend.__download_full_log__", return_value=LOG_DATA)
+    @patch("squad.ci.backend.lava.Backend.__download_full_log__", side_effect=lambda job_id: BytesIO(LOG_DATA))
     @patch("squad.ci.backend.lava.Backend.__get_job_details__", return_value=JOB_DETAILS)
     @patch("squad.ci.backend.lava.Backend.__get_testjob_results_yaml__", return_value=TEST_RESULTS)
     def test_parse_results_ignore_lava_suite_backend_settings(self, get_results, get_details, test_log):
@@ -675,7 +690,7 @@ class LavaTest(TestCase):
         self.assertEqual(0.0, metrics.filter(metadata__name='power-off').get().result)
         self.assertEqual(10.0, metrics.filter(metadata__name='case_foo').get().result)
 
-    @patch("squad.ci.backend.lava.Backend.__download_full_log__", return_value=LOG_DATA)
+    @patch("squad.ci.backend.lava.Backend.__download_full_log__", side_effect=lambda job_id: BytesIO(LOG_DATA))
     @patch("squad.ci.backend.lava.Backend.__get_job_details__", return_value=JOB_DETAILS)
     @patch("squad.ci.backend.lava.Backend.__get_testjob_results_yaml__", return_value=TEST_RESULTS)
     def test_parse_results_ignore_lava_suite_project_settings(self, get_results, get_details, test_log):
@@ -701,7 +716,7 @@ class LavaTest(TestCase):
         self.assertEqual(0.0, metrics.filter(metadata__name='power-off').get().result)
         self.assertEqual(10.0, metrics.filter(metadata__name='case_foo').get().result)
 
-    @patch("squad.ci.backend.lava.Backend.__download_full_log__", return_value=LOG_DATA)
+    @patch("squad.ci.backend.lava.Backend.__download_full_log__", side_effect=lambda job_id: BytesIO(LOG_DATA))
     @patch("squad.ci.backend.lava.Backend.__get_job_details__", return_value=JOB_DETAILS)
     @patch("squad.ci.backend.lava.Backend.__get_testjob_results_yaml__", return_value=TEST_RESULTS)
     def test_parse_results_ignore_lava_suite_empty_project_settings(self, get_results, get_details, test_log):
@@ -728,7 +743,7 @@ class LavaTest(TestCase):
         self.assertEqual(29.72, metrics.filter(metadata__name='time-device_foo').get().result)
         self.assertEqual(10.0, metrics.filter(metadata__name='case_foo').get().result)
 
-    @patch("squad.ci.backend.lava.Backend.__download_full_log__", return_value=LOG_DATA)
+    @patch("squad.ci.backend.lava.Backend.__download_full_log__", side_effect=lambda job_id: BytesIO(LOG_DATA))
     @patch("squad.ci.backend.lava.Backend.__get_job_details__", return_value=JOB_DETAILS)
     @patch("squad.ci.backend.lava.Backend.__get_testjob_results_yaml__", return_value=TEST_RESULTS)
     def test_parse_results_ignore_lava_suite_project_settings_overwrites_backend(self, get_results, get_details, test_log):
@@ -760,7 +775,7 @@ class LavaTest(TestCase):
         self.assertEqual(0, metrics.filter(metadata__name='time-device_foo').count())
         self.assertEqual(10.0, metrics.filter(metadata__name='case_foo').get().result)
 
-    @patch("squad.ci.backend.lava.Backend.__download_full_log__", return_value=LOG_DATA)
+    @patch("squad.ci.backend.lava.Backend.__download_full_log__", side_effect=lambda job_id: BytesIO(LOG_DATA))
     @patch("squad.ci.backend.lava.Backend.__get_job_details__", return_value=JOB_DETAILS)
     @patch("squad.ci.backend.lava.Backend.__get_testjob_results_yaml__", return_value=TEST_RESULTS)
     def test_parse_results_ignore_lava_boot(self, get_results, get_details, download_test_log):
@@ -785,7 +800,7 @@ class LavaTest(TestCase):
         self.assertEqual(1, metrics.filter(metadata__name='case_foo').count())
         self.assertEqual(10.0, metrics.filter(metadata__name='case_foo').get().result)
 
-    @patch("squad.ci.backend.lava.Backend.__download_full_log__", return_value=LOG_DATA)
+    @patch("squad.ci.backend.lava.Backend.__download_full_log__", side_effect=lambda job_id: BytesIO(LOG_DATA))
     @patch("squad.ci.backend.lava.Backend.__get_job_details__", return_value=JOB_DETAILS_INCOMPLETE)
     @patch("squad.ci.backend.lava.Backend.__get_testjob_results_yaml__", return_value=TEST_RESULTS_WITH_JOB_INFRA_ERROR)
     def test_parse_results_ignore_infra_errors(self, get_results, get_details, download_test_log):
@@ -811,7 +826,7 @@ class LavaTest(TestCase):
         self.assertEqual(1, metrics.filter(metadata__name='case_foo').count())
         self.assertEqual(10.0, metrics.filter(metadata__name='case_foo').get().result)
 
-    @patch("squad.ci.backend.lava.Backend.__download_full_log__", return_value=LOG_DATA)
+    @patch("squad.ci.backend.lava.Backend.__download_full_log__", side_effect=lambda job_id: BytesIO(LOG_DATA))
     @patch("squad.ci.backend.lava.Backend.__get_job_details__", return_value=JOB_DETAILS_INCOMPLETE)
     @patch("squad.ci.backend.lava.Backend.__get_testjob_results_yaml__", return_value=TEST_RESULTS_WITH_JOB_INFRA_ERROR)
     def test_parse_results_dont_ignore_infra_errors(self, get_results, get_details, download_test_log):
@@ -832,7 +847,7 @@ class LavaTest(TestCase):
         self.assertEqual(0, results.count())
         self.assertEqual(0, metrics.count())
 
-    @patch("squad.ci.backend.lava.Backend.__download_full_log__", return_value=LOG_DATA)
+    @patch("squad.ci.backend.lava.Backend.__download_full_log__", side_effect=lambda job_id: BytesIO(LOG_DATA))
     @patch("squad.ci.backend.lava.Backend.__get_job_details__", return_value=JOB_DETAILS)
     @patch("squad.ci.backend.lava.Backend.__get_testjob_results_yaml__", return_value=TEST_RESULTS)
     def test_parse_results_handle_lava_suite_and_ignore_lava_boot(self, get_results, get_details, download_test_log):
@@ -859,7 +874,7 @@ class LavaTest(TestCase):
         self.assertEqual(10.0, metrics.filter(metadata__name='case_foo').get().result)
         self.assertEqual(0, metrics.filter(metadata__name='time-device_foo').count())
 
-    @patch("squad.ci.backend.lava.Backend.__download_full_log__", return_value=LOG_DATA)
+    @patch("squad.ci.backend.lava.Backend.__download_full_log__", side_effect=lambda job_id: BytesIO(LOG_DATA))
     @patch("squad.ci.backend.lava.Backend.__get_job_details__", return_value=JOB_DETAILS)
     @patch("squad.ci.backend.lava.Backend.__get_testjob_results_yaml__", return_value=TEST_RESULTS)
     def test_parse_results(self, get_results, get_details, download_test_log):
@@ -876,7 +891,7 @@ class LavaTest(TestCase):
         self.assertEqual(10, metrics['DefinitionFoo/case_foo']["value"])
         self.assertEqual('job_foo', testjob.name)
 
-    @patch("squad.ci.backend.lava.Backend.__download_full_log__", return_value=LOG_DATA)
+    @patch("squad.ci.backend.lava.Backend.__download_full_log__", side_effect=lambda job_id: BytesIO(LOG_DATA))
     @patch("squad.ci.backend.lava.Backend.__get_job_details__", return_value=JOB_DETAILS)
     @patch("squad.ci.backend.lava.Backend.__get_testjob_results_yaml__", return_value=TEST_RESULTS_REST)
     def test_parse_results_rest(self, get_results, get_details, download_test_log):
@@ -895,7 +910,7 @@ class LavaTest(TestCase):
         self.assertEqual(10, metrics['DefinitionFoo/case_foo']["value"])
         self.assertEqual('job_foo', testjob.name)
 
-    @patch("squad.ci.backend.lava.Backend.__download_full_log__", return_value=LOG_DATA)
+    @patch("squad.ci.backend.lava.Backend.__download_full_log__", side_effect=lambda job_id: BytesIO(LOG_DATA))
     @patch("squad.ci.backend.lava.Backend.__get_job_details__", return_value=JOB_DETAILS)
     @patch("squad.ci.backend.lava.Backend.__get_testjob_results_yaml__", return_value=TEST_RESULTS)
     def test_parse_results_clone_measurements(self, get_results, get_details, test_log):
@@ -918,7 +933,7 @@ class LavaTest(TestCase):
         self.assertEqual(10, metrics['DefinitionFoo/case_foo']["value"])
         self.assertEqual('job_foo', testjob.name)
 
-    @patch("squad.ci.backend.lava.Backend.__download_full_log__", return_value=LOG_DATA)
+    @patch("squad.ci.backend.lava.Backend.__download_full_log__", side_effect=lambda job_id: BytesIO(LOG_DATA))
     @patch("squad.ci.backend.lava.Backend.__get_job_details__", return_value=JOB_DETAILS)
     @patch("squad.ci.backend.lava.Backend.__get_testjob_results_yaml__", return_value=TEST_RESULTS_INFRA_FAILURE)
     def test_completed(self, get_results, get_details, get_logs):
@@ -930,7 +945,7 @@ class LavaTest(TestCase):
         status, completed, metadata, results, metrics, logs, attachments = lava.fetch(testjob)
         self.assertFalse(completed)
 
-    @patch("squad.ci.backend.lava.Backend.__download_full_log__", return_value=LOG_DATA)
+    @patch("squad.ci.backend.lava.Backend.__download_full_log__", side_effect=lambda job_id: BytesIO(LOG_DATA))
     @patch("squad.ci.backend.lava.Backend.__get_job_details__", return_value=JOB_DETAILS)
     @patch("squad.ci.backend.lava.Backend.__get_testjob_results_yaml__", return_value=TEST_RESULTS_INFRA_FAILURE_STR)
     def test_incomplete_string_results_metadata(self, get_results, get_details, get_logs):
@@ -944,7 +959,7 @@ class LavaTest(TestCase):
         self.assertEqual(TEST_RESULTS_INFRA_FAILURE_STR[0]['metadata'], testjob.failure)
 
     @patch("squad.ci.backend.lava.Backend.__resubmit__")
-    @patch("squad.ci.backend.lava.Backend.__download_full_log__", return_value=LOG_DATA)
+    @patch("squad.ci.backend.lava.Backend.__download_full_log__", side_effect=lambda job_id: BytesIO(LOG_DATA))
     @patch("squad.ci.backend.lava.Backend.__get_job_details__", return_value=JOB_DETAILS)
     @patch("squad.ci.backend.lava.Backend.__get_testjob_results_yaml__", return_value=TEST_RESULTS_INFRA_FAILURE_STR_NO_MESSAGE)
     def test_incomplete_string_results_metadata_null_error_msg(self, get_results, get_details, get_logs, resubmit):
@@ -959,7 +974,7 @@ class LavaTest(TestCase):
         self.assertFalse(completed)
         resubmit.assert_not_called()
 
-    @patch("squad.ci.backend.lava.Backend.__download_full_log__", return_value=LOG_DATA)
+    @patch("squad.ci.backend.lava.Backend.__download_full_log__", side_effect=lambda job_id: BytesIO(LOG_DATA))
     @patch("squad.ci.backend.lava.Backend.__get_job_details__", return_value=JOB_DETAILS_CANCELED)
     @patch("squad.ci.backend.lava.Backend.__get_testjob_results_yaml__", return_value=TEST_RESULTS)
     def test_canceled(self, get_results, get_details, get_logs):
@@ -971,7 +986,7 @@ class LavaTest(TestCase):
         status, completed, metadata, results, metrics, logs, attachments = lava.fetch(testjob)
         self.assertFalse(completed)
 
-    @patch("squad.ci.backend.lava.Backend.__download_full_log__", return_value=LOG_DATA)
+    @patch("squad.ci.backend.lava.Backend.__download_full_log__", side_effect=lambda job_id: BytesIO(LOG_DATA))
     @patch("squad.ci.backend.lava.Backend.__get_job_details__", return_value=JOB_DETAILS)
     @patch("squad.ci.backend.lava.Backend.__get_testjob_results_yaml__", return_value=TEST_RESULTS_INFRA_FAILURE_RESUBMIT)
     def test_automated_resubmit_email(self, get_results, get_details, get_logs):
@@ -993,7 +1008,7 @@ class LavaTest(TestCase):
         # there should be an admin email sent after resubmission
         self.assertEqual(1, len(mail.outbox))
 
-    @patch("squad.ci.backend.lava.Backend.__download_full_log__", return_value=LOG_DATA)
+    @patch("squad.ci.backend.lava.Backend.__download_full_log__", side_effect=lambda job_id: BytesIO(LOG_DATA))
     @patch("squad.ci.backend.lava.Backend.__get_job_details__", return_value=JOB_DETAILS)
     @patch("squad.ci.backend.lava.Backend.__get_testjob_results_yaml__", return_value=TEST_RESULTS_INFRA_FAILURE_RESUBMIT)
     def test_automated_dont_resubmit_email(self, get_results, get_details, get_logs):
@@ -1017,7 +1032,7 @@ class LavaTest(TestCase):
         # there should not be an admin email sent after resubmission
         self.assertEqual(0, len(mail.outbox))
 
-    @patch("squad.ci.backend.lava.Backend.__download_full_log__", return_value=LOG_DATA)
+    @patch("squad.ci.backend.lava.Backend.__download_full_log__", side_effect=lambda job_id: BytesIO(LOG_DATA))
     @patch("squad.ci.backend.lava.Backend.__get_job_details__", return_value=JOB_DETAILS)
     @patch("squad.ci.backend.lava.Backend.__get_testjob_results_yaml__", return_value=TEST_RESULTS_INFRA_FAILURE_RESUBMIT)
     @patch("squad.ci.backend.lava.Backend.__resubmit__", return_value="1235")
@@ -1033,7 +1048,7 @@ class LavaTest(TestCase):
         self.assertEqual(1, new_test_job.resubmitted_count)
         self.assertFalse(testjob.can_resubmit)
 
-    @patch("squad.ci.backend.lava.Backend.__download_full_log__", return_value=LOG_DATA)
+    @patch("squad.ci.backend.lava.Backend.__download_full_log__", side_effect=lambda job_id: BytesIO(LOG_DATA))
     @patch("squad.ci.backend.lava.Backend.__get_job_details__", return_value=JOB_DETAILS)
     @patch("squad.ci.backend.lava.Backend.__get_testjob_results_yaml__", return_value=TEST_RESULTS_INFRA_FAILURE_CUSTOM)
     @patch("squad.ci.backend.lava.Backend.__resubmit__", return_value="1235")
@@ -1050,7 +1065,7 @@ class LavaTest(TestCase):
         self.assertEqual(1, new_test_job.resubmitted_count)
         self.assertFalse(testjob.can_resubmit)
 
-    @patch("squad.ci.backend.lava.Backend.__download_full_log__", return_value=LOG_DATA)
+    @patch("squad.ci.backend.lava.Backend.__download_full_log__", side_effect=lambda job_id: BytesIO(LOG_DATA))
     @patch("squad.ci.backend.lava.Backend.__get_job_details__", return_value=JOB_DETAILS)
     @patch("squad.ci.backend.lava.Backend.__get_testjob_results_yaml__", return_value=TEST_RESULTS_INFRA_FAILURE_RESUBMIT2)
     @patch("squad.ci.backend.lava.Backend.__resubmit__", return_value="1235")
@@ -1066,7 +1081,7 @@ class LavaTest(TestCase):
         self.assertEqual(1, new_test_job.resubmitted_count)
         self.assertFalse(testjob.can_resubmit)
 
-    @patch("squad.ci.backend.lava.Backend.__download_full_log__", return_value=LOG_DATA)
+    @patch("squad.ci.backend.lava.Backend.__download_full_log__", side_effect=lambda job_id: BytesIO(LOG_DATA))
     @patch("squad.ci.backend.lava.Backend.__get_job_details__", return_value=JOB_DETAILS)
     @patch("squad.ci.backend.lava.Backend.__get_testjob_results_yaml__", return_value=TEST_RESULTS_INFRA_FAILURE_RESUBMIT3)
     @patch("squad.ci.backend.lava.Backend.__resubmit__", return_value="1235")
@@ -1082,7 +1097,7 @@ class LavaTest(TestCase):
         self.assertEqual(1, new_test_job.resubmitted_count)
         self.assertFalse(testjob.can_resubmit)
 
-    @patch("squad.ci.backend.lava.Backend.__download_full_log__", return_value=LOG_DATA)
+    @patch("squad.ci.backend.lava.Backend.__download_full_log__", side_effect=lambda job_id: BytesIO(LOG_DATA))
     @patch("squad.ci.backend.lava.Backend.__get_job_details__", return_value=JOB_DETAILS)
     @patch("squad.ci.backend.lava.Backend.__get_testjob_results_yaml__", return_value=TEST_RESULTS_INFRA_FAILURE_RESUBMIT4)
     @patch("squad.ci.backend.lava.Backend.__resubmit__", return_value="1235")
@@ -1174,6 +1189,26 @@ class LavaTest(TestCase):
         fetch.apply_async.assert_called_with(args=[testjob.id])
         self.assertEqual('Complete', TestJob.objects.get(pk=testjob.id).job_status)
 
+    @patch('squad.ci.backend.lava.fetch')
+    def test_receive_event_running_schedules_poll(self, fetch):
+        lava = LAVABackend(self.backend)
+        testjob = TestJob.objects.create(
+            backend=self.backend,
+            target=self.project,
+            target_build=self.build,
+            environment='myenv',
+            submitted=True,
+            fetched=False,
+            job_id='123',
+            name="foo",
+        )
+
+        lava.receive_event('foo.com.testjob', {"job": '123', 'state': 'Running'})
+        fetch.apply_async.assert_not_called()
+        testjob.refresh_from_db()
+        self.assertEqual('Running', testjob.job_status)
+        self.assertIsNotNone(testjob.next_poll_at)
+
     def test_receive_event_no_testjob(self):
         backend = MagicMock()
         backend.url = 'https://foo.tld/RPC2'
@@ -1221,7 +1256,7 @@ class LavaTest(TestCase):
         requests_get.side_effect = requests.exceptions.ChunkedEncodingError("Connection closed")
         log = lava1.__download_full_log__(999)
         requests_get.assert_called()
-        self.assertEqual(b'', log)
+        self.assertEqual(b'', log.read())
 
     @patch('requests.get')
     def test_lava_log_download_rest(self, requests_get):
@@ -1231,7 +1266,7 @@ class LavaTest(TestCase):
         requests_get.side_effect = requests.exceptions.ChunkedEncodingError("Connection closed")
         log = lava2.__download_full_log__(999)
         requests_get.assert_called()
-        self.assertEqual(b'', log)
+        self.assertEqual(b'', log.read())
 
     def test_broken_lava_log_parsing(self):
         lava = LAVABackend(self.backend)
@@ -1251,6 +1286,66 @@ class LavaTest(TestCase):
         test_log = lava.__download_test_log__(log_data, 1, 3)
         self.assertIn("a non-decodable unicode char:", test_log)
 
+    def test_test_log_ranges(self):
+        lava = LAVABackend(self.backend)
+        log_lines = LogLines(BytesIO(b'line 1\nline 2\nline 3\nline 4'))
+        self.assertEqual(4, len(log_lines))
+        self.assertEqual("line 2\n\nline 3\n\n", lava.__download_test_log__(log_lines, 2, 3))
+        self.assertEqual("line 3\n\nline 4\n", lava.__download_test_log__(log_lines, 3, 10))
+        self.assertEqual("line 4\n", lava.__download_test_log__(log_lines, 4, None))
+        self.assertEqual("line 1\n\n", lava.__download_test_log__(log_lines, 1, 1))
+        self.assertEqual("", lava.__download_test_log__(log_lines, 5, 6))
+        self.assertEqual("", lava.__download_test_log__(log_lines, None, 6))
+        self.assertEqual("line 1\n\nline 2\n\n", lava.__download_test_log__(log_lines, "0", "2"))
+        self.assertEqual("line 1\n\nline 2\n\n", lava.__download_test_log__(log_lines, "0", None))
+
+    def test_lava_log_download_to_file(self):
+        self.backend.url = "http://example.com/api/v0.2/"
+        lava = self.backend.get_implementation()
+        with requests_mock.Mocker() as m:
+            m.get("http://example.com/api/v0.2/jobs/999/logs/", content=LOG_DATA)
+            log = lava.__download_full_log__(999)
+        self.assertEqual(LOG_DATA, log.read())
+        log.seek(0)
+        self.assertIn("target message", lava.__parse_log__(log))
+
+    def test_lava_log_download_error_closes_response(self):
+        self.backend.url = "http://example.com/api/v0.2/"
+        lava = self.backend.get_implementation()
+        with requests_mock.Mocker() as m:
+            m.get("http://example.com/api/v0.2/jobs/999/logs/", status_code=404, content=b'not found')
+            with patch('requests.Response.close') as close:
+                log = lava.__download_full_log__(999)
+        self.assertEqual(b'', log.read())
+        close.assert_called_once_with()
+
+    def test_job_statuses(self):
+        self.backend.url = "http://example.com/api/v0.2/"
+        lava = self.backend.get_implementation()
+        jobs = [
+            self.backend.test_jobs.create(target=self.project, submitted=True, job_id=job_id)
+            for job_id in ['1001', '1002', '1003', '1004.0']
+        ]
+        base = "http://example.com/api/v0.2/jobs/"
+        with requests_mock.Mocker() as m:
+            m.get(base + "?id__in=1001,1002,1003&limit=3", complete_qs=True, json={
+                "results": [{"id": 1001, "state": "Finished"}],
+                "next": base + "?id__in=1001,1002,1003&limit=3&offset=1",
+            })
+            m.get(base + "?id__in=1001,1002,1003&limit=3&offset=1", complete_qs=True, json={
+                "results": [{"id": 1002, "state": "Running"}],
+                "next": None,
+            })
+            with patch('requests.Session.close') as close:
+                statuses = lava.job_statuses(jobs)
+        self.assertEqual({jobs[0].id: 'Finished', jobs[1].id: 'Running'}, statuses)
+        close.assert_called_once_with()
+
+    def test_job_statuses_xmlrpc(self):
+        lava = self.backend.get_implementation()
+        job = self.backend.test_jobs.create(target=self.project, submitted=True, job_id='1001')
+        self.assertIsNone(lava.job_statuses([job]))
+
     @patch("squad.ci.backend.lava.Backend.__resubmit__", side_effect=HTTP_500)
     def test_resubmit_deleted_job(self, __resubmit__):
         lava = LAVABackend(None)
@@ -1295,3 +1390,35 @@ class LavaTest(TestCase):
                    status_code=405,
                    text="Method not allowed")
             self.assertRaises(TemporarySubmissionIssue, lava.resubmit, testjob)
+
+    def test_get_testjob_results_rest_pagination(self):
+        self.backend.url = "http://example.com/api/v0.2/"
+        self.backend.backend_settings = '{"CI_LAVA_FETCH_WORKERS": 2}'
+        lava = self.backend.get_implementation()
+        base = "http://example.com/api/v0.2/jobs/1237/"
+        with requests_mock.Mocker() as m:
+            m.get(base + "suites/", json={
+                "results": [{"id": 1, "name": "lava"}],
+                "next": base + "suites/?offset=1",
+            })
+            m.get(base + "suites/?offset=1", json={
+                "results": [{"id": 2, "name": "suite-a"}, {"id": 3, "name": "suite-b"}],
+                "next": None,
+            })
+            m.get(base + "suites/1/tests", json={"results": [{"name": "job"}], "next": None})
+            m.get(base + "suites/2/tests", json={
+                "results": [{"name": "test-a1"}, {"name": "test-a2"}],
+                "next": base + "suites/2/tests?offset=2",
+            })
+            m.get(base + "suites/2/tests?offset=2", json={"results": [{"name": "test-a3"}], "next": None})
+            m.get(base + "suites/3/tests", status_code=404)
+
+            results = lava.__get_testjob_results_yaml__(1237)
+
+            self.assertTrue(all(r.headers["Authorization"] == "Token mypassword" for r in m.request_history))
+
+        self.assertEqual(
+            [("lava", "job"), ("suite-a", "test-a1"), ("suite-a", "test-a2"), ("suite-a", "test-a3")],
+            [(r["suite"], r["name"]) for r in results],
+        )
+        self.assertIs(lava.session, lava.session)
@@ -10,7 +10,7 @@ from unittest.mock import MagicMock, Mock, patch
 from cryptography.hazmat.primitives.asymmetric import ec
 from cryptography.hazmat.primitives import hashes, serialization
 
-from squad.ci.backend.tuxsuite import Backend as TuxSuiteBackend
+from squad.ci.backend.tuxsuite import Backend as TuxSuiteBackend, TargetLog
 from squad.ci.exceptions import FetchIssue, TemporaryFetchIssue
 from squad.ci.models import Backend, TestJob
 from squad.core.models import Group, Project
@@ -1988,3 +1988,45 @@ class TuxSuiteTest(TestCase):
         self.assertTrue(impl.check_job_id('OEBUILD:tuxgroup@tuxproject#123'))
         self.assertEqual('Job id "PLAN:tuxgroup@tuxproject#123" does not match "^(OEBUILD|BUILD|TEST):([0-9a-z_\\-.]+@[0-9a-z_\\-.]+)#([a-zA-Z0-9]+)$"', impl.check_job_id('PLAN:tuxgroup@tuxproject#123'))
         self.assertEqual('Job id "123" does not match "^(OEBUILD|BUILD|TEST):([0-9a-z_\\-.]+@[0-9a-z_\\-.]+)#([a-zA-Z0-9]+)$"', impl.check_job_id('123'))
+
+
+class TargetLogTest(TestCase):
+
+    def setUp(self):
+        self.lines = ['first', None, 'second', '', 'café', None]
+        self.log = TargetLog()
+        for line in self.lines:
+            self.log.append(line)
+
+    def tearDown(self):
+        self.log.close()
+
+    def test_len(self):
+        self.assertEqual(len(self.lines), len(self.log))
+
+    def test_text(self):
+        self.assertEqual('first\nsecond\ncafé', self.log.text())
+
+    def test_lines_are_sliced_like_a_list(self):
+        for start, end in [(0, 6), (1, 3), (2, 5), (4, 100), (-1, 1), (3, 3)]:
+            expected = [line for line in self.lines[start:end] if line]
+            self.assertEqual(expected, self.log.lines(start, end))
+
+    def test_append_after_read(self):
+        self.log.lines(0, 2)
+        self.log.append('third')
+        self.assertEqual(['third'], self.log.lines(6, 7))
+        self.assertEqual('first\nsecond\ncafé\nthird', self.log.text())
+
+    def test_empty(self):
+        log = TargetLog()
+        self.assertEqual('', log.text())
+        self.assertEqual([], log.lines(0, 2))
+        log.close()
+
+    def test_closed_on_error(self):
+        with self.assertRaises(ValueError):
+            with TargetLog() as log:
+                log.append('first')
+                raise ValueError()
+        self.assertTrue(log.file.closed)
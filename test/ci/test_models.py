@@ -82,6 +82,101 @@ class BackendPollTest(BackendTestBase):
         jobs = list(self.backend.poll())
         self.assertEqual([], jobs)
 
+    def test_poll_only_yields_complete_jobs(self):
+        finished = self.create_test_job(submitted=True, job_id='1')
+        running = self.create_test_job(submitted=True, job_id='2')
+        unknown = self.create_test_job(submitted=True, job_id='3')
+        statuses = {finished.id: 'Complete', running.id: 'Running'}
+        with patch('squad.ci.backend.null.Backend.complete_statuses', ['Complete']), \
+                patch('squad.ci.backend.null.Backend.job_statuses', return_value=statuses) as job_statuses:
+            jobs = list(self.backend.poll())
+        job_statuses.assert_called_once()
+        self.assertEqual([finished, unknown], jobs)
+
+        running.refresh_from_db()
+        self.assertIsNotNone(running.last_fetch_attempt)
+        self.assertNotIn(running, list(self.backend.poll()))
+
+    def test_poll_probes_in_batches(self):
+        for job_id in range(5):
+            self.create_test_job(submitted=True, job_id=str(job_id))
+        with patch('squad.ci.models.POLL_BATCH_SIZE', 2), \
+                patch('squad.ci.backend.null.Backend.job_statuses', return_value=None) as job_statuses:
+            jobs = list(self.backend.poll())
+        self.assertEqual(5, len(jobs))
+        self.assertEqual([2, 2, 1], [len(call.args[0]) for call in job_statuses.call_args_list])
+
+    def test_poll_fetches_all_jobs_if_probing_fails(self):
+        test_job = self.create_test_job(submitted=True)
+        with patch('squad.ci.backend.null.Backend.job_statuses', side_effect=Exception('boom')):
+            jobs = list(self.backend.poll())
+        self.assertEqual([test_job], jobs)
+
+
+class BackendSchedulePollTest(BackendTestBase):
+
+    def test_poll_due_job(self):
+        test_job = self.create_test_job(submitted=True, last_fetch_attempt=NOW, next_poll_at=timezone.now() - relativedelta(minutes=1))
+        self.assertEqual([test_job], list(self.backend.poll()))
+
+    def test_poll_wont_fetch_before_next_poll(self):
+        past = timezone.now() - relativedelta(minutes=self.backend.poll_interval + 1)
+        self.create_test_job(submitted=True, last_fetch_attempt=past, next_poll_at=timezone.now() + relativedelta(minutes=10))
+        self.assertEqual([], list(self.backend.poll()))
+
+    @patch('django.utils.timezone.now', return_value=NOW)
+    def test_schedule_new_job(self, __now__):
+        test_job = self.create_test_job(submitted=True, submitted_at=NOW)
+        self.backend.schedule_poll(test_job)
+        self.assertEqual(NOW + relativedelta(minutes=self.backend.poll_interval), test_job.next_poll_at)
+
+    @patch('django.utils.timezone.now', return_value=NOW)
+    def test_schedule_backs_off_queued_job(self, __now__):
+        test_job = self.create_test_job(submitted=True, submitted_at=NOW - relativedelta(hours=5))
+        self.backend.schedule_poll(test_job, 'Submitted')
+        self.assertEqual(NOW + relativedelta(minutes=150), test_job.next_poll_at)
+
+    @patch('django.utils.timezone.now', return_value=NOW)
+    def test_schedule_backoff_is_bounded(self, __now__):
+        test_job = self.create_test_job(submitted=True, submitted_at=NOW - relativedelta(days=10))
+        self.backend.schedule_poll(test_job, 'Submitted')
+        self.assertEqual(NOW + relativedelta(minutes=self.backend.poll_interval * 8), test_job.next_poll_at)
+
+    @patch('django.utils.timezone.now', return_value=NOW)
+    def test_schedule_running_job(self, __now__):
+        test_job = self.create_test_job(submitted=True, submitted_at=NOW - relativedelta(days=10))
+        with patch('squad.ci.backend.null.Backend.running_statuses', ['Running']):
+            self.backend.schedule_poll(test_job, 'Running')
+        self.assertEqual(NOW + relativedelta(minutes=5), test_job.next_poll_at)
+
+    def test_poll_schedules_probed_jobs(self):
+        test_job = self.create_test_job(submitted=True, job_id='1')
+        with patch('squad.ci.backend.null.Backend.running_statuses', ['Running']), \
+                patch('squad.ci.backend.null.Backend.job_statuses', return_value={test_job.id: 'Running'}):
+            self.assertEqual([], list(self.backend.poll()))
+        test_job.refresh_from_db()
+        self.assertLessEqual(test_job.next_poll_at, timezone.now() + relativedelta(minutes=5))
+        self.assertGreater(test_job.next_poll_at, timezone.now() + relativedelta(minutes=4))
+
+    def test_poll_yields_a_job_once_until_it_is_fetched(self):
+        test_job = self.create_test_job(submitted=True, job_id='1')
+        self.assertEqual([test_job], list(self.backend.poll()))
+        # the fetch is still waiting in the queue
+        self.assertEqual([], list(self.backend.poll()))
+
+        test_job.refresh_from_db()
+        self.assertIsNotNone(test_job.last_fetch_attempt)
+        self.assertGreater(test_job.next_poll_at, timezone.now() + relativedelta(minutes=self.backend.poll_interval - 1))
+
+    def test_poll_resolves_implementation_once(self):
+        test_jobs = [self.create_test_job(submitted=True, job_id=str(i)) for i in range(3)]
+        statuses = {test_job.id: 'Running' for test_job in test_jobs}
+        with patch('squad.ci.backend.null.Backend.running_statuses', ['Running']), \
+                patch('squad.ci.backend.null.Backend.job_statuses', return_value=statuses), \
+                patch('squad.ci.models.Backend.get_implementation', wraps=self.backend.get_implementation) as get_implementation:
+            self.assertEqual([], list(self.backend.poll()))
+        get_implementation.assert_called_once_with()
+
 
 class BackendFetchTest(BackendTestBase):
 
@@ -104,6 +199,7 @@ class BackendFetchTest(BackendTestBase):
 
         test_job.refresh_from_db()
         self.assertEqual(NOW, test_job.last_fetch_attempt)
+        self.assertEqual(NOW + relativedelta(minutes=self.backend.poll_interval), test_job.next_poll_at)
         self.assertFalse(test_job.fetched)
         self.assertIsNone(test_job.job_status)
 
@@ -139,6 +139,26 @@ class BuildTest(TestCase):
         finished, _ = build.finished
         self.assertFalse(finished)
 
+    def test_finished_reasons_per_environment(self):
+        build = self.project.builds.create(version='1')
+        env1 = self.project.environments.create(slug='env1', expected_test_runs=2)
+        self.project.environments.create(slug='env2', expected_test_runs=1)
+        self.project.environments.create(slug='env3', expected_test_runs=0)
+        build.test_runs.create(environment=env1)
+        build.test_runs.create(environment=env1, completed=False)
+
+        with self.assertNumQueries(2):
+            finished, reasons = build.finished
+
+        self.assertFalse(finished)
+        self.assertEqual(
+            [
+                "2 test runs expected for env1, but only 1 received so far",
+                "No test runs for env2 received so far",
+            ],
+            reasons,
+        )
+
     @patch('squad.ci.backend.null.Backend.job_url', return_value="http://example.com/123")
     @patch('squad.ci.backend.null.Backend.fetch')
     def test_not_finished_with_pending_ci_jobs(self, fetch, job_url):
@@ -121,3 +121,39 @@ class BuildSummaryTest(TestCase):
         self.assertEqual(1, summary2.tests_fail)
         self.assertEqual(1, summary2.tests_skip)
         self.assertEqual(0, summary2.tests_xfail)
+
+    def test_add_testrun_incrementally(self):
+        values1 = [1, 2, 3, 4, 5]
+        BuildSummary.create_or_update(self.build1, self.env1)
+
+        self.receive_testrun(self.build1.version, self.env1.slug, tests_file='{"suite1/new_foo": "pass"}', metrics_file='{"suite1/new_bar": 5}')
+        summary = BuildSummary.create_or_update(self.build1, self.env1, incremental=True)
+        summary = BuildSummary.create_or_update(self.build1, self.env1, incremental=True)
+
+        self.assertTrue(eq(geomean(values1), summary.metrics_summary))
+        self.assertEqual(5, summary.tests_total)
+        self.assertEqual(2, summary.tests_pass)
+        self.assertEqual(3, summary.test_runs_total)
+
+    def test_summarize_new_build_summary_in_full(self):
+        self.receive_testrun(self.build1.version, self.env2.slug, tests_file='{"suite1/new_foo": "pass"}')
+        summary = BuildSummary.create_or_update(self.build1, self.env2, incremental=True)
+
+        self.assertTrue(eq(geomean([2, 4, 6, 8]), summary.metrics_summary))
+        self.assertEqual(4, summary.tests_total)
+        self.assertEqual(3, summary.test_runs_total)
+
+    def test_summarize_in_full_after_a_testrun_is_deleted(self):
+        BuildSummary.create_or_update(self.build1, self.env1)
+        testrun, _ = self.receive_testrun(self.build1.version, self.env1.slug, tests_file='{"suite1/new_foo": "pass"}', metrics_file='{"suite1/new_bar": 5}')
+        BuildSummary.create_or_update(self.build1, self.env1, incremental=True)
+
+        testrun.refresh_from_db()
+        testrun.delete()
+        summary = BuildSummary.create_or_update(self.build1, self.env1, incremental=True)
+
+        self.assertTrue(eq(geomean([1, 2, 3, 4]), summary.metrics_summary))
+        self.assertEqual(4, summary.metrics_count)
+        self.assertEqual(4, summary.tests_total)
+        self.assertEqual(1, summary.tests_pass)
+        self.assertEqual(2, summary.test_runs_total)
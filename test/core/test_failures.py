@@ -1,3 +1,6 @@
+from unittest.mock import patch
+
+from django.db.models.query import QuerySet
 from django.test import TestCase
 from squad.core.failures import failures_with_confidence
 from squad.core.models import Build, Group, SuiteMetadata
@@ -72,3 +75,66 @@ class FailuresWithConfidenceTest(TestCase):
         self.assertEqual(test.confidence.count, 0)
         self.assertEqual(test.confidence.score, 0)
         self.assertEqual(test.confidence.threshold, self.project.build_confidence_threshold)
+
+    def test_failures_with_confidence_in_a_single_query(self):
+        env1 = self.project.environments.create(slug="env1")
+        env2 = self.project.environments.create(slug="env2")
+        suite = self.project.suites.create(slug="suite")
+        foo, _ = SuiteMetadata.objects.get_or_create(suite=suite.slug, name="foo", kind="test")
+        bar, _ = SuiteMetadata.objects.get_or_create(suite=suite.slug, name="bar", kind="test")
+
+        b1 = Build.objects.create(project=self.project, version='1.1')
+        tr1 = b1.test_runs.create(environment=env1)
+        tr1.tests.create(build=b1, environment=env1, suite=suite, metadata=foo, result=True)
+        tr1.tests.create(build=b1, environment=env1, suite=suite, metadata=bar, result=True)
+        tr2 = b1.test_runs.create(environment=env2)
+        tr2.tests.create(build=b1, environment=env2, suite=suite, metadata=bar, result=False)
+
+        b2 = Build.objects.create(project=self.project, version='1.2')
+        tr3 = b2.test_runs.create(environment=env1)
+        tr3.tests.create(build=b2, environment=env1, suite=suite, metadata=foo, result=False)
+        tr4 = b2.test_runs.create(environment=env2)
+        tr4.tests.create(build=b2, environment=env2, suite=suite, metadata=bar, result=False)
+
+        failures = list(get_build_failures(b2))
+        # metadata, builds, and the history of all failures
+        with self.assertNumQueries(3):
+            failures_with_confidence(self.project, b2, failures)
+
+        confidence = {(f.metadata_id, f.environment_id): f.confidence for f in failures}
+        self.assertEqual(1, confidence[(foo.id, env1.id)].passes)
+        self.assertEqual(1, confidence[(foo.id, env1.id)].count)
+        self.assertEqual(0, confidence[(bar.id, env2.id)].passes)
+        self.assertEqual(1, confidence[(bar.id, env2.id)].count)
+
+    def test_failures_with_confidence_fetches_only_requested_pairs(self):
+        env1 = self.project.environments.create(slug="env1")
+        env2 = self.project.environments.create(slug="env2")
+        suite = self.project.suites.create(slug="suite")
+        foo, _ = SuiteMetadata.objects.get_or_create(suite=suite.slug, name="foo", kind="test")
+        bar, _ = SuiteMetadata.objects.get_or_create(suite=suite.slug, name="bar", kind="test")
+
+        b1 = Build.objects.create(project=self.project, version='1.1')
+        for env in [env1, env2]:
+            tr = b1.test_runs.create(environment=env)
+            for metadata in [foo, bar]:
+                tr.tests.create(build=b1, environment=env, suite=suite, metadata=metadata, result=True)
+
+        b2 = Build.objects.create(project=self.project, version='1.2')
+        tr = b2.test_runs.create(environment=env1)
+        tr.tests.create(build=b2, environment=env1, suite=suite, metadata=foo, result=False)
+        tr = b2.test_runs.create(environment=env2)
+        tr.tests.create(build=b2, environment=env2, suite=suite, metadata=bar, result=False)
+
+        fetched = []
+        iterator = QuerySet.iterator
+
+        def spy(queryset, *args, **kwargs):
+            for item in iterator(queryset, *args, **kwargs):
+                fetched.append((item.metadata_id, item.environment_id))
+                yield item
+
+        with patch.object(QuerySet, 'iterator', spy):
+            failures_with_confidence(self.project, b2, list(get_build_failures(b2)))
+
+        self.assertEqual(sorted([(foo.id, env1.id), (bar.id, env2.id)]), sorted(fetched))
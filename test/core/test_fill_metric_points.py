@@ -0,0 +1,46 @@
+from django.core.management import call_command
+from django.test import TestCase
+
+from squad.core.models import Group, Metric, MetricPoint, SuiteMetadata
+
+
+class FillMetricPointsTest(TestCase):
+
+    def setUp(self):
+        self.group = Group.objects.create(slug='mygroup')
+        self.project = self.group.projects.create(slug='myproject')
+        self.environment = self.project.environments.create(slug='theenvironment')
+        self.suite = self.project.suites.create(slug='/')
+        self.build = self.project.builds.create(version='1')
+        self.testrun = self.build.test_runs.create(environment=self.environment)
+
+    def test_fill_metric_points(self):
+        for name, measurements in [('a', '1,2,3'), ('b', '4.5'), ('c', '')]:
+            metadata, _ = SuiteMetadata.objects.get_or_create(suite='/', name=name, kind='metric')
+            self.testrun.metrics.create(
+                suite=self.suite,
+                metadata=metadata,
+                build=self.build,
+                environment=self.environment,
+                measurements=measurements,
+                result=1,
+            )
+        # pretend the metrics were received before points existed, and the
+        # first one before measurements were packed as well
+        MetricPoint.objects.all().delete()
+        first = Metric.objects.order_by('id').first()
+        Metric.objects.filter(id=first.id).update(measurements_count=None, measurements_min=None, measurements_max=None)
+
+        call_command('fill_metric_points', '--batch-size', '2')
+
+        points = MetricPoint.objects.order_by('metric_id')
+        self.assertEqual(3, len(points))
+        self.assertEqual((1, 3), (points[0].measurements_min, points[0].measurements_max))
+        self.assertEqual((4.5, 4.5), (points[1].measurements_min, points[1].measurements_max))
+        self.assertIsNone(points[2].measurements_min)
+        self.assertEqual(self.testrun.created_at, points[0].created_at)
+        self.assertEqual(self.environment.id, points[0].environment_id)
+
+        # running it again has nothing left to do
+        call_command('fill_metric_points')
+        self.assertEqual(3, MetricPoint.objects.count())
@@ -0,0 +1,43 @@
+from django.core.management import call_command
+from django.test import TestCase
+
+from squad.core.models import Group, Metric
+
+
+class FillPackedMeasurementsTest(TestCase):
+
+    def setUp(self):
+        self.group = Group.objects.create(slug='mygroup')
+        self.project = self.group.projects.create(slug='myproject')
+        self.environment = self.project.environments.create(slug='theenvironment')
+        self.suite = self.project.suites.create(slug='/')
+        self.build = self.project.builds.create(version='1')
+        self.testrun = self.build.test_runs.create(environment=self.environment)
+
+    def test_fill_packed_measurements(self):
+        for measurements in ['1,2,3', '4.5', '']:
+            metric = self.testrun.metrics.create(
+                suite=self.suite,
+                build=self.build,
+                environment=self.environment,
+                measurements=measurements,
+                result=0,
+            )
+            # pretend the metric was received before measurements were packed
+            Metric.objects.filter(id=metric.id).update(
+                packed_measurements=None,
+                measurements_count=None,
+                measurements_min=None,
+                measurements_max=None,
+                measurements_mean=None,
+            )
+
+        call_command('fill_packed_measurements', '--batch-size', '2')
+
+        self.assertFalse(Metric.objects.filter(measurements_count__isnull=True).exists())
+        metrics = Metric.objects.order_by('id')
+        self.assertEqual([1, 2, 3], metrics[0].measurement_list)
+        self.assertEqual((3, 1, 3, 2), (metrics[0].measurements_count, metrics[0].measurements_min, metrics[0].measurements_max, metrics[0].measurements_mean))
+        self.assertEqual([4.5], metrics[1].measurement_list)
+        self.assertEqual(0, metrics[2].measurements_count)
+        self.assertIsNone(metrics[2].measurements_min)
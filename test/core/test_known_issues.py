@@ -1,7 +1,10 @@
+import pickle
+
 from django.test import TestCase
 from django.utils import timezone
 
 from squad.core.models import Group, KnownIssue, SuiteMetadata
+from squad.core.known_issues import KnownIssueMatcher
 from squad.core.tasks import ParseTestRunData
 
 
@@ -113,3 +116,81 @@ class KnownIssueTest(TestCase):
         for test in testrun.tests.filter(suite__slug__in="suite1,suite2").all():
             self.assertTrue(test.has_known_issues)
             self.assertIn(known_issue, test.known_issues.all())
+
+    def test_matcher_by_environment_is_invalidated(self):
+        known_issue = KnownIssue.objects.create(title="foo", test_name="suite1/foo")
+        known_issue.environments.add(self.env1)
+        matcher = KnownIssue.matcher_by_environment(self.env1)
+        self.assertEqual([known_issue.id], matcher("suite1/foo"))
+
+        known_issue.test_name = "suite1/bar"
+        known_issue.save()
+        matcher = KnownIssue.matcher_by_environment(self.env1)
+        self.assertEqual([], matcher("suite1/foo"))
+        self.assertEqual([known_issue.id], matcher("suite1/bar"))
+
+        known_issue.environments.remove(self.env1)
+        matcher = KnownIssue.matcher_by_environment(self.env1)
+        self.assertEqual([], matcher("suite1/bar"))
+
+    def test_version_comes_from_the_database(self):
+        known_issue = KnownIssue.objects.create(title="foo", test_name="suite1/foo")
+        version = KnownIssue.version()
+
+        # as seen by another process, which has nothing in its cache
+        KnownIssue.objects.filter(pk=known_issue.pk).update(test_name="suite1/bar", updated_at=timezone.now())
+        self.assertNotEqual(version, KnownIssue.version())
+
+    def test_version_changes_with_environments(self):
+        known_issue = KnownIssue.objects.create(title="foo", test_name="suite1/foo")
+        version = KnownIssue.version()
+        known_issue.environments.add(self.env1)
+        self.assertNotEqual(version, KnownIssue.version())
+
+        version = KnownIssue.version()
+        self.env1.knownissue_set.clear()
+        self.assertNotEqual(version, KnownIssue.version())
+
+    def test_version_changes_on_delete(self):
+        KnownIssue.objects.create(title="foo", test_name="suite1/foo")
+        known_issue = KnownIssue.objects.create(title="bar", test_name="suite1/bar")
+        version = KnownIssue.version()
+        KnownIssue.objects.filter(pk=known_issue.pk - 1).delete()
+        self.assertNotEqual(version, KnownIssue.version())
+
+
+class KnownIssueMatcherTest(TestCase):
+
+    def match(self, patterns, full_name):
+        matcher = KnownIssueMatcher(enumerate(patterns))
+        return sorted(matcher(full_name))
+
+    def test_literal(self):
+        self.assertEqual([0], self.match(['suite/foo'], 'suite/foo'))
+        self.assertEqual([], self.match(['suite/foo'], 'suite/fo'))
+        self.assertEqual([], self.match(['suite/foo'], 'other/foo'))
+
+    def test_literal_is_anchored_at_the_beginning_only(self):
+        self.assertEqual([0], self.match(['suite/foo'], 'suite/foobar'))
+
+    def test_prefix(self):
+        self.assertEqual([0, 1], self.match(['suite/*', 'suite/foo*', 'suite/bar*'], 'suite/foo'))
+
+    def test_glob(self):
+        patterns = ['suite*/foo', '*/foo', '*bar', 'suite1/*/foo']
+        self.assertEqual([0, 1], self.match(patterns, 'suite1/foo'))
+        self.assertEqual([1], self.match(patterns, 'other/foo'))
+        self.assertEqual([0, 1, 3], self.match(patterns, 'suite1/x/foo'))
+        self.assertEqual([], self.match(patterns, 'other/baz'))
+
+    def test_escapes_regex_characters(self):
+        self.assertEqual([0], self.match(['suite/foo[1.0]*x'], 'suite/foo[1.0]-x'))
+        self.assertEqual([], self.match(['suite/foo[1.0]*x'], 'suite/foo[120]-x'))
+
+    def test_same_pattern_multiple_issues(self):
+        matcher = KnownIssueMatcher([(1, 'a*'), (2, 'a*'), (3, '*b'), (4, '*b')])
+        self.assertEqual([1, 2, 3, 4], sorted(matcher('ab')))
+
+    def test_is_picklable(self):
+        matcher = pickle.loads(pickle.dumps(KnownIssueMatcher([(1, 'x' * 2000), (2, '*x')])))
+        self.assertEqual([1, 2], sorted(matcher('x' * 2000)))
@@ -2,7 +2,7 @@ from django.test import TestCase
 from unittest.mock import patch
 
 
-from squad.core.models import Metric, SuiteMetadata
+from squad.core.models import Group, Metric, MetricPoint, SuiteMetadata
 
 
 class MetricTest(TestCase):
@@ -19,6 +19,50 @@ class MetricTest(TestCase):
         m = Metric(measurements='1,2.5,3')
         self.assertEqual([1, 2.5, 3], m.measurement_list)
 
+    def test_measurement_list_packed(self):
+        m = Metric(measurements='1,2')
+        m.fill_packed_measurements()
+        m.measurements = ''
+        self.assertEqual([1, 2], m.measurement_list)
+
+    def test_set_measurements(self):
+        m = Metric()
+        m.set_measurements([1, 2.5, 3])
+        self.assertEqual('1,2.5,3', m.measurements)
+        self.assertEqual([1, 2.5, 3], m.measurement_list)
+        self.assertEqual(3, m.measurements_count)
+        self.assertEqual(1, m.measurements_min)
+        self.assertEqual(3, m.measurements_max)
+        self.assertAlmostEqual(6.5 / 3, m.measurements_mean)
+
+    def test_point(self):
+        group = Group.objects.create(slug='mygroup')
+        project = group.projects.create(slug='myproject')
+        environment = project.environments.create(slug='myenv')
+        build = project.builds.create(version='1')
+        testrun = build.test_runs.create(environment=environment)
+        metadata = SuiteMetadata.objects.create(suite='mysuite', name='mymetric', kind='metric')
+        metric = testrun.metrics.create(
+            suite=project.suites.create(slug='mysuite'),
+            metadata=metadata,
+            build=build,
+            environment=environment,
+            result=2,
+            measurements='1,3',
+        )
+
+        point = MetricPoint.objects.get(metric=metric)
+        self.assertEqual((2, 1, 3), (point.result, point.measurements_min, point.measurements_max))
+        self.assertEqual(testrun.created_at, point.created_at)
+        self.assertFalse(point.is_outlier)
+
+        metric.is_outlier = True
+        metric.save()
+        self.assertTrue(MetricPoint.objects.get(metric=metric).is_outlier)
+
+        metric.delete()
+        self.assertFalse(MetricPoint.objects.exists())
+
     @patch("squad.core.models.join_name", lambda x, y: 'woooops')
     def test_full_name(self):
         sm = SuiteMetadata()
@@ -18,7 +18,9 @@ class MetricComparisonTest(TestCase):
 
     def receive_test_run(self, project, version, env, metrics):
         receive = ReceiveTestRun(project, update_project_status=False)
-        receive(version, env, metrics_file=json.dumps(metrics))
+        # cached comparisons are invalidated once results are committed
+        with self.captureOnCommitCallbacks(execute=True):
+            receive(version, env, metrics_file=json.dumps(metrics))
 
     def setUp(self):
         self.group = models.Group.objects.create(slug='mygruop')
@@ -196,6 +198,22 @@ class MetricComparisonTest(TestCase):
                 self.assertNotIn(metric_name, comparison.regressions[self.environment_a.slug])
                 self.assertNotIn(metric_name, comparison.fixes[self.environment_a.slug])
 
+    def test_cached_regressions_are_discarded_on_new_threshold(self):
+        metric_name = 'suite_a/late-threshold-metric'
+        self.receive_test_run(self.project, self.build_a.version, self.environment_a.slug, {metric_name: 1})
+        self.receive_test_run(self.project, self.build_b.version, self.environment_a.slug, {metric_name: 2})
+
+        comparison = MetricComparison(self.build_a, self.build_b, regressions_and_fixes_only=True)
+        self.assertEqual({}, comparison.regressions)
+
+        # only the versions of the builds and of the thresholds are read
+        with self.assertNumQueries(2):
+            MetricComparison(self.build_a, self.build_b, regressions_and_fixes_only=True)
+
+        self.project.thresholds.create(name=metric_name, is_higher_better=False)
+        comparison = MetricComparison(self.build_a, self.build_b, regressions_and_fixes_only=True)
+        self.assertEqual([metric_name], comparison.regressions[self.environment_a.slug])
+
     def different_environments(self):
         metric_name = 'suite_a/different-env-metric'
         build_a_result = 1
@@ -1,8 +1,10 @@
 from django.core.exceptions import ValidationError
 from django.test import TestCase
+from django.utils import timezone
 
 
-from squad.core.models import Group
+from squad.core.models import Group, MetricThreshold
+from squad.core.thresholds import MetricThresholdMatcher
 
 
 class MetricThresholdTest(TestCase):
@@ -59,3 +61,61 @@ class MetricThresholdTest(TestCase):
         threshold_name = 'should-not-match-that-[0-9]'
         threshold = self.project.thresholds.create(name=threshold_name)
         self.assertFalse(threshold.match('should-not-match-that-0'))
+
+    def test_matcher_follows_changes(self):
+        threshold = self.project.thresholds.create(name='suite/foo')
+        self.assertEqual([threshold.id], MetricThreshold.matcher(self.project)('suite/foo'))
+
+        threshold.name = 'suite/bar'
+        threshold.save()
+        self.assertEqual([], MetricThreshold.matcher(self.project)('suite/foo'))
+        self.assertEqual([threshold.id], MetricThreshold.matcher(self.project)('suite/bar'))
+
+        threshold.delete()
+        self.assertEqual([], MetricThreshold.matcher(self.project)('suite/bar'))
+
+    def test_version_comes_from_the_database(self):
+        threshold = self.project.thresholds.create(name='suite/foo')
+        version = MetricThreshold.version()
+
+        # as seen by another process, which has nothing in its cache
+        MetricThreshold.objects.filter(pk=threshold.pk).update(name='suite/bar', updated_at=timezone.now())
+        self.assertNotEqual(version, MetricThreshold.version())
+
+    def test_version_changes_on_delete(self):
+        self.project.thresholds.create(name='suite/foo')
+        threshold = self.project.thresholds.create(name='suite/bar')
+        version = MetricThreshold.version()
+        MetricThreshold.objects.filter(pk=threshold.pk - 1).delete()
+        self.assertNotEqual(version, MetricThreshold.version())
+
+
+class MetricThresholdMatcherTest(TestCase):
+
+    def match(self, patterns, full_name):
+        matcher = MetricThresholdMatcher(enumerate(patterns))
+        return sorted(matcher(full_name))
+
+    def test_literal(self):
+        self.assertEqual([0], self.match(['suite/foo'], 'suite/foo'))
+        self.assertEqual([], self.match(['suite/foo'], 'suite/foobar'))
+        self.assertEqual([], self.match(['suite/foo'], 'other/foo'))
+
+    def test_glob(self):
+        patterns = ['suite*/foo', '*/foo', '*bar', 'suite1/*/foo', 'suite1/*']
+        self.assertEqual([0, 1, 4], self.match(patterns, 'suite1/foo'))
+        self.assertEqual([1], self.match(patterns, 'other/foo'))
+        self.assertEqual([0, 1, 3, 4], self.match(patterns, 'suite1/x/foo'))
+        self.assertEqual([], self.match(patterns, 'other/foo/baz'))
+
+    def test_escapes_regex_characters(self):
+        self.assertEqual([0], self.match(['suite/foo[1.0]*x'], 'suite/foo[1.0]-x'))
+        self.assertEqual([], self.match(['suite/foo[1.0]*x'], 'suite/foo[120]-x'))
+
+    def test_same_as_match(self):
+        names = ['a/b', 'a/*', '*/b', 'a*b', 'x/*/y']
+        thresholds = [MetricThreshold(name=name) for name in names]
+        matcher = MetricThresholdMatcher(enumerate(names))
+        for full_name in ['a/b', 'a/bb', 'a/', 'x/b', 'x/1/y', 'x/1/yz', 'ab']:
+            expected = [i for i, t in enumerate(thresholds) if t.match(full_name)]
+            self.assertEqual(expected, sorted(matcher(full_name)))
@@ -159,6 +159,81 @@ class ProjectStatusTest(TestCase):
         self.assertAlmostEqual(5.0, status.metrics_summary)
         self.assertEqual(status.metrics_summary, build.status.metrics_summary)
 
+    def test_adds_new_testruns_incrementally(self):
+        build = self.create_build('1', datetime=h(10), create_test_run=False)
+        ProjectStatus.create_or_update(build)
+
+        self.receive_testrun(build.version, self.environment.slug, tests_file='{"tests/foo": "pass", "tests/bar": "fail"}', metrics_file='{"tests/m1": 2}')
+        ProjectStatus.create_or_update(build, incremental=True)
+        self.receive_testrun(build.version, self.environment.slug, tests_file='{"tests/baz": "none"}', metrics_file='{"tests/m2": 8}', completed=False)
+        status = ProjectStatus.create_or_update(build, incremental=True)
+
+        self.assertEqual(1, status.tests_pass)
+        self.assertEqual(1, status.tests_fail)
+        self.assertEqual(1, status.tests_skip)
+        self.assertEqual(2, status.test_runs_total)
+        self.assertEqual(1, status.test_runs_completed)
+        self.assertEqual(1, status.test_runs_incomplete)
+        self.assertTrue(status.has_metrics)
+        self.assertAlmostEqual(4.0, status.metrics_summary)
+        self.assertEqual(2, status.metrics_count)
+
+        full = ProjectStatus.create_or_update(build)
+        self.assertEqual(status.tests_total, full.tests_total)
+        self.assertAlmostEqual(status.metrics_summary, full.metrics_summary)
+        self.assertAlmostEqual(status.metrics_log_sum, full.metrics_log_sum)
+
+    def test_adds_each_testrun_only_once(self):
+        build = self.create_build('1', datetime=h(10), create_test_run=False)
+        self.receive_testrun(build.version, self.environment.slug, tests_file='{"tests/foo": "pass"}')
+        ProjectStatus.create_or_update(build, incremental=True)
+        status = ProjectStatus.create_or_update(build, incremental=True)
+
+        self.assertEqual(1, status.tests_pass)
+        self.assertEqual(1, status.test_runs_total)
+
+    def test_summarizes_legacy_status_in_full(self):
+        build = self.create_build('1', datetime=h(10), create_test_run=False)
+        testrun1, _ = self.receive_testrun(build.version, self.environment.slug, tests_file='{"tests/foo": "pass"}', metrics_file='{"tests/m1": 3}')
+        ProjectStatus.objects.filter(build=build).update(metrics_log_sum=None, metrics_count=None)
+
+        self.receive_testrun(build.version, self.environment.slug, tests_file='{"tests/bar": "pass"}', metrics_file='{"tests/m2": 3}')
+        status = ProjectStatus.create_or_update(build, incremental=True)
+        self.assertEqual(2, status.tests_pass)
+        self.assertEqual(2, status.metrics_count)
+        self.assertAlmostEqual(3.0, status.metrics_summary)
+
+        testrun1.refresh_from_db()
+        self.assertTrue(testrun1.project_status_updated)
+
+    def test_summarizes_in_full_after_a_testrun_is_deleted(self):
+        build = self.create_build('1', datetime=h(10), create_test_run=False)
+        testrun1, _ = self.receive_testrun(build.version, self.environment.slug, tests_file='{"tests/foo": "pass", "tests/bar": "pass"}', metrics_file='{"tests/m1": 2}')
+        ProjectStatus.create_or_update(build, incremental=True)
+
+        testrun1.refresh_from_db()
+        testrun1.delete()
+        self.receive_testrun(build.version, self.environment.slug, tests_file='{"tests/foo": "fail"}', metrics_file='{"tests/m1": 8}')
+        status = ProjectStatus.create_or_update(build, incremental=True)
+
+        self.assertEqual(0, status.tests_pass)
+        self.assertEqual(1, status.tests_fail)
+        self.assertEqual(1, status.test_runs_total)
+        self.assertEqual(1, status.metrics_count)
+        self.assertAlmostEqual(8.0, status.metrics_summary)
+
+    def test_non_positive_metrics_summary_is_zero(self):
+        build = self.create_build('1', datetime=h(10), create_test_run=False)
+        ProjectStatus.create_or_update(build)
+        ProjectStatus.objects.filter(build=build).update(metrics_summary=None)
+
+        self.receive_testrun(build.version, self.environment.slug, metrics_file='{"tests/m1": 0}')
+        status = ProjectStatus.create_or_update(build, incremental=True)
+
+        self.assertTrue(status.has_metrics)
+        self.assertEqual(0, status.metrics_count)
+        self.assertEqual(0, status.metrics_summary)
+
     def test_populates_last_updated(self):
         build = self.create_build('1', datetime=h(10))
         status = ProjectStatus.create_or_update(build)
@@ -368,6 +443,31 @@ class ProjectStatusTest(TestCase):
         thresholds = status_a.get_exceeded_thresholds()
         self.assertEqual(len(thresholds), 0)
 
+    def test_get_exceeded_thresholds_multiple_thresholds(self):
+        build = self.create_build('1')
+        testrun = build.test_runs.create(environment=self.environment)
+        testrun_a = build.test_runs.create(environment=self.environment_a)
+        for name, result in [('metric1', 3), ('metric2', 8), ('other', 5)]:
+            metadata, _ = SuiteMetadata.objects.get_or_create(suite=self.suite.slug, name=name, kind='metric')
+            testrun.metrics.create(metadata=metadata, suite=self.suite, result=result, build=build, environment=testrun.environment)
+            testrun_a.metrics.create(metadata=metadata, suite=self.suite, result=result, build=build, environment=testrun_a.environment)
+
+        status = ProjectStatus.create_or_update(build)
+        project = self.environment.project
+        metric_wide = MetricThreshold.objects.create(project=project, name='suite_/metric*', value=4, is_higher_better=False)
+        other = MetricThreshold.objects.create(project=project, environment=self.environment_a, name='suite_/other', value=6, is_higher_better=True)
+        MetricThreshold.objects.create(project=project, name='suite_/metric1', value=10, is_higher_better=False)
+
+        exceeded = [(t.id, m.name, m.environment_id) for t, m in status.get_exceeded_thresholds()]
+        self.assertEqual(
+            [
+                (metric_wide.id, 'metric2', self.environment.id),
+                (metric_wide.id, 'metric2', self.environment_a.id),
+                (other.id, 'other', self.environment_a.id),
+            ],
+            exceeded,
+        )
+
     def test_last_build_comparison(self):
         # Test that the build that we compare against is truly the last one
         # time wise.
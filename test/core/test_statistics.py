@@ -1,7 +1,11 @@
-from unittest import TestCase
+from math import sqrt
+from unittest import TestCase, skipIf
+from unittest.mock import patch
 
 
-from squad.core.statistics import geomean
+from squad.core import statistics
+from squad.core.statistics import geomean, GeomeanAccumulator, measurements_stats, downsample
+from squad.core.utils import pack_measurements
 
 
 class GeomeanTest(TestCase):
@@ -20,3 +24,106 @@ class GeomeanTest(TestCase):
 
     def test_set_with_only_invalid_values(self):
         self.assertAlmostEqual(0, geomean([0]))
+
+
+class GeomeanAccumulatorTest(TestCase):
+
+    def test_same_as_geomean(self):
+        values = [4, 0, -1, 10, 2.5]
+        accumulator = GeomeanAccumulator()
+        for v in values:
+            accumulator.add(v)
+        self.assertEqual(geomean(values), accumulator.value)
+        self.assertEqual(3, accumulator.count)
+
+    def test_empty(self):
+        self.assertEqual(0, GeomeanAccumulator().value)
+
+    def test_merge(self):
+        a = GeomeanAccumulator()
+        a.add(1)
+        b = GeomeanAccumulator()
+        b.add(10)
+        a.merge(b)
+        self.assertAlmostEqual(geomean([1, 10]), a.value)
+        self.assertEqual(2, a.count)
+
+
+class MeasurementsStatsTest(TestCase):
+
+    groups = [['1,2', '3'], ['4'], ['2.5,2.5,-2']]
+
+    def test_basic(self):
+        stats = measurements_stats(self.groups)
+
+        self.assertEqual([3, 1, 3], [count for _, _, count in stats])
+        self.assertAlmostEqual(2, stats[0][0])
+        self.assertAlmostEqual(sqrt(2 / 3), stats[0][1])
+        self.assertAlmostEqual(4, stats[1][0])
+        self.assertAlmostEqual(0, stats[1][1])
+        self.assertAlmostEqual(1, stats[2][0])
+        self.assertAlmostEqual(sqrt(4.5), stats[2][1])
+
+    def test_no_groups(self):
+        self.assertEqual([], measurements_stats([]))
+
+    def test_packed(self):
+        packed = [[pack_measurements([float(v) for v in m.split(',')]) for m in group] for group in self.groups]
+        self.assertEqual(measurements_stats(self.groups), measurements_stats(packed))
+
+    def test_packed_and_text(self):
+        mixed = [[pack_measurements([1, 2]), '3'], ['4'], ['2.5,2.5,-2']]
+        self.assertEqual(measurements_stats(self.groups), measurements_stats(mixed))
+
+    def test_empty_groups(self):
+        packed = [[pack_measurements([1, 3])], [pack_measurements([])], [], [pack_measurements([5])], []]
+        stats = measurements_stats(packed)
+
+        self.assertEqual([2, None, None, 5, None], [s and s[0] for s in stats])
+        self.assertEqual([2, None, None, 1, None], [s and s[2] for s in stats])
+        with patch('squad.core.statistics.numpy', None):
+            self.assertEqual(stats, measurements_stats(packed))
+
+    def test_only_empty_groups(self):
+        self.assertEqual([None, None], measurements_stats([[], [pack_measurements([])]]))
+
+    @skipIf(statistics.numpy is None, 'NumPy is not installed')
+    def test_same_without_numpy(self):
+        stats = measurements_stats(self.groups)
+        with patch('squad.core.statistics.numpy', None):
+            expected = measurements_stats(self.groups)
+
+        for (mean, stddev, count), (expected_mean, expected_stddev, expected_count) in zip(stats, expected):
+            self.assertAlmostEqual(expected_mean, mean)
+            self.assertAlmostEqual(expected_stddev, stddev)
+            self.assertEqual(expected_count, count)
+
+
+class DownsampleTest(TestCase):
+
+    def test_short_series(self):
+        points = [[1, 1], [2, 2], [3, 3]]
+        self.assertEqual(points, downsample(points, 3))
+        self.assertEqual(points, downsample(points, None))
+
+    def test_keeps_first_and_last(self):
+        points = [[x, x % 7, 'extra-%d' % x] for x in range(1000)]
+        sampled = downsample(points, 50)
+        self.assertEqual(50, len(sampled))
+        self.assertEqual(points[0], sampled[0])
+        self.assertEqual(points[-1], sampled[-1])
+        self.assertEqual(sorted(sampled), sampled)
+        for point in sampled:
+            self.assertIn(point, points)
+
+    def test_keeps_peaks(self):
+        points = [[x, 0] for x in range(100)]
+        points[42] = [42, 1000]
+        points[77] = [77, -1000]
+        sampled = downsample(points, 10)
+        self.assertIn([42, 1000], sampled)
+        self.assertIn([77, -1000], sampled)
+
+    def test_less_than_three_points(self):
+        points = [[x, x] for x in range(10)]
+        self.assertEqual([[0, 0], [9, 9]], downsample(points, 2))
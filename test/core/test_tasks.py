@@ -5,16 +5,18 @@ import yaml
 
 
 from dateutil.relativedelta import relativedelta
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.utils import timezone
 from unittest.mock import Mock, patch
 
 
-from squad.core.models import Group, TestRun, Status, Build, ProjectStatus, SuiteVersion, PatchSource, KnownIssue, EmailTemplate, Callback
+from squad.core.models import Group, TestRun, Status, Build, ProjectStatus, SuiteVersion, PatchSource, KnownIssue, EmailTemplate, Callback, TestTimeline
 from squad.core.tasks import ParseTestRunData
 from squad.core.tasks import PostProcessTestRun
 from squad.core.tasks import RecordTestRunStatus
 from squad.core.tasks import UpdateProjectStatus
+from squad.core.tasks import ScheduleProjectStatusUpdate
+from squad.core.tasks import update_project_status
 from squad.core.tasks import ProcessTestRun
 from squad.core.tasks import ProcessAllTestRuns
 from squad.core.tasks import ReceiveTestRun
@@ -336,6 +338,63 @@ class ParseTestRunDataTest(CommonTestCase):
         self.assertEqual(4, testrun.tests.count())
         self.assertEqual(2, testrun.metrics.count())
 
+    def test_reads_tests_from_storage(self):
+        testrun = TestRun.objects.get(pk=self.testrun.pk)
+        ParseTestRunData()(testrun)
+        self.assertEqual(5, testrun.tests.count())
+
+    @override_settings(SQUAD_METRICS_BATCH_SIZE=2)
+    def test_inserts_metrics_in_batches(self):
+        ParseTestRunData()(self.testrun)
+        metrics = {m.full_name: m for m in self.testrun.metrics.prefetch_related('metadata', 'suite')}
+        self.assertEqual(['foobar/metric1', 'foobar/metric2', 'metric0'], sorted(metrics.keys()))
+        self.assertEqual('foobar', metrics['foobar/metric1'].suite.slug)
+        self.assertEqual('/', metrics['metric0'].suite.slug)
+        self.assertEqual(10.5, metrics['foobar/metric2'].result)
+        self.assertEqual('kb', metrics['foobar/metric2'].unit)
+        self.assertEqual(self.build.id, metrics['metric0'].build_id)
+        self.assertEqual(self.environment.id, metrics['metric0'].environment_id)
+
+    @patch('squad.core.tasks.split_iterable')
+    def test_inserts_tests_in_batches(self, split_iterable):
+        split_iterable.side_effect = lambda items, chunk_size: [[i] for i in items]
+        ParseTestRunData()(self.testrun)
+        self.assertEqual(5, self.testrun.tests.count())
+        self.assertEqual(5, self.testrun.tests.values('suite_id').distinct().count())
+
+    @patch('squad.core.tasks.split_iterable')
+    def test_repeated_test_names_across_batches(self, split_iterable):
+        split_iterable.side_effect = lambda items, chunk_size: [[i] for i in items]
+        testrun = TestRun.objects.create(build=self.build, environment=self.environment)
+        testrun.save_tests_file('{"foobar/test1": "pass", "foobar/test2": "pass", "foobar/test1": "fail"}')
+        status = ParseTestRunData()(testrun)
+        self.assertEqual(2, testrun.tests.count())
+
+        # the last result wins, as within a batch
+        test1 = testrun.tests.get(metadata__name='test1')
+        self.assertFalse(test1.result)
+        suite_status = status.tests[test1.suite_id]
+        self.assertEqual(1, suite_status['pass'])
+        self.assertEqual(1, suite_status['fail'])
+
+
+class UpdateTestTimelinesTest(CommonTestCase):
+
+    def test_timelines_are_updated_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ProcessTestRun()(self.testrun)
+        timelines = TestTimeline.objects.filter(environment=self.environment)
+        self.assertEqual(5, timelines.count())
+
+    def test_timelines_are_not_updated_before_commit(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            ProcessTestRun()(self.testrun)
+        self.assertEqual(0, TestTimeline.objects.count())
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(5, TestTimeline.objects.count())
+
 
 class ProcessAllTestRunsTest(CommonTestCase):
 
@@ -407,6 +466,52 @@ class RecordTestRunStatusTest(CommonTestCase):
         RecordTestRunStatus()(self.testrun)
         self.assertEqual(1, Status.objects.filter(suite=None).count())
 
+    def status_values(self):
+        return sorted(
+            Status.objects.filter(test_run=self.testrun).values_list(
+                'suite__slug', 'tests_pass', 'tests_fail', 'tests_xfail', 'tests_skip', 'metrics_summary', 'has_metrics',
+            ),
+            key=lambda s: s[0] or '',
+        )
+
+    def test_status_accumulated_while_parsing(self):
+        issue = KnownIssue.objects.create(title='some known issue', test_name='test0')
+        issue.environments.add(self.environment)
+
+        status = ParseTestRunData()(self.testrun)
+        RecordTestRunStatus()(self.testrun, status)
+        accumulated = self.status_values()
+
+        Status.objects.filter(test_run=self.testrun).delete()
+        self.testrun.status_recorded = False
+        RecordTestRunStatus()(self.testrun)
+
+        for expected, actual in zip(self.status_values(), accumulated):
+            self.assertEqual(expected[:5], actual[:5])
+            self.assertAlmostEqual(expected[5], actual[5])
+            self.assertEqual(expected[6], actual[6])
+        self.assertEqual(6, len(accumulated))
+
+    def test_status_accumulated_while_parsing_includes_tests_created_later(self):
+        status = ParseTestRunData()(self.testrun)
+        suite = self.testrun.tests.first().suite
+        self.testrun.tests.create(build=self.build, environment=self.environment, suite=suite, result=False)
+        RecordTestRunStatus()(self.testrun, status)
+
+        overall = self.testrun.status.overall().get()
+        self.assertEqual(2, overall.tests_fail)
+        self.assertEqual(3, overall.tests_pass)
+
+    def test_status_accumulator_without_ids(self):
+        status = ParseTestRunData()(self.testrun)
+        status.add_test(None, None, True, False)
+        RecordTestRunStatus()(self.testrun, status)
+
+        overall = self.testrun.status.overall().get()
+        self.assertEqual(3, overall.tests_pass)
+        self.assertEqual(1, overall.tests_fail)
+        self.assertEqual(1, overall.tests_skip)
+
     def test_suite_version_not_informed(self):
         ParseTestRunData()(self.testrun)
         RecordTestRunStatus()(self.testrun)
@@ -466,6 +571,49 @@ class UpdateProjectStatusTest(CommonTestCase):
         requests_post.assert_called_with(url)
 
 
+class ScheduleProjectStatusUpdateTest(CommonTestCase):
+
+    def setUp(self):
+        super(ScheduleProjectStatusUpdateTest, self).setUp()
+        ParseTestRunData()(self.testrun)
+        RecordTestRunStatus()(self.testrun)
+
+    @override_settings(SQUAD_PROJECT_STATUS_UPDATE_DELAY=0)
+    @patch('squad.core.tasks.update_project_status')
+    def test_updates_right_away_without_delay(self, update_project_status):
+        ScheduleProjectStatusUpdate()(self.testrun)
+
+        update_project_status.apply_async.assert_not_called()
+        self.assertEqual(3, ProjectStatus.objects.get(build=self.build).tests_pass)
+
+    @override_settings(SQUAD_PROJECT_STATUS_UPDATE_DELAY=60)
+    @patch('squad.core.tasks.update_project_status')
+    def test_schedules_one_update_per_build(self, update_project_status):
+        ScheduleProjectStatusUpdate()(self.testrun)
+        ScheduleProjectStatusUpdate()(self.testrun)
+
+        update_project_status.apply_async.assert_called_once_with(args=[self.build.id], countdown=60)
+        self.assertEqual(0, ProjectStatus.objects.get(build=self.build).tests_pass)
+
+    @override_settings(SQUAD_PROJECT_STATUS_UPDATE_DELAY=60)
+    @patch('squad.core.tasks.update_project_status')
+    def test_reschedules_lost_update(self, update_project_status):
+        ProjectStatus.objects.filter(build=self.build).update(update_scheduled_at=timezone.now() - relativedelta(hours=1))
+        ScheduleProjectStatusUpdate()(self.testrun)
+
+        update_project_status.apply_async.assert_called_once_with(args=[self.build.id], countdown=60)
+
+    @patch('squad.core.tasks.maybe_notify_project_status')
+    def test_update_project_status(self, maybe_notify_project_status):
+        ProjectStatus.objects.filter(build=self.build).update(update_scheduled_at=timezone.now())
+        update_project_status(self.build.id)
+
+        status = ProjectStatus.objects.get(build=self.build)
+        self.assertIsNone(status.update_scheduled_at)
+        self.assertEqual(3, status.tests_pass)
+        maybe_notify_project_status.delay.assert_called_once_with(status.id)
+
+
 class ProcessTestRunTest(CommonTestCase):
 
     def test_basics(self):
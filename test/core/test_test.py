@@ -3,7 +3,7 @@ from django.test import TestCase
 from django.utils import timezone
 
 from unittest.mock import patch
-from squad.core.models import Group, Test, Suite, SuiteMetadata
+from squad.core.models import Group, Test, TestTimeline, Suite, SuiteMetadata
 
 
 def create_test(**kwargs):
@@ -105,7 +105,8 @@ class TestFailureHistoryTest(TestCase):
         )
         test_run = build.test_runs.create(environment=environment)
         metadata, _ = SuiteMetadata.objects.get_or_create(suite=self.suite.slug, name=test, kind='test')
-        test = test_run.tests.create(suite=self.suite, result=result, metadata=metadata, build=test_run.build, environment=test_run.environment)
+        with self.captureOnCommitCallbacks(execute=True):
+            test = test_run.tests.create(suite=self.suite, result=result, metadata=metadata, build=test_run.build, environment=test_run.environment)
 
         self.date = self.date + relativedelta(days=1)
         return test
@@ -164,3 +165,94 @@ class TestFailureHistoryTest(TestCase):
         self.assertEqual(first, current.history.since)
         self.assertEqual(1, current.history.count)
         self.assertEqual(last_pass, current.history.last_different)
+
+    def test_history_from_timeline(self):
+        last_pass = self.previous_test("mytest", True)
+        first = self.previous_test("mytest", False)
+        current = self.previous_test("mytest", False)
+
+        # the first lookup rebuilds the timeline from the existing tests
+        self.assertEqual(first, current.history.since)
+        self.assertEqual(1, current.history.count)
+        self.assertEqual(last_pass, current.history.last_different)
+
+        # the timeline is kept up to date from now on
+        following = self.previous_test("mytest", False)
+        with self.assertNumQueries(3):
+            # timeline, number of tests, and the since/last_different tests
+            self.assertEqual(first, following.history.since)
+        self.assertEqual(2, following.history.count)
+
+    def test_timeline_updated_once_per_transaction(self):
+        self.previous_test("mytest", True)
+        current = self.previous_test("mytest", False)
+        self.assertEqual(0, current.history.count)
+
+        build = self.project.builds.create(datetime=self.date, version='following')
+        test_run = build.test_runs.create(environment=self.environment)
+        with self.captureOnCommitCallbacks() as callbacks:
+            following = test_run.tests.create(suite=self.suite, result=False, metadata=current.metadata, build=build, environment=self.environment)
+            other_metadata = SuiteMetadata.objects.create(suite=self.suite.slug, name='othertest', kind='test')
+            test_run.tests.create(suite=self.suite, result=True, metadata=other_metadata, build=build, environment=self.environment)
+
+        timeline = TestTimeline.objects.get(metadata=current.metadata)
+        self.assertIsNone(timeline.history(following))
+
+        with patch('squad.core.models.TestTimeline.add_tests', wraps=TestTimeline.add_tests) as add_tests:
+            for callback in callbacks:
+                callback()
+        add_tests.assert_called_once()
+
+        timeline = TestTimeline.objects.get(metadata=current.metadata)
+        history = timeline.history(following)
+        self.assertEqual(current, history.since)
+        self.assertEqual(1, history.count)
+
+    def test_history_from_timeline_follows_build_datetime(self):
+        last_pass = self.previous_test("mytest", True)
+        first = self.previous_test("mytest", False)
+        # a build created later, but dated before all others
+        self.date = self.date - relativedelta(days=10)
+        self.previous_test("mytest", True)
+        self.date = self.date + relativedelta(days=11)
+        current = self.previous_test("mytest", False)
+
+        timeline = TestTimeline.objects.get(metadata=current.metadata)
+        history = timeline.history(current)
+        self.assertEqual(first, history.since)
+        self.assertEqual(1, history.count)
+        self.assertEqual(last_pass, history.last_different)
+
+    def test_history_waits_for_missing_tests(self):
+        last_pass = self.previous_test("mytest", True)
+        current = self.previous_test("mytest", False)
+        self.assertEqual(0, current.history.count)
+
+        # tests created in bulk are added to their timelines later on
+        build = self.project.builds.create(datetime=self.date, version='bulk')
+        test_run = build.test_runs.create(environment=self.environment)
+        following, = Test.objects.bulk_create([
+            Test(test_run=test_run, suite=self.suite, result=False, metadata=current.metadata, build=build, environment=self.environment),
+        ])
+        timeline = TestTimeline.objects.get(metadata=current.metadata)
+        self.assertIsNone(timeline.history(following))
+        self.assertEqual(1, following.history.count)
+
+        TestTimeline.add_test_run(test_run)
+        timeline = TestTimeline.objects.get(metadata=current.metadata)
+        history = timeline.history(following)
+        self.assertEqual(current, history.since)
+        self.assertEqual(1, history.count)
+        self.assertEqual(last_pass, history.last_different)
+
+    def test_timeline_invalidated_when_test_run_is_removed(self):
+        self.previous_test("mytest", True)
+        removed = self.previous_test("mytest", False)
+        current = self.previous_test("mytest", False)
+        self.assertEqual(1, current.history.count)
+
+        removed.test_run.delete()
+        self.assertIsNone(TestTimeline.objects.get(metadata=current.metadata).runs)
+
+        current = Test.objects.get(pk=current.pk)
+        self.assertEqual(0, current.history.count)
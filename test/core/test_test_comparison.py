@@ -17,7 +17,9 @@ class TestComparisonTest(TestCase):
 
     def receive_test_run(self, project, version, env, tests):
         receive = ReceiveTestRun(project, update_project_status=False)
-        receive(version, env, tests_file=json.dumps(tests))
+        # cached comparisons are invalidated once results are committed
+        with self.captureOnCommitCallbacks(execute=True):
+            receive(version, env, tests_file=json.dumps(tests))
 
     def setUp(self):
         self.group = models.Group.objects.create(slug='mygruop')
@@ -103,6 +105,44 @@ class TestComparisonTest(TestCase):
         self.assertEqual('fail', comp.results['a'][self.build2, 'otherenv'])
         self.assertEqual('pass', comp.results['b'][self.build2, 'otherenv'])
 
+    def test_test_results_with_duplicates(self):
+        comp = compare(self.build1, self.build3)
+
+        status, confidence = comp.results['a'][self.build3, 'myenv']
+        self.assertEqual('pass', status)
+        self.assertAlmostEqual(200 / 3, confidence)
+        self.assertEqual('fail', comp.diff['b'][self.build3, 'myenv'])
+
+    def test_test_results_pages(self):
+        comp = compare(self.build1, self.build2)
+        items = comp.results.items()
+        self.assertEqual(4, len(items))
+
+        with self.assertNumQueries(2):
+            page = items[1:3]
+        self.assertEqual(['b', 'c'], [name for name, _ in page])
+        self.assertEqual('pass', page[0][1][self.build2, 'myenv'])
+
+        with self.assertNumQueries(1):
+            self.assertEqual(['c', 'd/e'], [name for name, _ in items[2:]])
+
+    def test_test_results_page_in_database(self):
+        comp = TestComparison.compare_builds(self.build0, self.build1, page=(1, 2))
+
+        # only the tests of the page are loaded
+        self.assertEqual(2, len(comp.table))
+        self.assertEqual(5, comp.results_count)
+        self.assertEqual(['b', 'c'], list(comp.results.keys()))
+
+        items = comp.results.items()
+        self.assertEqual(5, len(items))
+        self.assertEqual(['b', 'c'], [name for name, _ in items[1:3]])
+        self.assertEqual('c', items[2][0])
+        self.assertEqual('fail', items[2][1][self.build1, 'myenv'])
+
+        comp = TestComparison.compare_builds(self.build0, self.build1, page=(4, 2))
+        self.assertEqual(['z'], list(comp.results.keys()))
+
     def test_compare_projects(self):
         comp = TestComparison.compare_projects(self.project1, self.project2)
         self.assertEqual([self.build1, self.build2], comp.builds)
@@ -294,3 +334,161 @@ class TestComparisonTest(TestCase):
         self.assertEqual({'envA', 'envB'}, comparison.all_environments)
         self.assertEqual(2, len(comparison.results))
         self.assertEqual(None, comparison.results['testB'].get((buildB, 'envB')))
+
+    def test_transitions_in_database(self):
+        project = self.group.projects.create(slug='project4')
+        self.receive_test_run(project, 'buildA', 'envA', {'testA': 'pass', 'testB': 'pass', 'testC': 'pass'})
+        self.receive_test_run(project, 'buildA', 'envB', {'testA': 'fail', 'testB': 'skip', 'testC': 'pass'})
+        self.receive_test_run(project, 'buildA', 'envC', {'testA': 'xfail', 'testB': 'xfail', 'testC': 'pass'})
+
+        self.receive_test_run(project, 'buildB', 'envA', {'testA': 'fail', 'testB': 'skip', 'testC': 'pass'})
+        self.receive_test_run(project, 'buildB', 'envB', {'testA': 'pass', 'testC': 'pass', 'testD': 'fail'})
+        self.receive_test_run(project, 'buildB', 'envC', {'testA': 'xfail', 'testB': 'xfail', 'testC': 'pass'})
+
+        buildA = project.builds.filter(version='buildA').get()
+        buildB = project.builds.filter(version='buildB').get()
+
+        transitions = [('pass', 'fail'), ('skip', 'n/a')]
+        comparison = TestComparison.compare_builds(buildA, buildB, transitions=transitions)
+
+        # only tests that might go through the transitions are loaded
+        self.assertEqual(2, len(comparison.table))
+        self.assertEqual({'envB': ['testA']}, comparison.fixes)
+        self.assertEqual({'envA': ['testA']}, comparison.regressions)
+        self.assertEqual({'envA', 'envB'}, comparison.all_environments)
+        self.assertEqual(['testA', 'testB'], list(comparison.results.keys()))
+        self.assertEqual(None, comparison.results['testB'].get((buildB, 'envB')))
+
+        comparison = TestComparison.compare_builds(buildA, buildB, transitions=transitions, page=(1, 50))
+        self.assertEqual(2, comparison.results_count)
+        self.assertEqual(['testB'], list(comparison.results.keys()))
+
+        # pages hold, and are counted from, only the tests that actually go
+        # through the transitions
+        pages = [
+            TestComparison.compare_builds(buildA, buildB, transitions=transitions, page=(offset, 1))
+            for offset in range(3)
+        ]
+        names = [name for page in pages for name in page.results.keys()]
+        self.assertEqual(['testA', 'testB'], names)
+        self.assertEqual([len(names)] * 3, [page.results_count for page in pages])
+
+        comparison = TestComparison.compare_builds(buildA, buildB, transitions=[('n/a', 'fail')])
+        self.assertEqual(['testD'], list(comparison.results.keys()))
+
+        # testC passes everywhere, so its results do not differ at all
+        comparison = TestComparison.compare_builds(buildA, buildB, transitions=[('pass', 'pass')])
+        self.assertEqual(1, len(comparison.table))
+        self.assertEqual([], list(comparison.results.keys()))
+
+        comparison = TestComparison.compare_builds(buildA, buildB, transitions=[('pass', 'pass')], page=(0, 50))
+        self.assertEqual(0, comparison.results_count)
+        self.assertEqual([], list(comparison.results.keys()))
+        self.assertEqual(0, len(comparison.results.items()))
+
+    def test_differences_only(self):
+        project = self.group.projects.create(slug='project4')
+        self.receive_test_run(project, 'v1', 'e1', {'t1': 'pass', 't2': 'pass', 't3': 'pass'})
+        self.receive_test_run(project, 'v1', 'e2', {'t1': 'pass', 't2': 'pass', 't3': 'pass'})
+        self.receive_test_run(project, 'v2', 'e1', {'t1': 'pass', 't2': 'fail', 't3': 'pass'})
+        self.receive_test_run(project, 'v2', 'e2', {'t1': 'pass', 't2': 'pass', 't3': 'pass'})
+        self.receive_test_run(project, 'v3', 'e1', {'t1': 'pass', 't2': 'pass', 't3': 'pass'})
+        self.receive_test_run(project, 'v3', 'e2', {'t1': 'pass', 't2': 'pass', 't3': 'skip'})
+        v1, v2, v3 = project.builds.order_by('id')
+
+        comparison = TestComparison(v1, v2, v3, differences_only=True)
+
+        self.assertEqual(2, len(comparison.table))
+        self.assertEqual(['t2', 't3'], list(comparison.results.keys()))
+        self.assertEqual(['t2', 't3'], sorted(comparison.diff.keys()))
+        self.assertEqual('fail', comparison.results['t2'][v2, 'e1'])
+        self.assertEqual('pass', comparison.results['t2'][v2, 'e2'])
+        self.assertEqual('skip', comparison.results['t3'][v3, 'e2'])
+        self.assertEqual({'e2': ['t3']}, comparison.__status_changes__(('pass', 'skip')))
+
+        comparison = TestComparison(v1, v2, v3, differences_only=True, page=(1, 50))
+        self.assertEqual(2, comparison.results_count)
+        self.assertEqual(1, len(comparison.table))
+        self.assertEqual(['t3'], list(comparison.results.keys()))
+        self.assertEqual('skip', comparison.results['t3'][v3, 'e2'])
+
+        # t1 passes everywhere and t2 never goes from pass to skip, so they
+        # are neither in the page nor counted
+        transitions = [('pass', 'skip')]
+        comparison = TestComparison(v1, v2, v3, differences_only=True, transitions=transitions, page=(0, 50))
+        self.assertEqual(1, comparison.results_count)
+        self.assertEqual(['t3'], list(comparison.results.keys()))
+        self.assertEqual(comparison.results_count, len(comparison.results.items()))
+
+        comparison = TestComparison(v1, v2, v3, differences_only=True, transitions=transitions, page=(1, 50))
+        self.assertEqual(1, comparison.results_count)
+        self.assertEqual([], list(comparison.results.keys()))
+
+    def test_regressions_and_fixes_are_cached(self):
+        comparison = TestComparison(self.build1, self.build2, regressions_and_fixes_only=True)
+
+        # only the versions of the builds and of known issues are read
+        with self.assertNumQueries(2):
+            cached = TestComparison(self.build1, self.build2, regressions_and_fixes_only=True)
+
+        self.assertEqual(comparison.regressions, cached.regressions)
+        self.assertEqual(comparison.fixes, cached.fixes)
+        self.assertEqual(comparison.diff, cached.diff)
+        self.assertEqual(comparison.results, cached.results)
+        self.assertEqual(comparison.environments[self.build1], cached.environments[self.build1])
+
+    def test_cached_regressions_are_discarded_on_new_test_run(self):
+        comparison = TestComparison(self.build1, self.build2, regressions_and_fixes_only=True)
+        self.assertEqual(['a'], comparison.regressions['myenv'])
+
+        self.receive_test_run(self.project2, '1', 'myenv', {'b': 'fail'})
+
+        comparison = TestComparison(self.build1, self.build2, regressions_and_fixes_only=True)
+        self.assertEqual(['a', 'b'], sorted(comparison.regressions['myenv']))
+
+    def test_cached_regressions_are_kept_until_commit(self):
+        TestComparison(self.build1, self.build2, regressions_and_fixes_only=True)
+        receive = ReceiveTestRun(self.project2, update_project_status=False)
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            receive('1', 'myenv', tests_file=json.dumps({'b': 'fail'}))
+            comparison = TestComparison(self.build1, self.build2, regressions_and_fixes_only=True)
+            self.assertEqual(['a'], comparison.regressions['myenv'])
+
+        for callback in callbacks:
+            callback()
+        comparison = TestComparison(self.build1, self.build2, regressions_and_fixes_only=True)
+        self.assertEqual(['a', 'b'], sorted(comparison.regressions['myenv']))
+
+    def test_comparison_version_is_not_overwritten_on_save(self):
+        build = models.Build.objects.get(pk=self.build2.pk)
+        version = build.comparison_version
+        with self.captureOnCommitCallbacks(execute=True):
+            models.Build.invalidate_comparisons(build.id)
+        build.save()
+        build.refresh_from_db()
+        self.assertEqual(version + 1, build.comparison_version)
+
+    def test_comparison_version_is_bumped_once_per_transaction(self):
+        version = models.Build.objects.get(pk=self.build2.pk).comparison_version
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            for test in models.Test.objects.filter(build=self.build2):
+                test.save()
+
+        with self.assertNumQueries(1):
+            for callback in callbacks:
+                callback()
+        self.assertEqual(version + 1, models.Build.objects.get(pk=self.build2.pk).comparison_version)
+
+    def test_cached_fixes_are_discarded_on_new_known_issue(self):
+        comparison = TestComparison(self.build1, self.build2, regressions_and_fixes_only=True)
+        self.assertEqual(['c'], comparison.fixes['myenv'])
+
+        tests = models.Test.objects.filter(test_run__build=self.build1, metadata__name='c')
+        tests.update(has_known_issues=True)
+        issue = models.KnownIssue.objects.create(title='foo bar baz', intermittent=True)
+        for test in tests:
+            test.known_issues.add(issue)
+
+        comparison = TestComparison(self.build1, self.build2, regressions_and_fixes_only=True)
+        self.assertEqual({}, comparison.fixes)
+        self.assertEqual('pass', comparison.results['c'][(self.build2, 'myenv')])
@@ -1,6 +1,8 @@
+import io
+import json
 from unittest import TestCase
 
-from squad.core.data import JSONTestDataParser
+from squad.core.data import JSONTestDataParser, iter_json_object
 
 
 TEST_DATA = """
@@ -57,3 +59,40 @@ class JSONTestDataParserTest(TestCase):
         test1 = [t for t in data if t['test_name'] == 'mytest1'][0]
         self.assertEqual('/', test1['group_name'])
         self.assertEqual("mytest1", test1['test_name'])
+
+
+class JSONTestDataParserIterparseTest(TestCase):
+
+    def test_same_as_parsing_whole_document(self):
+        data = list(json_parser.iterparse(io.StringIO(TEST_DATA)))
+        self.assertEqual(json_parser(TEST_DATA), data)
+
+    def test_empty(self):
+        self.assertEqual([], list(json_parser.iterparse(io.StringIO(''))))
+        self.assertEqual([], list(json_parser.iterparse(io.StringIO(' { } '))))
+
+    def test_reads_bytes(self):
+        data = list(json_parser.iterparse(io.BytesIO('{"sü/tést": {"result": "pass", "log": "ok"}}'.encode())))
+        self.assertEqual([{"group_name": "sü", "test_name": "tést", "pass": True, "log": "ok"}], data)
+
+
+class IterJSONObjectTest(TestCase):
+
+    def test_small_chunks(self):
+        document = json.dumps({
+            "a/1": "pass",
+            "a/2": {"result": "fail", "log": "x" * 100},
+            "b/3": 12345,
+            "b/4": [1.5, 2.5],
+            "b/5": None,
+        }, indent=2)
+        expected = list(json.loads(document).items())
+        for chunk_size in (1, 2, 3, 7, 1024):
+            stream = io.BytesIO(document.encode())
+            self.assertEqual(expected, list(iter_json_object(stream, chunk_size=chunk_size)))
+
+    def test_invalid(self):
+        with self.assertRaises(json.JSONDecodeError):
+            list(iter_json_object(io.StringIO('{"a": "pass",')))
+        with self.assertRaises(json.JSONDecodeError):
+            list(iter_json_object(io.StringIO('["a"]')))
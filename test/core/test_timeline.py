@@ -0,0 +1,105 @@
+from django.test import TestCase
+
+from squad.core.timeline import Timeline
+
+
+class TimelineTest(TestCase):
+
+    def test_consecutive_results_make_a_single_run(self):
+        timeline = Timeline()
+        timeline.add(1, 10, True)
+        timeline.add(2, 20, True)
+        timeline.add(3, 30, True)
+        self.assertEqual([[True, 3, 1, 10, 3, 30, 1]], timeline.runs)
+
+    def test_transitions(self):
+        timeline = Timeline()
+        timeline.add(1, 10, True)
+        timeline.add(2, 20, False)
+        timeline.add(3, 30, False)
+        timeline.add(4, 40, None)
+        self.assertEqual(
+            [
+                [True, 1, 1, 10, 1, 10, 1],
+                [False, 2, 2, 20, 3, 30, 1],
+                [None, 1, 4, 40, 4, 40, 1],
+            ],
+            timeline.runs,
+        )
+
+    def test_results_from_the_same_build(self):
+        timeline = Timeline()
+        timeline.add(1, 10, True)
+        timeline.add(2, 20, True)
+        timeline.add(2, 21, True)
+        self.assertEqual([[True, 3, 1, 10, 2, 21, 2]], timeline.runs)
+
+    def test_add_out_of_order(self):
+        timeline = Timeline()
+        timeline.add(1, 10, True)
+        timeline.add(3, 30, False)
+        timeline.add(2, 20, False)
+        timeline.add(0, 5, True)
+        self.assertEqual(
+            [
+                [True, 2, 0, 5, 1, 10, 1],
+                [False, 2, 2, 20, 3, 30, 1],
+            ],
+            timeline.runs,
+        )
+
+    def test_add_between_runs(self):
+        timeline = Timeline()
+        timeline.add(1, 10, True)
+        timeline.add(3, 30, False)
+        timeline.add(2, 20, None)
+        self.assertEqual(None, timeline.runs[1][0])
+        self.assertEqual(3, len(timeline.runs))
+
+    def test_add_inside_run(self):
+        timeline = Timeline()
+        timeline.add(1, 10, True)
+        timeline.add(3, 30, True)
+        self.assertTrue(timeline.add(2, 20, True))
+        self.assertEqual([[True, 3, 1, 10, 3, 30, 1]], timeline.runs)
+
+    def test_cannot_split_run(self):
+        timeline = Timeline()
+        timeline.add(1, 10, True)
+        timeline.add(3, 30, True)
+        self.assertFalse(timeline.add(2, 20, False))
+
+    def test_history(self):
+        timeline = Timeline()
+        timeline.add(1, 10, False)
+        timeline.add(2, 20, True)
+        timeline.add(3, 30, True)
+        timeline.add(4, 40, True)
+        self.assertEqual((20, 2, 10), timeline.history(4, 40))
+
+    def test_history_of_first_result(self):
+        timeline = Timeline()
+        timeline.add(1, 10, True)
+        self.assertEqual((None, 0, None), timeline.history(1, 10))
+
+    def test_history_after_transition(self):
+        timeline = Timeline()
+        timeline.add(1, 10, True)
+        timeline.add(2, 20, False)
+        self.assertEqual((None, 0, 10), timeline.history(2, 20))
+
+    def test_history_ignores_results_from_the_same_build(self):
+        timeline = Timeline()
+        timeline.add(1, 10, True)
+        timeline.add(2, 20, True)
+        timeline.add(2, 21, True)
+        self.assertEqual((10, 1, None), timeline.history(2, 21))
+        self.assertEqual((10, 1, None), timeline.history(2, 20))
+
+    def test_unknown_history(self):
+        timeline = Timeline()
+        timeline.add(1, 10, True)
+        timeline.add(2, 20, True)
+        timeline.add(3, 30, False)
+        self.assertIsNone(timeline.history(1, 10))
+        self.assertIsNone(timeline.history(4, 40))
@@ -1,5 +1,5 @@
 from django.test import TestCase
-from squad.core.utils import join_name, parse_name, encrypt, decrypt, split_dict, split_list
+from squad.core.utils import join_name, parse_name, encrypt, decrypt, split_dict, split_list, split_iterable
 
 
 class TestParseName(TestCase):
@@ -95,3 +95,14 @@ class TestSplitList(TestCase):
         self.assertEqual([3, 4], chunks[1])
         self.assertEqual([5, 6], chunks[2])
         self.assertEqual([7], chunks[3])
+
+
+class TestSplitIterable(TestCase):
+
+    def test_split_iterable(self):
+        chunks = split_iterable(iter(range(1, 8)), chunk_size=3)
+
+        self.assertEqual([1, 2, 3], next(chunks))
+        self.assertEqual([4, 5, 6], next(chunks))
+        self.assertEqual([7], next(chunks))
+        self.assertEqual([], list(chunks))
@@ -136,6 +136,16 @@ class FrontendTest(TestCase):
     def test_project_metrics_metric_summary(self):
         self.hit('/mygroup/myproject/metrics/?environment=myenv&metric=:summary:')
 
+    def test_project_metrics_max_points(self):
+        response = self.hit('/mygroup/myproject/metrics/?environment=myenv&metric=:summary:&max_points=100')
+        self.assertIn("'max_points': 100", response.content.decode())
+        response = self.hit('/mygroup/myproject/metrics/?max_points=0')
+        self.assertIn("'max_points': null", response.content.decode())
+
+    def test_project_metrics_are_not_downsampled_by_default(self):
+        response = self.hit('/mygroup/myproject/metrics/?environment=myenv&metric=:summary:')
+        self.assertIn("'max_points': null", response.content.decode())
+
     def test_project_test_history_404(self):
         self.hit('/mygroup/myproject/tests/foo', 404)
 
@@ -79,6 +79,32 @@ class ProjectComparisonTest(TestCase):
         self.assertIn('pass', str(response.content))
         self.assertIn('fail', str(response.content))
 
+    def test_comparison_project_differences_only(self):
+        url = '/_/compare/?group=mygroup&project_%d=1&project_%d=1&transitions=ignore&differences_only=1' % (self.project1.id, self.project2.id)
+        response = self.client.get(url)
+        self.assertEqual(200, response.status_code)
+        self.assertNotIn('d/e', str(response.content))
+        self.assertNotIn('<th>b</th>', str(response.content))
+        self.assertIn('<th>a</th>', str(response.content))
+        self.assertIn('<th>c</th>', str(response.content))
+
+    def test_comparison_project_pages(self):
+        tests = {'test%03d' % i: 'pass' for i in range(60)}
+        self.receive_test_run(self.project1, '2', 'myenv', tests)
+        self.receive_test_run(self.project2, '2', 'myenv', tests)
+
+        url = '/_/compare/?group=mygroup&project_%d=2&project_%d=2&transitions=ignore' % (self.project1.id, self.project2.id)
+        response = self.client.get(url)
+        self.assertEqual(200, response.status_code)
+        self.assertIn('<th>test049</th>', str(response.content))
+        self.assertNotIn('<th>test050</th>', str(response.content))
+
+        response = self.client.get(url + '&page=2')
+        self.assertEqual(200, response.status_code)
+        self.assertNotIn('<th>test049</th>', str(response.content))
+        self.assertIn('<th>test050</th>', str(response.content))
+        self.assertIn('<th>test059</th>', str(response.content))
+
 
 class BuildComparisonTest(TestCase):
 